@@ -1,4 +1,3 @@
-import threading
 import time
 
 
@@ -10,23 +9,24 @@ def db_callback(timestamp, mqtt_publisher=None):
     print("🔔 Doorbell Buzzer Activated")
 
 
-def run_db(settings, threads, stop_event, mqtt_publisher=None):
+def run_db(settings, runtime, stop_event, mqtt_publisher=None):
     """Run doorbell buzzer component"""
     
-    def callback_wrapper(timestamp):
+    def simulated_ring(timestamp):
+        print("🔔 DB Buzzer Simulator: Doorbell activated")
+        if mqtt_publisher:
+            mqtt_publisher.add_reading(
+                sensor_type='buzzer',
+                value=1,
+                simulated=True
+            )
         db_callback(timestamp, mqtt_publisher)
     
     if settings.get('simulated', True):
-        from RPI1.simulators.db import run_db_simulator
+        from RPI1.simulators.db import generate_doorbell_events
         print("Starting DB buzzer simulator")
-        db_thread = threading.Thread(
-            target=run_db_simulator,
-            args=(callback_wrapper, stop_event, mqtt_publisher),
-            daemon=True
-        )
-        db_thread.start()
-        threads.append(db_thread)
+        runtime.stream("DB Buzzer Simulator", generate_doorbell_events(), simulated_ring)
         print("DB buzzer simulator started")
     else:
-        # Real buzzer - no separate thread needed, it's event-driven
+        # Real buzzer - nothing to schedule, it's event-driven
         print("DB buzzer initialized (real GPIO)")
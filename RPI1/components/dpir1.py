@@ -1,4 +1,3 @@
-import threading
 import time
 from typing import Callable, Optional
 
@@ -17,30 +16,19 @@ def dpir1_callback(motion_detected, timestamp, mqtt_publisher=None, settings=Non
         )
 
 
-def run_dpir1(settings, threads, stop_event, mqtt_publisher=None, led_controller=None):
+def run_dpir1(settings, runtime, stop_event, mqtt_publisher=None, led_controller=None):
     def callback_wrapper(motion_detected, timestamp):
         dpir1_callback(motion_detected, timestamp, mqtt_publisher, settings)
     
     if settings['simulated']:
-        from RPI1.simulators.dpir1 import run_dpir1_simulator
+        from RPI1.simulators.dpir1 import generate_motion_events
         print("Starting DPIR1 simulator")
-        dpir1_thread = threading.Thread(
-            target=run_dpir1_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        dpir1_thread.start()
-        threads.append(dpir1_thread)
+        runtime.stream("DPIR1 Simulator", generate_motion_events(), callback_wrapper)
         print("DPIR1 simulator started")
     else:
-        from RPI1.sensors.dpir1 import run_dpir1_loop, DPIR1
+        from RPI1.sensors.dpir1 import watch_dpir1, DPIR1
         print("Starting DPIR1 loop")
         dpir1 = DPIR1(settings['pin'])
-        dpir1_thread = threading.Thread(
-            target=run_dpir1_loop,
-            args=(dpir1, callback_wrapper, stop_event),
-            daemon=True
-        )
-        dpir1_thread.start()
-        threads.append(dpir1_thread)
+        watch_dpir1(dpir1, callback_wrapper, stop_event)
+        runtime.on_stop(dpir1.cleanup)
         print("DPIR1 loop started")
\ No newline at end of file
@@ -1,4 +1,3 @@
-import threading
 import time
 from typing import Callable, Optional
 
@@ -26,34 +25,23 @@ def ds1_callback(door_open, timestamp, mqtt_publisher=None, settings=None):
         )
 
 
-def run_ds1(settings, threads, stop_event, mqtt_publisher=None):
+def run_ds1(settings, runtime, stop_event, mqtt_publisher=None):
 
     def callback_wrapper(door_open, timestamp):
         ds1_callback(door_open, timestamp, mqtt_publisher, settings)
     
     if settings['simulated']:
-        from RPI1.simulators.ds1 import run_ds1_simulator
+        from RPI1.simulators.ds1 import generate_door_events
         print("Starting DS1 simulator")
-        ds1_thread = threading.Thread(
-            target=run_ds1_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        ds1_thread.start()
-        threads.append(ds1_thread)
+        runtime.stream("DS1 Simulator", generate_door_events(), callback_wrapper)
         print("DS1 simulator started")
     else:
-        from RPI1.sensors.ds1 import run_ds1_loop, DS1
+        from RPI1.sensors.ds1 import watch_ds1, DS1
         from RPI1.sensors.dl import DoorLED
         global door_led
         door_led = DoorLED(settings['led_pin'])
         print("Starting DS1 loop")
         ds1 = DS1(settings['pin'])
-        ds1_thread = threading.Thread(
-            target=run_ds1_loop,
-            args=(ds1, callback_wrapper, stop_event),
-            daemon=True
-        )
-        ds1_thread.start()
-        threads.append(ds1_thread)
+        watch_ds1(ds1, callback_wrapper, stop_event)
+        runtime.on_stop(ds1.cleanup)
         print("DS1 loop started")
\ No newline at end of file
@@ -1,7 +1,10 @@
-import threading
 import time
 from typing import Callable, Optional
-def dus1_callback(distance, timestamp, mqtt_publisher=None, settings=None):
+
+from mqtt.report_filter import ReportFilter
+
+
+def dus1_callback(distance, timestamp, mqtt_publisher=None, settings=None, report_filter=None):
     """Callback for ultrasonic distance sensor readings"""
     t = time.localtime(timestamp)
     print("=" * 20)
@@ -10,7 +13,7 @@ def dus1_callback(distance, timestamp, mqtt_publisher=None, settings=None):
     
 
     
-    if mqtt_publisher and settings:
+    if mqtt_publisher and settings and (not report_filter or report_filter.should_report('distance', distance)):
         mqtt_publisher.add_reading(
             sensor_type='distance',
             value=distance,
@@ -18,23 +21,19 @@ def dus1_callback(distance, timestamp, mqtt_publisher=None, settings=None):
         )
 
 
-def run_dus1(settings, threads, stop_event, mqtt_publisher=None):
+def run_dus1(settings, runtime, stop_event, mqtt_publisher=None):
+    report_filter = ReportFilter.from_settings(settings)
+
     def callback_wrapper(distance, timestamp):
-        dus1_callback(distance, timestamp, mqtt_publisher, settings)
+        dus1_callback(distance, timestamp, mqtt_publisher, settings, report_filter)
     
     if settings['simulated']:
-        from RPI1.simulators.dus1 import run_dus1_simulator
+        from RPI1.simulators.dus1 import generate_distance_events
         print("Starting DUS1 simulator")
-        dus1_thread = threading.Thread(
-            target=run_dus1_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        dus1_thread.start()
-        threads.append(dus1_thread)
+        runtime.stream("DUS1 Simulator", generate_distance_events(), callback_wrapper)
         print("DUS1 simulator started")
     else:
-        from RPI1.sensors.dus1 import run_dus1_loop, DUS1
+        from RPI1.sensors.dus1 import DUS1
         print("Starting DUS1 loop")
 
         dus1 = DUS1(
@@ -44,12 +43,6 @@ def run_dus1(settings, threads, stop_event, mqtt_publisher=None):
 
         interval = settings.get('read_interval', 1)
         
-        dus1_thread = threading.Thread(
-            target=run_dus1_loop,
-            args=(dus1, interval, callback_wrapper, stop_event),
-            daemon=True
-        )
-        dus1_thread.start()
-        threads.append(dus1_thread)
+        runtime.poll("DUS1", interval, dus1.read, callback_wrapper, cleanup=dus1.cleanup)
         print("DUS1 loop started")
         return dus1
\ No newline at end of file
@@ -2,7 +2,6 @@ import threading
 import time
 import sys
 import os
-import paho.mqtt.client as mqtt
 import json
 
 # Allow running as script: python RPI1/main.py
@@ -18,6 +17,9 @@ from RPI1.components.dus1 import run_dus1
 from RPI1.components.dl import create_led_bulb
 from RPI1.components.db import run_db
 from mqtt.publisher import MQTTPublisher
+from shared.mqtt_connection import MQTTConnection
+from shared.topic_router import TopicRouter
+from shared.device_runtime import create_runtime, ProcessMonitor
 
 try:
     import RPi.GPIO as GPIO
@@ -27,50 +29,44 @@ except (ImportError, RuntimeError):
 
 
 # Simple command listener for PI1
-command_mqtt_client = None
 buzzer_actuator = None
+runtime = None
 
-def on_connect_commands(client, userdata, flags, rc):
-    if rc == 0:
-        # PI1 ONLY subscribes to PI1 commands and "all" broadcasts
-        client.subscribe("commands/PI1/#")
-        client.subscribe("commands/all/#")
-        print("✓ PI1: Subscribed to commands/PI1/# and commands/all/#")
+commands = TopicRouter()
 
-def on_message_commands(client, userdata, msg):
-    global buzzer_actuator
+
+@commands.route("commands/+/alarm_triggered")
+def on_alarm_triggered(topic, payload):
+    # Trigger buzzer when server announces active alarm
+    if buzzer_actuator and runtime:
+        runtime.submit(buzzer_actuator.ring, times=3)
+        print("🔔 PI1: Alarm triggered -> buzzer activated")
+
+
+# Handle security commands
+@commands.route("commands/+/security_armed")
+@commands.route("commands/+/alarm_cleared")
+def on_security_command(topic, payload):
+    print(f"✓ PI1: Processed {topic}")
+
+
+def on_message_commands(topic, raw_payload):
     try:
-        topic = msg.topic
-        payload = json.loads(msg.payload.decode())
+        payload = json.loads(raw_payload.decode())
         
         print(f"PI1 Command received: {topic}")
-        
-        # Trigger buzzer when server announces active alarm
-        if "alarm_triggered" in topic and buzzer_actuator:
-            threading.Thread(
-                target=buzzer_actuator.ring,
-                kwargs={"times": 3},
-                daemon=True
-            ).start()
-            print("🔔 PI1: Alarm triggered -> buzzer activated")
-        
-        # Handle security commands
-        if "security_armed" in topic or "alarm_cleared" in topic:
-            print(f"✓ PI1: Processed {topic}")
+        commands.dispatch(topic, payload)
         
     except Exception as e:
         print(f"PI1: Error processing command - {e}")
 
-def start_command_listener_pi1():
-    global command_mqtt_client
-    command_mqtt_client = mqtt.Client(client_id="PI1_command_listener")
-    command_mqtt_client.on_connect = on_connect_commands
-    command_mqtt_client.on_message = on_message_commands
-    command_mqtt_client.connect("localhost", 1883, 60)
-    command_mqtt_client.loop_start()
+def start_command_listener_pi1(connection):
+    # PI1 ONLY subscribes to PI1 commands and "all" broadcasts
+    connection.subscribe("commands/PI1/#", on_message_commands)
+    connection.subscribe("commands/all/#", on_message_commands)
 
 
-def cleanup_resources(led_bulb, buzzer, mqtt_publisher):
+def cleanup_resources(led_bulb, buzzer, mqtt_publisher, connection):
     print("\nCleaning up resources...")
     
     if led_bulb:
@@ -91,12 +87,11 @@ def cleanup_resources(led_bulb, buzzer, mqtt_publisher):
         except Exception as e:
             print(f"Error disconnecting MQTT: {e}")
     
-    if command_mqtt_client:
+    if connection:
         try:
-            command_mqtt_client.loop_stop()
-            command_mqtt_client.disconnect()
-        except:
-            pass
+            connection.disconnect()
+        except Exception as e:
+            print(f"Error closing MQTT connection: {e}")
 
 
 if __name__ == "__main__":
@@ -105,31 +100,37 @@ if __name__ == "__main__":
     print('='*60)
     
     settings = load_settings()
-    threads = []
     stop_event = threading.Event()
+    runtime = create_runtime(settings, stop_event)
     
     device_info = settings.get('device', {})
     print(f"\n📋 Device Configuration:")
     print(f"  PI ID: {device_info.get('pi_id', 'N/A')}")
     print(f"  Device Name: {device_info.get('device_name', 'N/A')}")
     print(f"  Location: {device_info.get('location', 'N/A')}")
+    print(f"  Runtime: {runtime.mode}")
     
     led_bulb = None
     buzzer = None
     mqtt_publisher = None
     dms_thread = None
+    # One broker connection for sensor data and commands
+    connection = MQTTConnection.from_settings(settings)
     
     try:
         # Start PI1 command listener
         print("\n Starting PI1 Command Listener...")
-        start_command_listener_pi1()
+        start_command_listener_pi1(connection)
         
         # Initialize MQTT Publisher for sensor data
         print("\n Initializing MQTT Data Publisher...")
-        mqtt_publisher = MQTTPublisher(settings)
+        mqtt_publisher = MQTTPublisher(settings, connection)
         if mqtt_publisher.connect():
             mqtt_publisher.start_daemon()
             print("✓ MQTT Data Publisher ready")
+        elif mqtt_publisher.spool:
+            mqtt_publisher.start_daemon()
+            print("⚠ MQTT broker unreachable, spooling readings to disk until it is back")
         else:
             print("✗ MQTT Data Publisher failed")
             mqtt_publisher = None
@@ -153,22 +154,22 @@ if __name__ == "__main__":
         
         # Buzzer Simulator (if enabled)
         if 'DB' in settings:
-            run_db(settings['DB'], threads, stop_event, mqtt_publisher)
+            run_db(settings['DB'], runtime, stop_event, mqtt_publisher)
             print("✓ DB Buzzer component started")
         
         # Distance Sensor (for motion direction)
         if 'DUS1' in settings:
-            run_dus1(settings['DUS1'], threads, stop_event, mqtt_publisher)
+            run_dus1(settings['DUS1'], runtime, stop_event, mqtt_publisher)
             print("✓ DUS1 Distance Sensor started")
         
         # Motion Sensor
         if 'DPIR1' in settings:
-            run_dpir1(settings['DPIR1'], threads, stop_event, mqtt_publisher, led_bulb)
+            run_dpir1(settings['DPIR1'], runtime, stop_event, mqtt_publisher, led_bulb)
             print("✓ DPIR1 Motion Sensor started")
         
         # Door Sensor
         if 'DS1' in settings:
-            run_ds1(settings['DS1'], threads, stop_event, mqtt_publisher)
+            run_ds1(settings['DS1'], runtime, stop_event, mqtt_publisher)
             print("✓ DS1 Door Sensor started")
         
         # Start DMS Console (optional)
@@ -186,13 +187,17 @@ if __name__ == "__main__":
         print("PI1 System running... Press Ctrl+C to stop")
         print("="*60 + "\n")
         
-        heartbeat_counter = 0
-        while True:
-            time.sleep(2)
-            
-            heartbeat_counter += 1
-            if heartbeat_counter % 30 == 0:
-                print(f"💓 [PI1 Heartbeat] Running: {heartbeat_counter * 2}s")
+        started = time.time()
+        process_monitor = ProcessMonitor()
+        
+        def heartbeat():
+            print(f"💓 [PI1 Heartbeat] Running: {int(time.time() - started)}s")
+            print(f"   {process_monitor.format()}")
+            if mqtt_publisher:
+                print(f"   {mqtt_publisher.format_status()}")
+        
+        runtime.every("Heartbeat", 60, heartbeat)
+        runtime.run_forever()
     
     except KeyboardInterrupt:
         print('\n\n  Received shutdown signal (Ctrl+C)')
@@ -202,14 +207,9 @@ if __name__ == "__main__":
         traceback.print_exc()
     finally:
         print("\n Initiating shutdown sequence...")
-        stop_event.set()
-        
-        print("Waiting for threads to finish...")
-        for thread in threads:
-            if thread.is_alive():
-                thread.join(timeout=2.0)
+        runtime.shutdown(timeout=2.0)
         
-        cleanup_resources(led_bulb, buzzer, mqtt_publisher)
+        cleanup_resources(led_bulb, buzzer, mqtt_publisher, connection)
         
         print("\n" + "="*60)
         print("PI1 Application stopped successfully")
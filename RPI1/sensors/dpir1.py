@@ -19,10 +19,13 @@ class DPIR1:
             return GPIO.input(self.pin) == GPIO.HIGH
 
     def cleanup(self):
+        print("DPIR1: Cleaning up...")
+        GPIO.remove_event_detect(self.pin)
         GPIO.cleanup(self.pin)
+        print("DPIR1: Cleanup complete")
 
 
-def run_dpir1_loop(dpir1: DPIR1, callback: Callable, stop_event, debounce_ms=500):
+def watch_dpir1(dpir1: DPIR1, callback: Callable, stop_event, debounce_ms=500):
 
     
     def gpio_callback(channel):
@@ -46,12 +49,3 @@ def run_dpir1_loop(dpir1: DPIR1, callback: Callable, stop_event, debounce_ms=500
     )
     
     print(f"DPIR1: Event detection setup on pin {dpir1.pin}")
-
-    try:
-        while not stop_event.is_set():
-            time.sleep(0.1)
-    finally:
-        print("DPIR1: Cleaning up...")
-        GPIO.remove_event_detect(dpir1.pin)
-        dpir1.cleanup()
-        print("DPIR1: Cleanup complete")
\ No newline at end of file
@@ -17,10 +17,13 @@ class DS1:
             return GPIO.input(self.pin) == GPIO.HIGH
 
     def cleanup(self):
+        print("Cleaning up DS1...")
+        GPIO.remove_event_detect(self.pin)
         GPIO.cleanup(self.pin)
+        print("DS1 cleanup complete")
 
 
-def run_ds1_loop(ds1: DS1, callback: Callable, stop_event, debounce_ms=200):    
+def watch_ds1(ds1: DS1, callback: Callable, stop_event, debounce_ms=200):    
     def gpio_callback(channel):
         if stop_event.is_set():
             return
@@ -41,12 +44,3 @@ def run_ds1_loop(ds1: DS1, callback: Callable, stop_event, debounce_ms=200):
     )
     
     print(f"DS1 event detection setup on pin {ds1.pin}")
-
-    try:
-        while not stop_event.is_set():
-            time.sleep(0.1)
-    finally:
-        print("Cleaning up DS1...")
-        GPIO.remove_event_detect(ds1.pin)
-        ds1.cleanup()
-        print("DS1 cleanup complete")
\ No newline at end of file
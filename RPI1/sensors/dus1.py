@@ -1,6 +1,6 @@
 import time
 import RPi.GPIO as GPIO
-from typing import Callable, Optional
+from typing import Optional
 import threading
 
 
@@ -51,31 +51,15 @@ class DUS1:
             
             return round(distance, 2)
 
+    def read(self) -> Optional[float]:
+        """One measurement for the runtime poll loop, None on timeout"""
+        distance = self.measure_distance()
+        if distance is None:
+            print("DUS1: Measurement timeout (no obstacle detected)")
+        return distance
+
     def cleanup(self):
         """Cleanup GPIO resources"""
-        GPIO.cleanup([self.trig, self.echo])
-
-
-def run_dus1_loop(dus1: DUS1, interval: float, callback: Callable, stop_event):
-    print(f"DUS1: Starting measurement loop (interval={interval}s)")
-    
-    try:
-        while not stop_event.is_set():
-            distance = dus1.measure_distance()
-            timestamp = time.time()
-
-            if distance is not None:
-                try:
-                    callback(distance, timestamp)
-                except Exception as e:
-                    print(f"DUS1: Error in callback: {e}")
-            else:
-                print("DUS1: Measurement timeout (no obstacle detected)")
-
-            time.sleep(interval)
-    except Exception as e:
-        print(f"DUS1: Error in measurement loop: {e}")
-    finally:
         print("DUS1: Cleaning up...")
-        dus1.cleanup()
-        print("DUS1: Cleanup complete")
\ No newline at end of file
+        GPIO.cleanup([self.trig, self.echo])
+        print("DUS1: Cleanup complete")
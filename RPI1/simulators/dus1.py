@@ -1,6 +1,5 @@
-import time
 import random
-from typing import Callable, Generator, Tuple
+from typing import Generator, Tuple
 
 
 def generate_distance_events(
@@ -8,7 +7,7 @@ def generate_distance_events(
     max_interval: float = 3.0,
     min_dist: float = 10.0,
     max_dist: float = 200.0
-) -> Generator[Tuple[float, float], None, None]:
+) -> Generator[Tuple[float, Tuple[float]], None, None]:
     current_distance = random.uniform(min_dist, max_dist)
     
     while True:
@@ -18,27 +17,4 @@ def generate_distance_events(
         current_distance = max(min_dist, min(max_dist, current_distance))
         
         wait_time = random.uniform(min_interval, max_interval)
-        time.sleep(wait_time)
-        
-        yield round(current_distance, 2), time.time()
-
-
-def run_dus1_simulator(callback: Callable, stop_event):
-
-    print("DUS1 Simulator: Starting distance measurement generation")
-    
-    try:
-        for distance, timestamp in generate_distance_events():
-            if stop_event.is_set():
-                print("DUS1 Simulator: Stop event detected, shutting down")
-                break
-
-            try:
-                callback(distance, timestamp)
-            except Exception as e:
-                print(f"DUS1 Simulator: Error in callback: {e}")
-                
-    except KeyboardInterrupt:
-        print("DUS1 Simulator: Interrupted by user")
-    finally:
-        print("DUS1 Simulator: Stopped")
\ No newline at end of file
+        yield wait_time, (round(current_distance, 2),)
@@ -1,4 +1,3 @@
-import threading
 import time
 from typing import Callable
 
@@ -23,31 +22,20 @@ def btn_callback(timestamp, mqtt_publisher=None, settings=None, sd4_controller=N
         )
 
 
-def run_btn(settings, threads, stop_event, mqtt_publisher=None, sd4_controller=None):
+def run_btn(settings, runtime, stop_event, mqtt_publisher=None, sd4_controller=None):
     """Run BTN button with SD4 controller integration"""
     def callback_wrapper(timestamp):
         btn_callback(timestamp, mqtt_publisher, settings, sd4_controller)
     
     if settings['simulated']:
-        from RPI2.simulators.btn import run_btn_simulator
+        from RPI2.simulators.btn import generate_button_events
         print("Starting BTN simulator")
-        btn_thread = threading.Thread(
-            target=run_btn_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        btn_thread.start()
-        threads.append(btn_thread)
+        runtime.stream("BTN Simulator", generate_button_events(), callback_wrapper)
         print("BTN simulator started")
     else:
-        from RPI2.sensors.btn import run_btn_loop, BTN
+        from RPI2.sensors.btn import watch_btn, BTN
         print("Starting BTN loop")
         btn = BTN(settings['pin'])
-        btn_thread = threading.Thread(
-            target=run_btn_loop,
-            args=(btn, callback_wrapper, stop_event),
-            daemon=True
-        )
-        btn_thread.start()
-        threads.append(btn_thread)
+        watch_btn(btn, callback_wrapper, stop_event)
+        runtime.on_stop(btn.cleanup)
         print("BTN loop started")
\ No newline at end of file
@@ -1,9 +1,10 @@
-import threading
 import time
 from typing import Callable, Optional
 
+from mqtt.report_filter import ReportFilter
 
-def dht3_callback(temperature, humidity, timestamp, mqtt_publisher=None, settings=None):
+
+def dht3_callback(temperature, humidity, timestamp, mqtt_publisher=None, settings=None, report_filter=None):
 
     t = time.localtime(timestamp)
     print("=" * 20)
@@ -11,52 +12,36 @@ def dht3_callback(temperature, humidity, timestamp, mqtt_publisher=None, setting
     print(f"Temperature: {temperature}°C")
     print(f"Humidity: {humidity}%")
     
-    # Send temperature to MQTT if publisher is available
+    # Send temperature and humidity to MQTT as one climate reading
     if mqtt_publisher and settings:
-        mqtt_publisher.add_reading(
-            sensor_type='temperature',
-            value=temperature,
-            simulated=settings.get('simulated', False),
-            sensor_id='dht3'
-        )
-        
-        # Send humidity to MQTT
-        mqtt_publisher.add_reading(
-            sensor_type='humidity',
-            value=humidity,
-            simulated=settings.get('simulated', False),
-            sensor_id='dht3'
-        )
+        climate = {'temperature': temperature, 'humidity': humidity}
+        if not report_filter or report_filter.should_report_fields(climate):
+            mqtt_publisher.add_reading(
+                sensor_type='climate',
+                value=climate,
+                simulated=settings.get('simulated', False),
+                sensor_id='dht3'
+            )
+
 
+def run_dht3(settings, runtime, stop_event, mqtt_publisher=None):
 
-def run_dht3(settings, threads, stop_event, mqtt_publisher=None):
+    report_filter = ReportFilter.from_settings(settings)
 
     def callback_wrapper(temperature, humidity, timestamp):
-        dht3_callback(temperature, humidity, timestamp, mqtt_publisher, settings)
+        dht3_callback(temperature, humidity, timestamp, mqtt_publisher, settings, report_filter)
     
     if settings['simulated']:
-        from RPI2.simulators.dht3 import run_dht3_simulator
+        from RPI2.simulators.dht3 import generate_dht_events
         print("Starting DHT3 simulator")
-        dht3_thread = threading.Thread(
-            target=run_dht3_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        dht3_thread.start()
-        threads.append(dht3_thread)
+        runtime.stream("DHT3 Simulator", generate_dht_events(), callback_wrapper)
         print("DHT3 simulator started")
     else:
-        from RPI2.sensors.dht3 import run_dht_loop, DHT
+        from RPI2.sensors.dht3 import read_dht, DHT
         print("Starting DHT3 loop")
 
         dht3 = DHT(settings['pin'])
         interval = settings.get('read_interval', 2)
         
-        dht3_thread = threading.Thread(
-            target=run_dht_loop,
-            args=(dht3, interval, callback_wrapper, stop_event),
-            daemon=True
-        )
-        dht3_thread.start()
-        threads.append(dht3_thread)
+        runtime.poll("DHT3", interval, lambda: read_dht(dht3), callback_wrapper)
         print("DHT3 loop started")
\ No newline at end of file
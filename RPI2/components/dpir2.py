@@ -1,4 +1,3 @@
-import threading
 import time
 from typing import Callable, Optional
 
@@ -17,30 +16,19 @@ def dpir2_callback(motion_detected, timestamp, mqtt_publisher=None, settings=Non
         )
 
 
-def run_dpir2(settings, threads, stop_event, mqtt_publisher=None): 
+def run_dpir2(settings, runtime, stop_event, mqtt_publisher=None): 
     def callback_wrapper(motion_detected, timestamp):
         dpir2_callback(motion_detected, timestamp, mqtt_publisher, settings)
     
     if settings['simulated']:
-        from RPI2.simulators.dpir2 import run_dpir2_simulator
+        from RPI2.simulators.dpir2 import generate_motion_events
         print("Starting DPIR2 simulator")
-        dpir2_thread = threading.Thread(
-            target=run_dpir2_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        dpir2_thread.start()
-        threads.append(dpir2_thread)
+        runtime.stream("DPIR2 Simulator", generate_motion_events(), callback_wrapper)
         print("DPIR2 simulator started")
     else:
-        from RPI2.sensors.dpir2 import run_dpir2_loop, DPIR2
+        from RPI2.sensors.dpir2 import watch_dpir2, DPIR2
         print("Starting DPIR2 loop")
         dpir2 = DPIR2(settings['pin'])
-        dpir2_thread = threading.Thread(
-            target=run_dpir2_loop,
-            args=(dpir2, callback_wrapper, stop_event),
-            daemon=True
-        )
-        dpir2_thread.start()
-        threads.append(dpir2_thread)
+        watch_dpir2(dpir2, callback_wrapper, stop_event)
+        runtime.on_stop(dpir2.cleanup)
         print("DPIR2 loop started")
\ No newline at end of file
@@ -1,4 +1,3 @@
-import threading
 import time
 from typing import Callable, Optional
 
@@ -19,31 +18,20 @@ def ds2_callback(door_open, timestamp, mqtt_publisher=None, settings=None):
             simulated=settings.get('simulated', False)
         )
 
-def run_ds2(settings, threads, stop_event, mqtt_publisher=None):
+def run_ds2(settings, runtime, stop_event, mqtt_publisher=None):
 
     def callback_wrapper(door_open, timestamp):
         ds2_callback(door_open, timestamp, mqtt_publisher, settings)
     
     if settings['simulated']:
-        from RPI2.simulators.ds2 import run_ds2_simulator
+        from RPI2.simulators.ds2 import generate_door_events
         print("Starting DS2 simulator")
-        ds2_thread = threading.Thread(
-            target=run_ds2_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        ds2_thread.start()
-        threads.append(ds2_thread)
+        runtime.stream("DS2 Simulator", generate_door_events(), callback_wrapper)
         print("DS2 simulator started")
     else:
-        from RPI2.sensors.ds2 import run_ds2_loop, DS2
+        from RPI2.sensors.ds2 import watch_ds2, DS2
         print("Starting DS2 loop")
         ds2 = DS2(settings['pin'])
-        ds2_thread = threading.Thread(
-            target=run_ds2_loop,
-            args=(ds2, callback_wrapper, stop_event),
-            daemon=True
-        )
-        ds2_thread.start()
-        threads.append(ds2_thread)
+        watch_ds2(ds2, callback_wrapper, stop_event)
+        runtime.on_stop(ds2.cleanup)
         print("DS2 loop started")
\ No newline at end of file
@@ -1,9 +1,10 @@
-import threading
 import time
 from typing import Callable, Optional
 
+from mqtt.report_filter import ReportFilter
 
-def dus2_callback(distance, timestamp, mqtt_publisher=None, settings=None):
+
+def dus2_callback(distance, timestamp, mqtt_publisher=None, settings=None, report_filter=None):
 
     t = time.localtime(timestamp)
     print("=" * 20)
@@ -12,7 +13,7 @@ def dus2_callback(distance, timestamp, mqtt_publisher=None, settings=None):
 
     #Update system state
     
-    if mqtt_publisher and settings:
+    if mqtt_publisher and settings and (not report_filter or report_filter.should_report('distance', distance)):
         mqtt_publisher.add_reading(
             sensor_type='distance',
             value=distance,
@@ -20,23 +21,19 @@ def dus2_callback(distance, timestamp, mqtt_publisher=None, settings=None):
         )
 
 
-def run_dus2(settings, threads, stop_event, mqtt_publisher=None):
+def run_dus2(settings, runtime, stop_event, mqtt_publisher=None):
+    report_filter = ReportFilter.from_settings(settings)
+
     def callback_wrapper(distance, timestamp):
-        dus2_callback(distance, timestamp, mqtt_publisher, settings)
+        dus2_callback(distance, timestamp, mqtt_publisher, settings, report_filter)
 
     if settings['simulated']:
-        from RPI2.simulators.dus2 import run_dus2_simulator
+        from RPI2.simulators.dus2 import generate_distance_events
         print("Starting DUS2 simulator")
-        dus2_thread = threading.Thread(
-            target=run_dus2_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        dus2_thread.start()
-        threads.append(dus2_thread)
+        runtime.stream("DUS2 Simulator", generate_distance_events(), callback_wrapper)
         print("DUS2 simulator started")
     else:
-        from RPI2.sensors.dus2 import run_dus2_loop, DUS2
+        from RPI2.sensors.dus2 import DUS2
         print("Starting DUS2 loop")
 
         dus2 = DUS2(
@@ -46,11 +43,5 @@ def run_dus2(settings, threads, stop_event, mqtt_publisher=None):
 
         interval = settings.get('read_interval', 1)
         
-        dus2_thread = threading.Thread(
-            target=run_dus2_loop,
-            args=(dus2, interval, callback_wrapper, stop_event),
-            daemon=True
-        )
-        dus2_thread.start()
-        threads.append(dus2_thread)
+        runtime.poll("DUS2", interval, dus2.read, callback_wrapper, cleanup=dus2.cleanup)
         print("DUS2 loop started")
\ No newline at end of file
@@ -1,10 +1,11 @@
-import threading
 import time
 from typing import Callable
 
+from mqtt.report_filter import ReportFilter
+
 
 def gsg_callback(acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z, timestamp, 
-                 mqtt_publisher=None, settings=None):
+                 mqtt_publisher=None, settings=None, report_filter=None):
     t = time.localtime(timestamp)
     print("=" * 20)
     print(f"Timestamp: {time.strftime('%H:%M:%S', t)}")
@@ -14,42 +15,32 @@ def gsg_callback(acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z, timestamp,
     #Update system state
     
     if mqtt_publisher and settings:
-        for axis, value in [('accel_x', acc_x), ('accel_y', acc_y), ('accel_z', acc_z),
-                            ('gyro_x', gyro_x), ('gyro_y', gyro_y), ('gyro_z', gyro_z)]:
+        imu = {'ax': acc_x, 'ay': acc_y, 'az': acc_z, 'gx': gyro_x, 'gy': gyro_y, 'gz': gyro_z}
+        if not report_filter or report_filter.should_report_fields(imu):
             mqtt_publisher.add_reading(
-                sensor_type=axis,
-                value=value,
+                sensor_type='imu',
+                value=imu,
                 simulated=settings.get('simulated', False)
             )
 
 
-def run_gsg(settings, threads, stop_event, mqtt_publisher=None):
+def run_gsg(settings, runtime, stop_event, mqtt_publisher=None):
+    report_filter = ReportFilter.from_settings(settings)
+
     def callback_wrapper(acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z, timestamp):
         gsg_callback(acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z, timestamp, 
-                     mqtt_publisher, settings)
+                     mqtt_publisher, settings, report_filter)
     
     if settings['simulated']:
-        from RPI2.simulators.gsg import run_gsg_simulator
+        from RPI2.simulators.gsg import generate_gyro_events
         print("Starting GSG simulator")
-        gsg_thread = threading.Thread(
-            target=run_gsg_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        gsg_thread.start()
-        threads.append(gsg_thread)
+        runtime.stream("GSG Simulator", generate_gyro_events(), callback_wrapper)
         print("GSG simulator started")
     else:
-        from RPI2.sensors.gsg import run_gsg_loop, GSG
+        from RPI2.sensors.gsg import GSG
         print("Starting GSG loop")
         gsg = GSG(i2c_bus=settings.get('i2c_bus', 1))
         interval = settings.get('read_interval', 0.5)
         
-        gsg_thread = threading.Thread(
-            target=run_gsg_loop,
-            args=(gsg, interval, callback_wrapper, stop_event),
-            daemon=True
-        )
-        gsg_thread.start()
-        threads.append(gsg_thread)
+        runtime.poll("GSG", interval, gsg.read, callback_wrapper, cleanup=gsg.cleanup)
         print("GSG loop started")
\ No newline at end of file
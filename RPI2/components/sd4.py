@@ -1,16 +1,18 @@
 import threading
 import time
 import json
-import paho.mqtt.client as mqtt
+from shared.mqtt_connection import MQTTConnection
+from shared.topic_router import TopicRouter
 
 
 class SD4Controller:
     """Timer display controller - syncs with server via MQTT"""
     
-    def __init__(self, settings, stop_event):
+    def __init__(self, settings, stop_event, connection=None):
         self.settings = settings
         self.stop_event = stop_event
-        self.lock = threading.Lock()
+        # Re-entrant: the display loop calls get_current_seconds() while holding it
+        self.lock = threading.RLock()
         
         # Timer state
         self.seconds = 0
@@ -27,10 +29,16 @@ class SD4Controller:
         # Display throttling
         self.last_display_update = 0
         self.display_update_interval = 0.5  # Update display every 500ms
+        self.last_print_time = 0
+        self.print_interval = 2.0  # Print to console every 2 seconds
         
-        # MQTT
-        self.mqtt_client = None
-        self.mqtt_connected = False
+        # MQTT - the Pi's shared connection (own one only when used standalone)
+        self.owns_connection = connection is None
+        self.connection = connection or MQTTConnection(client_id="PI2_SD4_Controller")
+        # Timer commands, dispatched with self.lock held
+        self.commands = TopicRouter()
+        for command in ("timer_set", "timer_start", "timer_stop", "timer_add", "timer_expired"):
+            self.commands.add(f"commands/+/{command}", getattr(self, command))
         
         # Initialize hardware display
         if not settings['simulated']:
@@ -41,82 +49,75 @@ class SD4Controller:
         
         print("SD4: Controller initialized")
     
-    def start_mqtt(self):
-        """Connect to MQTT broker"""
-        try:
-            self.mqtt_client = mqtt.Client(client_id="PI2_SD4_Controller")
-            self.mqtt_client.on_connect = self.on_connect
-            self.mqtt_client.on_message = self.on_message
-            self.mqtt_client.connect("localhost", 1883, 60)
-            self.mqtt_client.loop_start()
-            print("SD4: MQTT started")
-        except Exception as e:
-            print(f"SD4: MQTT failed - {e}")
+    @property
+    def mqtt_connected(self):
+        return self.connection.connected
     
-    def on_connect(self, client, userdata, flags, rc):
-        """MQTT connection callback"""
-        if rc == 0:
-            self.mqtt_connected = True
-            client.subscribe("commands/PI2/#")
-            print("SD4: Subscribed to commands/PI2/#")
+    def start_mqtt(self):
+        """Route timer commands to this controller"""
+        self.connection.subscribe("commands/PI2/#", self.on_message)
+        if self.owns_connection:
+            self.connection.connect(timeout=5)
+        print("SD4: Listening on commands/PI2/#")
     
-    def on_message(self, client, userdata, msg):
+    def on_message(self, topic, raw_payload):
         """Handle MQTT commands from server"""
-        print("RECEIVER SD4: Command received - processing, message: ", msg)
+        print("RECEIVER SD4: Command received - processing, topic: ", topic)
         try:
-            topic = msg.topic
-            payload = json.loads(msg.payload.decode())
+            payload = json.loads(raw_payload.decode())
             
             with self.lock:
-                if topic.endswith("timer_set"):
-                    seconds = payload.get("seconds", 0)
-                    self.seconds = seconds
-                    self.running = False
-                    self.expired = False
-                    self.blinking = False
-                    self.start_time = None
-                    print(f"SD4: Timer set to {seconds}s")
-                
-                elif topic.endswith("timer_start"):
-                    if self.seconds > 0:
-                        self.running = True
-                        self.start_time = time.time()
-                        self.expired = False
-                        self.blinking = False
-                        print("SD4: Timer started")
-                
-                elif topic.endswith("timer_stop"):
-                    self.running = False
-                    self.start_time = None
-                    self.blinking = False
-                    print("SD4: Timer stopped")
-                
-                elif topic.endswith("timer_add"):
-                    add_seconds = payload.get("seconds", 10)
-                    
-                    if self.blinking:
-                        # Stop blinking
-                        self.blinking = False
-                        self.expired = False
-                        self.seconds = 0
-                        print("SD4: Blinking stopped")
-                    else:
-                        self.seconds += add_seconds
-                        # Adjust start time if running
-                        if self.running and self.start_time:
-                            self.start_time -= add_seconds
-                        print(f"SD4: Added {add_seconds}s, total: {self.seconds}s")
-                
-                elif topic.endswith("timer_expired"):
-                    self.expired = True
-                    self.blinking = True
-                    self.running = False
-                    self.seconds = 0
-                    print("SD4: Timer EXPIRED - blinking")
+                self.commands.dispatch(topic, payload)
         
         except Exception as e:
             print(f"SD4: Error processing command - {e}")
     
+    def timer_set(self, topic, payload):
+        seconds = payload.get("seconds", 0)
+        self.seconds = seconds
+        self.running = False
+        self.expired = False
+        self.blinking = False
+        self.start_time = None
+        print(f"SD4: Timer set to {seconds}s")
+    
+    def timer_start(self, topic, payload):
+        if self.seconds > 0:
+            self.running = True
+            self.start_time = time.time()
+            self.expired = False
+            self.blinking = False
+            print("SD4: Timer started")
+    
+    def timer_stop(self, topic, payload):
+        self.running = False
+        self.start_time = None
+        self.blinking = False
+        print("SD4: Timer stopped")
+    
+    def timer_add(self, topic, payload):
+        add_seconds = payload.get("seconds", 10)
+        
+        if self.blinking:
+            # Stop blinking
+            self.blinking = False
+            self.expired = False
+            self.seconds = 0
+            print("SD4: Blinking stopped")
+        else:
+            self.seconds += add_seconds
+            # Adjust start time if running
+            if self.running and self.start_time:
+                self.start_time -= add_seconds
+            print(f"SD4: Added {add_seconds}s, total: {self.seconds}s")
+    
+    def timer_expired(self, topic, payload):
+        self.expired = True
+        self.blinking = True
+        self.running = False
+        self.seconds = 0
+        print("SD4: Timer EXPIRED - blinking")
+    
     def get_current_seconds(self):
         """Calculate current remaining seconds (thread-safe)"""
         with self.lock:
@@ -138,56 +139,44 @@ class SD4Controller:
     
     def send_timer_expired(self):
         """Notify server that timer expired"""
-        if self.mqtt_client and self.mqtt_connected:
-            self.mqtt_client.publish(
+        if self.mqtt_connected:
+            self.connection.publish(
                 "events/PI2/timer_expired",
                 json.dumps({"timestamp": time.time()})
             )
     
-    def run(self):
-        """Main display loop"""
-        print("SD4: Starting display loop")
-        self.start_mqtt()
+    def tick(self):
+        """One pass of the display loop (scheduled every 100ms by the runtime)"""
+        current_time = time.time()
         
-        # Wait for MQTT to connect
-        time.sleep(1)
-        
-        last_print_time = 0
-        print_interval = 2.0  # Print to console every 2 seconds
-        
-        while not self.stop_event.is_set():
-            current_time = time.time()
+        # Update display
+        if current_time - self.last_display_update >= self.display_update_interval:
+            self.last_display_update = current_time
             
-            # Update display
-            if current_time - self.last_display_update >= self.display_update_interval:
-                self.last_display_update = current_time
-                
+            with self.lock:
+                if self.blinking:
+                    self.handle_blink()
+                else:
+                    self.show_time()
+            
+            # Throttled console output
+            if current_time - self.last_print_time >= self.print_interval:
                 with self.lock:
                     if self.blinking:
-                        self.handle_blink()
+                        print("SD4: [BLINKING] 00:00")
                     else:
-                        self.show_time()
+                        current_secs = self.get_current_seconds()
+                        mins = current_secs // 60
+                        secs = current_secs % 60
+                        status = "▶️" if self.running else "⏸️"
+                        print(f"SD4: {status} {mins:02d}:{secs:02d}")
                 
-                # Throttled console output
-                if current_time - last_print_time >= print_interval:
-                    with self.lock:
-                        if self.blinking:
-                            print("SD4: [BLINKING] 00:00")
-                        else:
-                            current_secs = self.get_current_seconds()
-                            mins = current_secs // 60
-                            secs = current_secs % 60
-                            status = "▶️" if self.running else "⏸️"
-                            print(f"SD4: {status} {mins:02d}:{secs:02d}")
-                    
-                    last_print_time = current_time
-            
-            time.sleep(0.1)
-        
-        # Cleanup
-        if self.mqtt_client:
-            self.mqtt_client.loop_stop()
-            self.mqtt_client.disconnect()
+                self.last_print_time = current_time
+    
+    def cleanup(self):
+        """Disconnect MQTT (if not shared) and release the display"""
+        if self.owns_connection:
+            self.connection.disconnect()
         
         if self.display:
             self.display.cleanup()
@@ -224,24 +213,22 @@ class SD4Controller:
         Send event to server to handle timer logic
         """
         print("SD4: Button pressed - sending event to server")
-        if self.mqtt_client and self.mqtt_connected:
-            self.mqtt_client.publish(
+        if self.mqtt_connected:
+            self.connection.publish(
                 "events/PI2/button_pressed",
                 json.dumps({"timestamp": time.time()})
             )
 
 
-def run_sd4_controller(settings, threads, stop_event):
-    """Run SD4 controller in a thread"""
-    controller = SD4Controller(settings, stop_event)
+def run_sd4_controller(settings, runtime, stop_event, connection=None):
+    """Run the SD4 controller on the device runtime"""
+    controller = SD4Controller(settings, stop_event, connection)
+    controller.start_mqtt()
     
-    sd4_thread = threading.Thread(
-        target=controller.run,
-        daemon=True
-    )
-    sd4_thread.start()
-    threads.append(sd4_thread)
+    # Hardware display writes block on GPIO timing, keep them off the event loop
+    runtime.every("SD4", 0.1, controller.tick, blocking=not settings['simulated'])
+    runtime.on_stop(controller.cleanup)
     
-    print("SD4: Controller thread started")
+    print("SD4: Display loop scheduled")
     
-    return controller  # Return so BTN can call button_pressed()
\ No newline at end of file
+    return controller  # Return so BTN can call button_pressed()
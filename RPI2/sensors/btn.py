@@ -20,10 +20,13 @@ class BTN:
             return GPIO.input(self.pin) == GPIO.LOW 
 
     def cleanup(self):
+        print("BTN: Cleaning up...")
+        GPIO.remove_event_detect(self.pin)
         GPIO.cleanup(self.pin)
+        print("BTN: Cleanup complete")
 
 
-def run_btn_loop(btn: BTN, callback: Callable, stop_event, debounce_ms=300):
+def watch_btn(btn: BTN, callback: Callable, stop_event, debounce_ms=300):
     
     def gpio_callback(channel):
         if stop_event.is_set():
@@ -44,12 +47,3 @@ def run_btn_loop(btn: BTN, callback: Callable, stop_event, debounce_ms=300):
     )
     
     print(f"BTN: Event detection setup on pin {btn.pin}")
-
-    try:
-        while not stop_event.is_set():
-            time.sleep(0.1)
-    finally:
-        print("BTN: Cleaning up...")
-        GPIO.remove_event_detect(btn.pin)
-        btn.cleanup()
-        print("BTN: Cleanup complete")
\ No newline at end of file
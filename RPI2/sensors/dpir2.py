@@ -19,10 +19,13 @@ class DPIR2:
             return GPIO.input(self.pin) == GPIO.HIGH
 
     def cleanup(self):
+        print("DPIR2: Cleaning up...")
+        GPIO.remove_event_detect(self.pin)
         GPIO.cleanup(self.pin)
+        print("DPIR2: Cleanup complete")
 
 
-def run_dpir2_loop(dpir2: DPIR2, callback: Callable, stop_event, debounce_ms=500):
+def watch_dpir2(dpir2: DPIR2, callback: Callable, stop_event, debounce_ms=500):
 
     
     def gpio_callback(channel):
@@ -46,12 +49,3 @@ def run_dpir2_loop(dpir2: DPIR2, callback: Callable, stop_event, debounce_ms=500
     )
     
     print(f"DPIR2: Event detection setup on pin {dpir2.pin}")
-
-    try:
-        while not stop_event.is_set():
-            time.sleep(0.1)
-    finally:
-        print("DPIR2: Cleaning up...")
-        GPIO.remove_event_detect(dpir2.pin)
-        dpir2.cleanup()
-        print("DPIR2: Cleanup complete")
\ No newline at end of file
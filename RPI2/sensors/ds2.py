@@ -17,10 +17,13 @@ class DS2:
             return GPIO.input(self.pin) == GPIO.HIGH
 
     def cleanup(self):
+        print("Cleaning up ds2...")
+        GPIO.remove_event_detect(self.pin)
         GPIO.cleanup(self.pin)
+        print("ds2 cleanup complete")
 
 
-def run_ds2_loop(ds2: DS2, callback: Callable, stop_event, debounce_ms=200):    
+def watch_ds2(ds2: DS2, callback: Callable, stop_event, debounce_ms=200):    
     def gpio_callback(channel):
         if stop_event.is_set():
             return
@@ -41,12 +44,3 @@ def run_ds2_loop(ds2: DS2, callback: Callable, stop_event, debounce_ms=200):
     )
     
     print(f"DS2 event detection setup on pin {ds2.pin}")
-
-    try:
-        while not stop_event.is_set():
-            time.sleep(0.1)
-    finally:
-        print("Cleaning up ds2...")
-        GPIO.remove_event_detect(ds2.pin)
-        ds2.cleanup()
-        print("ds2 cleanup complete")
\ No newline at end of file
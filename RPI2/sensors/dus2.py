@@ -1,6 +1,6 @@
 import time
 import RPi.GPIO as GPIO
-from typing import Callable, Optional
+from typing import Optional
 import threading
 
 
@@ -51,31 +51,15 @@ class DUS2:
             
             return round(distance, 2)
 
+    def read(self) -> Optional[float]:
+        """One measurement for the runtime poll loop, None on timeout"""
+        distance = self.measure_distance()
+        if distance is None:
+            print("DUS2: Measurement timeout (no obstacle detected)")
+        return distance
+
     def cleanup(self):
         """Cleanup GPIO resources"""
-        GPIO.cleanup([self.trig, self.echo])
-
-
-def run_dus2_loop(dus2: DUS2, interval: float, callback: Callable, stop_event):
-    print(f"DUS2: Starting measurement loop (interval={interval}s)")
-    
-    try:
-        while not stop_event.is_set():
-            distance = dus2.measure_distance()
-            timestamp = time.time()
-
-            if distance is not None:
-                try:
-                    callback(distance, timestamp)
-                except Exception as e:
-                    print(f"DUS2: Error in callback: {e}")
-            else:
-                print("DUS2: Measurement timeout (no obstacle detected)")
-
-            time.sleep(interval)
-    except Exception as e:
-        print(f"DUS2: Error in measurement loop: {e}")
-    finally:
         print("DUS2: Cleaning up...")
-        dus2.cleanup()
-        print("DUS2: Cleanup complete")
\ No newline at end of file
+        GPIO.cleanup([self.trig, self.echo])
+        print("DUS2: Cleanup complete")
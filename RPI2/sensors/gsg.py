@@ -1,6 +1,6 @@
 import time
 import threading
-from typing import Callable, Optional, Tuple
+from typing import Optional, Tuple
 
 try:
     import smbus
@@ -79,34 +79,8 @@ class GSG:
                 return None
 
     def cleanup(self):
+        print("GSG: Cleaning up...")
         try:
             self.bus.write_byte_data(self.MPU6050_ADDR, self.PWR_MGMT_1, 0x40)
         except:
             pass
-
-
-def run_gsg_loop(gsg: GSG, interval: float, callback: Callable, stop_event):
-
-    print(f"GSG: Starting measurement loop (interval={interval}s)")
-    
-    try:
-        while not stop_event.is_set():
-            reading = gsg.read()
-            timestamp = time.time()
-
-            if reading is not None:
-                try:
-                    callback(*reading, timestamp)
-                except Exception as e:
-                    print(f"GSG: Error in callback: {e}")
-            else:
-                print("GSG: Failed to read sensor")
-
-            time.sleep(interval)
-            
-    except Exception as e:
-        print(f"GSG: Error in measurement loop: {e}")
-    finally:
-        print("GSG: Cleaning up...")
-        gsg.cleanup()
-        print("GSG: Cleanup complete")
\ No newline at end of file
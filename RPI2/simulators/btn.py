@@ -1,26 +1,12 @@
-import time
 import random
-from typing import Callable
+from typing import Generator, Tuple
 
 
-def run_btn_simulator(callback: Callable, stop_event):
-    print("BTN Simulator: Starting button press generation")
-    
-    try:
-        while not stop_event.is_set():
-            wait_time = random.uniform(5.0, 15.0)
-            time.sleep(wait_time)
-            
-            if stop_event.is_set():
-                break
-            
-            timestamp = time.time()
-            try:
-                callback(timestamp)
-            except Exception as e:
-                print(f"BTN Simulator: Error in callback: {e}")
-                
-    except KeyboardInterrupt:
-        print("BTN Simulator: Interrupted by user")
-    finally:
-        print("BTN Simulator: Stopped")
\ No newline at end of file
+def generate_button_events(
+    min_interval: float = 5.0,
+    max_interval: float = 15.0
+) -> Generator[Tuple[float, Tuple], None, None]:
+
+    while True:
+        wait_time = random.uniform(min_interval, max_interval)
+        yield wait_time, ()
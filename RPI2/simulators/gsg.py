@@ -1,13 +1,12 @@
-import time
 import random
 import math
-from typing import Callable, Generator, Tuple
+from typing import Generator, Tuple
 
 
 def generate_gyro_events(
     min_interval: float = 0.5,
     max_interval: float = 2.0
-) -> Generator[Tuple[float, float, float, float, float, float, float], None, None]:
+) -> Generator[Tuple[float, Tuple[float, ...]], None, None]:
 
     angle = 0
     shake_counter = 0
@@ -38,34 +37,11 @@ def generate_gyro_events(
             angle = 0
         
         wait_time = random.uniform(min_interval, max_interval)
-        time.sleep(wait_time)
-        
-        yield (
+        yield wait_time, (
             round(accel_x, 3),
             round(accel_y, 3),
             round(accel_z, 3),
             round(gyro_x, 3),
             round(gyro_y, 3),
-            round(gyro_z, 3),
-            time.time()
+            round(gyro_z, 3)
         )
-
-
-def run_gsg_simulator(callback: Callable, stop_event):
-    print("GSG Simulator: Starting gyroscope data generation")
-    
-    try:
-        for acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z, timestamp in generate_gyro_events():
-            if stop_event.is_set():
-                print("GSG Simulator: Stop event detected, shutting down")
-                break
-
-            try:
-                callback(acc_x, acc_y, acc_z, gyro_x, gyro_y, gyro_z, timestamp)
-            except Exception as e:
-                print(f"GSG Simulator: Error in callback: {e}")
-                
-    except KeyboardInterrupt:
-        print("GSG Simulator: Interrupted by user")
-    finally:
-        print("GSG Simulator: Stopped")
\ No newline at end of file
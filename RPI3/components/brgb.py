@@ -1,6 +1,3 @@
-import threading
-
-
 def create_rgb_lamp(settings):
     """Factory function to create RGB lamp instance"""
     if settings.get('simulated', False):
@@ -18,7 +15,7 @@ def create_rgb_lamp(settings):
         )
 
 
-def run_brgb(settings, threads=None, stop_event=None, command_listener=None):
+def run_brgb(settings, runtime=None, stop_event=None, command_listener=None):
     """Initialize RGB lamp and register command callback"""
     
     lamp = create_rgb_lamp(settings)
@@ -49,17 +46,10 @@ def run_brgb(settings, threads=None, stop_event=None, command_listener=None):
         command_listener.register_callback('lamp_control', handle_lamp_command)
         print("✓ RGB Lamp: Registered command callback")
     
-    # Start simulator loop if simulated and threads provided
-    if settings.get('simulated', False) and threads is not None and stop_event is not None:
-        from RPI3.simulators.brgb import run_brgb_simulator
+    # Schedule the color cycle if simulated and a runtime is provided
+    if settings.get('simulated', False) and runtime is not None:
         interval = settings.get('update_interval', 1)
-        lamp_thread = threading.Thread(
-            target=run_brgb_simulator,
-            args=(lamp, interval, stop_event),
-            daemon=True
-        )
-        lamp_thread.start()
-        threads.append(lamp_thread)
-        print("✓ RGB Lamp: Simulator loop started")
+        runtime.every("RGB Lamp Simulator", interval, lamp._update_color_if_needed)
+        print(f"✓ RGB Lamp: Simulator color cycle scheduled (interval={interval}s)")
     
     return lamp
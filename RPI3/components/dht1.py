@@ -1,9 +1,11 @@
-import threading
 import time
 from typing import Callable, Optional
 
+from mqtt.report_filter import ReportFilter
 
-def dht1_callback(temperature, humidity, timestamp, mqtt_publisher=None, settings=None, lcd_controller=None):
+
+def dht1_callback(temperature, humidity, timestamp, mqtt_publisher=None, settings=None, lcd_controller=None,
+                  report_filter=None):
     """
     DHT1 callback for Bedroom temperature and humidity sensor.
     """
@@ -14,63 +16,47 @@ def dht1_callback(temperature, humidity, timestamp, mqtt_publisher=None, setting
     print(f"Temperature: {temperature}°C")
     print(f"Humidity: {humidity}%")
     
-    # Send temperature to MQTT if publisher is available
+    # Send temperature and humidity to MQTT as one climate reading
     if mqtt_publisher and settings:
-        mqtt_publisher.add_reading(
-            sensor_type='temperature',
-            value=temperature,
-            simulated=settings.get('simulated', False),
-            sensor_id='dht1'
-        )
-        
-        # Send humidity to MQTT
-        mqtt_publisher.add_reading(
-            sensor_type='humidity',
-            value=humidity,
-            simulated=settings.get('simulated', False),
-            sensor_id='dht1'
-        )
+        climate = {'temperature': temperature, 'humidity': humidity}
+        if not report_filter or report_filter.should_report_fields(climate):
+            mqtt_publisher.add_reading(
+                sensor_type='climate',
+                value=climate,
+                simulated=settings.get('simulated', False),
+                sensor_id='dht1'
+            )
     
     # Update LCD display if available
     if lcd_controller:
         lcd_controller.update_sensor(temperature, humidity)
 
 
-def run_dht1(settings, threads, stop_event, mqtt_publisher=None, lcd_controller=None):
+def run_dht1(settings, runtime, stop_event, mqtt_publisher=None, lcd_controller=None):
     """
     Start DHT1 sensor for Bedroom.
     Returns the DHT sensor instance.
     """
     dht1_sensor = None
     
+    report_filter = ReportFilter.from_settings(settings)
+
     def callback_wrapper(temperature, humidity, timestamp):
-        dht1_callback(temperature, humidity, timestamp, mqtt_publisher, settings, lcd_controller)
+        dht1_callback(temperature, humidity, timestamp, mqtt_publisher, settings, lcd_controller, report_filter)
     
     if settings['simulated']:
-        from RPI3.simulators.dht1 import run_dht1_simulator
+        from RPI3.simulators.dht1 import generate_dht_events
         print("Starting DHT1 simulator (Bedroom)")
-        dht1_thread = threading.Thread(
-            target=run_dht1_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        dht1_thread.start()
-        threads.append(dht1_thread)
+        runtime.stream("DHT1 Simulator", generate_dht_events(), callback_wrapper)
         print("DHT1 simulator started")
     else:
-        from RPI3.sensors.dht1 import run_dht_loop, DHT
+        from RPI3.sensors.dht1 import read_dht, DHT
         print("Starting DHT1 loop (Bedroom)")
 
         dht1_sensor = DHT(settings['pin'])
         interval = settings.get('read_interval', 2)
         
-        dht1_thread = threading.Thread(
-            target=run_dht_loop,
-            args=(dht1_sensor, interval, callback_wrapper, stop_event),
-            daemon=True
-        )
-        dht1_thread.start()
-        threads.append(dht1_thread)
+        runtime.poll("DHT1", interval, lambda: read_dht(dht1_sensor), callback_wrapper)
         print("DHT1 loop started")
     
     return dht1_sensor
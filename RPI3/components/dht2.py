@@ -1,9 +1,11 @@
-import threading
 import time
 from typing import Callable, Optional
 
+from mqtt.report_filter import ReportFilter
 
-def dht2_callback(temperature, humidity, timestamp, mqtt_publisher=None, settings=None, lcd_controller=None):
+
+def dht2_callback(temperature, humidity, timestamp, mqtt_publisher=None, settings=None, lcd_controller=None,
+                  report_filter=None):
     """
     DHT2 callback for Master Bedroom temperature and humidity sensor.
     """
@@ -14,63 +16,47 @@ def dht2_callback(temperature, humidity, timestamp, mqtt_publisher=None, setting
     print(f"Temperature: {temperature}°C")
     print(f"Humidity: {humidity}%")
     
-    # Send temperature to MQTT if publisher is available
+    # Send temperature and humidity to MQTT as one climate reading
     if mqtt_publisher and settings:
-        mqtt_publisher.add_reading(
-            sensor_type='temperature',
-            value=temperature,
-            simulated=settings.get('simulated', False),
-            sensor_id='dht2'
-        )
-        
-        # Send humidity to MQTT
-        mqtt_publisher.add_reading(
-            sensor_type='humidity',
-            value=humidity,
-            simulated=settings.get('simulated', False),
-            sensor_id='dht2'
-        )
+        climate = {'temperature': temperature, 'humidity': humidity}
+        if not report_filter or report_filter.should_report_fields(climate):
+            mqtt_publisher.add_reading(
+                sensor_type='climate',
+                value=climate,
+                simulated=settings.get('simulated', False),
+                sensor_id='dht2'
+            )
     
     # Update LCD display if available
     if lcd_controller:
         lcd_controller.update_sensor(temperature, humidity)
 
 
-def run_dht2(settings, threads, stop_event, mqtt_publisher=None, lcd_controller=None):
+def run_dht2(settings, runtime, stop_event, mqtt_publisher=None, lcd_controller=None):
     """
     Start DHT2 sensor for Master Bedroom.
     Returns the DHT sensor instance.
     """
     dht2_sensor = None
     
+    report_filter = ReportFilter.from_settings(settings)
+
     def callback_wrapper(temperature, humidity, timestamp):
-        dht2_callback(temperature, humidity, timestamp, mqtt_publisher, settings, lcd_controller)
+        dht2_callback(temperature, humidity, timestamp, mqtt_publisher, settings, lcd_controller, report_filter)
     
     if settings['simulated']:
-        from RPI3.simulators.dht2 import run_dht2_simulator
+        from RPI3.simulators.dht2 import generate_dht_events
         print("Starting DHT2 simulator (Master Bedroom)")
-        dht2_thread = threading.Thread(
-            target=run_dht2_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        dht2_thread.start()
-        threads.append(dht2_thread)
+        runtime.stream("DHT2 Simulator", generate_dht_events(), callback_wrapper)
         print("DHT2 simulator started")
     else:
-        from RPI3.sensors.dht2 import run_dht_loop, DHT
+        from RPI3.sensors.dht2 import read_dht, DHT
         print("Starting DHT2 loop (Master Bedroom)")
 
         dht2_sensor = DHT(settings['pin'])
         interval = settings.get('read_interval', 2)
         
-        dht2_thread = threading.Thread(
-            target=run_dht_loop,
-            args=(dht2_sensor, interval, callback_wrapper, stop_event),
-            daemon=True
-        )
-        dht2_thread.start()
-        threads.append(dht2_thread)
+        runtime.poll("DHT2", interval, lambda: read_dht(dht2_sensor), callback_wrapper)
         print("DHT2 loop started")
     
     return dht2_sensor
@@ -1,4 +1,3 @@
-import threading
 import time
 from typing import Callable, Optional
 
@@ -19,7 +18,7 @@ def dpir3_callback(motion_detected, timestamp, mqtt_publisher=None, settings=Non
         )
 
 
-def run_dpir3(settings, threads, stop_event, mqtt_publisher=None):
+def run_dpir3(settings, runtime, stop_event, mqtt_publisher=None):
     """
     Start DPIR3 motion sensor for Bedroom.
     Returns the DPIR sensor instance.
@@ -30,28 +29,16 @@ def run_dpir3(settings, threads, stop_event, mqtt_publisher=None):
         dpir3_callback(motion_detected, timestamp, mqtt_publisher, settings)
     
     if settings['simulated']:
-        from RPI3.simulators.dpir3 import run_dpir3_simulator
+        from RPI3.simulators.dpir3 import generate_motion_events
         print("Starting DPIR3 simulator (Bedroom)")
-        dpir3_thread = threading.Thread(
-            target=run_dpir3_simulator,
-            args=(callback_wrapper, stop_event),
-            daemon=True
-        )
-        dpir3_thread.start()
-        threads.append(dpir3_thread)
+        runtime.stream("DPIR3 Simulator", generate_motion_events(), callback_wrapper)
         print("DPIR3 simulator started")
     else:
-        from RPI3.sensors.dpir3 import run_dpir3_loop, DPIR3
+        from RPI3.sensors.dpir3 import DPIR3
         print("Starting DPIR3 loop (Bedroom)")
         
         dpir3_sensor = DPIR3(settings['pin'])
-        dpir3_thread = threading.Thread(
-            target=run_dpir3_loop,
-            args=(dpir3_sensor, callback_wrapper, stop_event),
-            daemon=True
-        )
-        dpir3_thread.start()
-        threads.append(dpir3_thread)
+        runtime.poll("DPIR3", 0.1, dpir3_sensor.read_change, callback_wrapper)
         print("DPIR3 loop started")
     
     return dpir3_sensor
@@ -1,6 +1,3 @@
-import threading
-
-
 def create_ir_remote(settings, brgb_lamp=None):
     """Factory function to create IR remote instance
     
@@ -21,14 +18,14 @@ def create_ir_remote(settings, brgb_lamp=None):
         )
 
 
-def run_ir(settings, command_listener=None, brgb_lamp=None, threads=None, stop_event=None):
+def run_ir(settings, command_listener=None, brgb_lamp=None, runtime=None, stop_event=None):
     """Initialize IR remote and register command callback
     
     Args:
         settings: IR configuration
         command_listener: MQTT command listener
         brgb_lamp: Optional reference to BRGB lamp for IR control
-        threads: List to append IR thread to
+        runtime: Device runtime that schedules the auto-demo
         stop_event: Threading event to stop simulator loops
     """
     
@@ -75,16 +72,9 @@ def run_ir(settings, command_listener=None, brgb_lamp=None, threads=None, stop_e
         command_listener.register_callback('ir_command', handle_ir_command)
         print("✓ IR Remote: Registered command callback")
     
-    # Start auto-demo thread if enabled
-    if auto_demo and threads is not None and stop_event is not None:
-        from RPI3.simulators.ir import run_ir_simulator
-        ir_thread = threading.Thread(
-            target=run_ir_simulator,
-            args=(ir_remote, 1, stop_event),
-            daemon=True
-        )
-        ir_thread.start()
-        threads.append(ir_thread)
-        print("✓ IR Remote: Auto-demo thread started")
+    # Schedule the auto-demo if enabled (checked every second, steps every 5s)
+    if auto_demo and runtime is not None:
+        runtime.every("IR Simulator", 1, ir_remote.run_auto_demo)
+        print("✓ IR Remote: Auto-demo scheduled")
     
     return ir_remote
@@ -106,10 +106,20 @@ class LCDController:
                 print(f"LCD Controller: Error in auto-update loop: {e}")
                 time.sleep(1)
     
-    def start(self):
-        """Start auto-update thread."""
+    def _refresh(self):
+        """One auto-update step when scheduled by a device runtime."""
+        if self.running:
+            self.display_sensor()
+    
+    def start(self, runtime=None):
+        """Start auto-update (on the device runtime if given, else in its own thread)."""
         if not self.running:
             self.running = True
+            if runtime is not None:
+                # I2C writes block, so they run in the runtime's executor
+                runtime.every("LCD Controller", self.update_interval, self._refresh, blocking=True)
+                print("LCD Controller: Started")
+                return
             self.stop_event = threading.Event()
             self.update_thread = threading.Thread(
                 target=self._auto_update_loop,
@@ -145,7 +155,7 @@ class LCDController:
         print("LCD Controller: Cleaned up")
 
 
-def run_lcd(settings, stop_event, dht_sensor=None, mqtt_publisher=None):
+def run_lcd(settings, stop_event, dht_sensor=None, mqtt_publisher=None, runtime=None):
     """
     Initialize and start LCD controller.
     
@@ -154,6 +164,7 @@ def run_lcd(settings, stop_event, dht_sensor=None, mqtt_publisher=None):
         stop_event: Threading event for shutdown
         dht_sensor: DHT sensor instance (DHT1, DHT2, etc) required for display
         mqtt_publisher: Optional MQTT publisher (for future expansion)
+        runtime: Optional device runtime that schedules display updates
     
     Returns:
         LCDController instance or None if dht_sensor not provided
@@ -185,7 +196,7 @@ def run_lcd(settings, stop_event, dht_sensor=None, mqtt_publisher=None):
     )
     
     # Start auto-update
-    controller.start()
+    controller.start(runtime)
     
     print("LCD Controller ready")
     return controller
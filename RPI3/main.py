@@ -16,6 +16,8 @@ from RPI3.components.brgb import run_brgb
 from RPI3.components.ir import run_ir
 from mqtt.publisher import MQTTPublisher
 from shared.mqtt_command_listener import MQTTCommandListener
+from shared.mqtt_connection import MQTTConnection
+from shared.device_runtime import create_runtime, ProcessMonitor
 
 try:
     import RPi.GPIO as GPIO
@@ -41,15 +43,14 @@ BRGB_COLOR_TO_INDEX = {
 }
 
 
-def publish_brgb_state(rgb_lamp, mqtt_publisher, stop_event, interval=1.0):
-    """Continuously publish BRGB state so backend/frontend can track simulator changes."""
-    print("🌈 BRGB state publisher started")
-    last_color = None
+def publish_brgb_state(rgb_lamp, mqtt_publisher, runtime, interval=1.0):
+    """Periodically publish BRGB state so backend/frontend can track simulator changes."""
+    last_color = [None]
 
-    while not stop_event.is_set():
+    def publish_if_changed():
         try:
             color = rgb_lamp.get_current_color() if rgb_lamp else 'off'
-            if color != last_color:
+            if color != last_color[0]:
                 mqtt_publisher.publish_reading_now(
                     sensor_type='brgb_color',
                     value=BRGB_COLOR_TO_INDEX.get(color, 0),
@@ -62,29 +63,30 @@ def publish_brgb_state(rgb_lamp, mqtt_publisher, stop_event, interval=1.0):
                     simulated=True,
                     sensor_id='BRGB'
                 )
-                last_color = color
+                last_color[0] = color
         except Exception as e:
             print(f"⚠️ BRGB state publish error: {e}")
 
-        time.sleep(interval)
+    # publish_reading_now waits on the broker, keep it off the event loop
+    runtime.every("BRGB state publisher", interval, publish_if_changed, blocking=True)
+    print("🌈 BRGB state publisher started")
 
 
-def cleanup_resources(mqtt_publisher, command_listener=None):
+def cleanup_resources(mqtt_publisher, connection=None):
     print("\nCleaning up resources...")
     
     if mqtt_publisher:
         try:
             mqtt_publisher.disconnect()
-            print("MQTT disconnected")
         except Exception as e:
-            print(f"Error disconnecting MQTT: {e}")
+            print(f"Error stopping MQTT publisher: {e}")
     
-    if command_listener:
+    if connection:
         try:
-            command_listener.disconnect()
-            print("Command listener disconnected")
+            connection.disconnect()
+            print("MQTT disconnected")
         except Exception as e:
-            print(f"Error disconnecting command listener: {e}")
+            print(f"Error disconnecting MQTT: {e}")
 
 
 if __name__ == "__main__":
@@ -93,8 +95,8 @@ if __name__ == "__main__":
     print('='*60)
     
     settings = load_settings()
-    threads = []
     stop_event = threading.Event()
+    runtime = create_runtime(settings, stop_event)
     
     device_info = settings.get('device', {})
     print(f"\n Device Configuration:")
@@ -102,6 +104,7 @@ if __name__ == "__main__":
     print(f"  Device Name: {device_info.get('device_name', 'N/A')}")
     print(f"  Location: {device_info.get('location', 'N/A')}")
     print(f"  Description: {device_info.get('description', 'N/A')}")
+    print(f"  Runtime: {runtime.mode}")
     
     mqtt_publisher = None
     command_listener = None
@@ -111,7 +114,6 @@ if __name__ == "__main__":
     dht1_sensor = None
     dht2_sensor = None
     dpir3_sensor = None
-    brgb_state_thread = None
     
     # Create a mutable wrapper for LCD controller (can be updated later)
     class LCDWrapper:
@@ -123,25 +125,28 @@ if __name__ == "__main__":
                 self.controller.update_sensor(temperature, humidity)
     
     lcd_wrapper = LCDWrapper()
+    # One broker connection for sensor data and commands
+    connection = MQTTConnection.from_settings(settings)
     
     try:
         # Initialize MQTT Publisher
         print("\nInitializing MQTT Publisher...")
-        mqtt_publisher = MQTTPublisher(settings)
+        mqtt_publisher = MQTTPublisher(settings, connection)
         if mqtt_publisher.connect():
             mqtt_publisher.start_daemon()
             print("✓ MQTT Publisher ready")
+        elif mqtt_publisher.spool:
+            mqtt_publisher.start_daemon()
+            print("⚠ MQTT broker unreachable, spooling readings to disk until it is back")
         else:
             print("⚠ MQTT connection failed, continuing without MQTT")
             mqtt_publisher = None
         
         # Initialize MQTT Command Listener
         print("\nInitializing MQTT Command Listener...")
-        mqtt_settings = settings.get('mqtt', {})
         command_listener = MQTTCommandListener(
-            broker=mqtt_settings.get('broker', 'localhost'),
-            port=mqtt_settings.get('port', 1883),
-            device_id=settings.get('device', {}).get('pi_id', 'PI3')
+            device_id=settings.get('device', {}).get('pi_id', 'PI3'),
+            connection=connection
         )
         if command_listener.connect():
             print("✓ Command Listener ready")
@@ -153,17 +158,17 @@ if __name__ == "__main__":
         
         # DHT1 - Bedroom Temperature & Humidity Sensor
         if 'DHT1' in settings:
-            dht1_sensor = run_dht1(settings['DHT1'], threads, stop_event, mqtt_publisher, lcd_wrapper)
+            dht1_sensor = run_dht1(settings['DHT1'], runtime, stop_event, mqtt_publisher, lcd_wrapper)
             print("✓ DHT1 Temperature & Humidity Sensor started (Bedroom)")
         
         # DHT2 - Master Bedroom Temperature & Humidity Sensor
         if 'DHT2' in settings:
-            dht2_sensor = run_dht2(settings['DHT2'], threads, stop_event, mqtt_publisher, lcd_wrapper)
+            dht2_sensor = run_dht2(settings['DHT2'], runtime, stop_event, mqtt_publisher, lcd_wrapper)
             print("✓ DHT2 Temperature & Humidity Sensor started (Master Bedroom)")
 
         # DPIR3 - Bedroom Motion Sensor
         if 'DPIR3' in settings:
-            dpir3_sensor = run_dpir3(settings['DPIR3'], threads, stop_event, mqtt_publisher)
+            dpir3_sensor = run_dpir3(settings['DPIR3'], runtime, stop_event, mqtt_publisher)
             print("✓ DPIR3 Motion Sensor started (Bedroom)")
         
         # Check if IR is simulated - it will control BRGB exclusively
@@ -177,28 +182,22 @@ if __name__ == "__main__":
                 # IR controls BRGB - disable BRGB's own simulation
                 print("⚠️  IR simulator detected - BRGB auto-cycling disabled (IR will control it)")
                 brgb_settings['simulated'] = False  # Disable BRGB auto-simulation
-                # Create BRGB but don't start its thread - IR will control it
+                # Create BRGB but don't schedule its color cycle - IR will control it
                 from RPI3.simulators.brgb import SimulatedRGBLamp
                 rgb_lamp = SimulatedRGBLamp()
                 print("✓ BRGB RGB Lamp initialized (controlled by IR)")
             else:
                 # Normal BRGB operation with auto-cycling
-                rgb_lamp = run_brgb(brgb_settings, threads, stop_event, command_listener)
+                rgb_lamp = run_brgb(brgb_settings, runtime, stop_event, command_listener)
                 print("✓ BRGB RGB Lamp initialized")
         
         # IR - Infrared Remote
         if 'IR' in settings:
-            ir_remote = run_ir(settings['IR'], command_listener, brgb_lamp=rgb_lamp, threads=threads, stop_event=stop_event)
+            ir_remote = run_ir(settings['IR'], command_listener, brgb_lamp=rgb_lamp, runtime=runtime, stop_event=stop_event)
             print("✓ IR Remote initialized")
 
         if rgb_lamp and mqtt_publisher:
-            brgb_state_thread = threading.Thread(
-                target=publish_brgb_state,
-                args=(rgb_lamp, mqtt_publisher, stop_event, 1.0),
-                daemon=True
-            )
-            brgb_state_thread.start()
-            threads.append(brgb_state_thread)
+            publish_brgb_state(rgb_lamp, mqtt_publisher, runtime, 1.0)
             print("✓ BRGB state sync publisher started")
 
         print("\nInitializing LCD Display...")
@@ -206,7 +205,7 @@ if __name__ == "__main__":
             # Create a dummy sensor object for LCD if DHT1 is available (even if simulated)
             dummy_sensor = dht1_sensor if dht1_sensor else object()  # Use dummy object if no real sensor
             try:
-                lcd_controller = run_lcd(settings['LCD'], stop_event, dht_sensor=dummy_sensor, mqtt_publisher=mqtt_publisher)
+                lcd_controller = run_lcd(settings['LCD'], stop_event, dht_sensor=dummy_sensor, mqtt_publisher=mqtt_publisher, runtime=runtime)
                 if lcd_controller:
                     lcd_wrapper.controller = lcd_controller  # Update wrapper so DHT sensors can use it
                     print("✓ LCD Display ready")
@@ -225,9 +224,18 @@ if __name__ == "__main__":
         print("Press Ctrl+C to stop...")
         print("="*60 + "\n")
         
+        started = time.time()
+        process_monitor = ProcessMonitor()
+        
+        def heartbeat():
+            print(f"💓 [PI3 Heartbeat] Running: {int(time.time() - started)}s")
+            print(f"   {process_monitor.format()}")
+            if mqtt_publisher:
+                print(f"   {mqtt_publisher.format_status()}")
+        
         # Keep main thread alive
-        while not stop_event.is_set():
-            time.sleep(1)
+        runtime.every("Heartbeat", 60, heartbeat)
+        runtime.run_forever()
             
     except KeyboardInterrupt:
         print("\n\nShutdown requested...")
@@ -240,14 +248,11 @@ if __name__ == "__main__":
         stop_event.set()
         
     finally:
-        # Wait for threads
-        print("\nWaiting for threads to complete...")
-        for thread in threads:
-            if thread.is_alive():
-                thread.join(timeout=2)
+        # Stop sensor loops and periodic jobs
+        runtime.shutdown(timeout=2)
         
         # Cleanup
-        cleanup_resources(mqtt_publisher, command_listener)
+        cleanup_resources(mqtt_publisher, connection)
         
         if lcd_controller:
             try:
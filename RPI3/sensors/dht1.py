@@ -87,13 +87,7 @@ def parseCheckCode(code):
 		return "DHTLIB_INVALID_VALUE"
 
 
-def run_dht_loop(dht, delay, callback, stop_event):
-		while True:
-			check = dht.readDHT11()
-			code = parseCheckCode(check)
-			humidity, temperature = dht.humidity, dht.temperature
-			timestamp = time.time()
-			callback(temperature, humidity, timestamp)
-			if stop_event.is_set():
-					break
-			time.sleep(delay)  # Delay between readings
+def read_dht(dht):
+	"""Read the sensor once and return (temperature, humidity); failed reads give DHTLIB_INVALID_VALUE"""
+	dht.readDHT11()
+	return dht.temperature, dht.humidity
@@ -1,7 +1,5 @@
 import random
 import time
-import threading
-from typing import Callable
 
 
 class SimulatedRGBLamp:
@@ -91,17 +89,3 @@ class SimulatedRGBLamp:
         """Cleanup"""
         print("💡 RGB Lamp: Cleanup complete")
 
-
-def run_brgb_simulator(lamp: SimulatedRGBLamp, interval: float, stop_event):
-    """Run RGB lamp simulator loop that periodically changes colors"""
-    print(f"💡 RGB Lamp Simulator: Starting color cycle loop (interval={interval}s)")
-    
-    try:
-        while not stop_event.is_set():
-            # Check and update color if needed
-            lamp._update_color_if_needed()
-            time.sleep(interval)
-    except KeyboardInterrupt:
-        print("💡 RGB Lamp Simulator: Interrupted")
-    finally:
-        print("💡 RGB Lamp Simulator: Stopped")
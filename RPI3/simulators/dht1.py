@@ -1,6 +1,5 @@
-import time
 import random
-from typing import Callable, Generator, Tuple
+from typing import Generator, Tuple
 
 
 def generate_dht_events(
@@ -8,7 +7,7 @@ def generate_dht_events(
     max_interval: float = 5.0,
     base_temp: float = 20.0,
     base_humidity: float = 45.0
-) -> Generator[Tuple[float, float, float], None, None]:
+) -> Generator[Tuple[float, Tuple[float, float]], None, None]:
     """
     Generate DHT1 bedroom temperature and humidity events.
     Bedroom typically cooler at night, moderate humidity.
@@ -29,27 +28,4 @@ def generate_dht_events(
         current_humidity = max(35.0, min(55.0, current_humidity))
         
         wait_time = random.uniform(min_interval, max_interval)
-        time.sleep(wait_time)
-        
-        yield round(current_temp, 2), round(current_humidity, 2), time.time()
-
-
-def run_dht1_simulator(callback: Callable, stop_event):
-    """DHT1 Simulator for Bedroom"""
-    print("DHT1 Simulator (Bedroom): Starting temperature and humidity generation")
-    
-    try:
-        for temperature, humidity, timestamp in generate_dht_events():
-            if stop_event.is_set():
-                print("DHT1 Simulator: Stop event detected, shutting down")
-                break
-
-            try:
-                callback(temperature, humidity, timestamp)
-            except Exception as e:
-                print(f"DHT1 Simulator: Error in callback: {e}")
-                
-    except KeyboardInterrupt:
-        print("DHT1 Simulator: Interrupted by user")
-    finally:
-        print("DHT1 Simulator: Stopped")
+        yield wait_time, (round(current_temp, 2), round(current_humidity, 2))
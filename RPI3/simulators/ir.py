@@ -198,23 +198,3 @@ class SimulatedIRRemote:
         """Cleanup"""
         print("🔴 IR Remote: Cleanup complete")
 
-
-def run_ir_simulator(ir_remote, interval=5, stop_event=None):
-    """Run IR simulator with auto-demo in loop
-    
-    Args:
-        ir_remote: SimulatedIRRemote instance
-        interval: Check interval in seconds
-        stop_event: Threading event to stop the loop
-    """
-    print(f"🔴 IR Simulator: Starting auto-demo loop (interval={interval}s)")
-    
-    while not (stop_event and stop_event.is_set()):
-        try:
-            ir_remote.run_auto_demo()
-            time.sleep(1)  # Check every second
-        except Exception as e:
-            print(f"✗ IR Simulator: Error in auto-demo: {e}")
-            break
-    
-    print("🔴 IR Simulator: Auto-demo loop stopped")
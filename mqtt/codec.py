@@ -0,0 +1,316 @@
+"""
+Wire codecs for sensor batch payloads.
+
+The codec is chosen per Pi (settings.json -> mqtt.codec) and advertised with a
+topic suffix: JSON batches keep the bare topic (sensors/<type>), binary ones
+are published to sensors/<type>/<codec>. The server picks the decoder from
+the topic, so Pis can be migrated one at a time.
+
+    json    - UTF-8 JSON (legacy or columnar payload)
+    struct  - stdlib struct-packed columnar payload, no extra dependency
+    gorilla - struct header + delta-of-delta / XOR compressed columns (large batches)
+    msgpack - MessagePack columnar payload (requires the msgpack package)
+
+Run `python -m mqtt.codec` for a size / speed comparison.
+"""
+import json
+import struct
+from datetime import datetime, timedelta
+from typing import Any, Dict, Union
+
+from mqtt.payload import NANOS_PER_UNIT, PAYLOAD_VERSION, TIMESTAMP_PRECISIONS
+from mqtt import gorilla
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def iso_to_micros(timestamp: str) -> int:
+    """Convert a naive UTC ISO timestamp to integer microseconds since epoch"""
+    return (datetime.fromisoformat(timestamp) - EPOCH) // ONE_MICROSECOND
+
+
+def micros_to_iso(micros: int) -> str:
+    """Convert integer microseconds since epoch back to a naive UTC ISO timestamp"""
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def timestamp_to_iso(timestamp, precision: str = None) -> str:
+    """Reading timestamp (ISO string, or epoch int at the batch precision) as a naive UTC ISO string"""
+    if precision in NANOS_PER_UNIT:
+        return micros_to_iso(timestamp * NANOS_PER_UNIT[precision] // 1000)
+    return timestamp
+
+
+class JSONCodec:
+    """Plain JSON - the default and the only codec that carries legacy payloads"""
+    name = 'json'
+
+    def encode(self, batch: Dict[str, Any]) -> str:
+        return json.dumps(batch)
+
+    def decode(self, data: Union[bytes, str]) -> Dict[str, Any]:
+        if isinstance(data, bytes):
+            data = data.decode()
+        return json.loads(data)
+
+
+class StructCodec:
+    """
+    Struct-packed columnar payload.
+
+    Layout (big endian):
+        magic 'SB', version u8, flags u8 (bit0 simulated, bit1 has sensor_id,
+                                           bits 2-4 timestamp precision, 0 = ISO,
+                                           bit5 multi-field, bit6 u16 string lengths)
+        device_id, device_name, location, sensor_type[, sensor_id][, field names...]
+            (u16 length + UTF-8 each, length 0xFFFF = None;
+             u8 lengths without bit6, as sent by older publishers)
+        count u32
+        count x int64 timestamps (epoch ints at the batch precision; microseconds for ISO batches)
+        count x float64 values, once per field for multi-field batches
+    """
+    name = 'struct'
+    MAGIC = b'SB'
+    HEADER = struct.Struct('>2sBBB')  # magic, version, flags, string count
+    COUNT = struct.Struct('>I')
+    FLAG_SIMULATED = 0x01
+    FLAG_SENSOR_ID = 0x02
+    PRECISION_SHIFT = 2
+    PRECISION_MASK = 0x1C
+    FLAG_FIELDS = 0x20
+    FLAG_WIDE_STRINGS = 0x40
+    STRING_LENGTH = struct.Struct('>H')
+    NONE_LENGTH = 0xFFFF
+
+    def encode(self, batch: Dict[str, Any]) -> bytes:
+        header = self._pack_header(batch)
+        timestamps = batch['timestamps']
+        count = len(timestamps)
+        if batch.get('precision'):
+            micros = timestamps
+        else:
+            micros = [iso_to_micros(ts) for ts in timestamps]
+        floats = [float('nan') if value is None else float(value)
+                  for column in self._value_columns(batch) for value in column]
+
+        return b''.join((
+            header,
+            self.COUNT.pack(count),
+            struct.pack(f'>{count}q', *micros),
+            struct.pack(f'>{len(floats)}d', *floats)
+        ))
+
+    def decode(self, data: bytes) -> Dict[str, Any]:
+        batch, offset = self._unpack_header(data)
+        (count,) = self.COUNT.unpack_from(data, offset)
+        offset += self.COUNT.size
+        micros = struct.unpack_from(f'>{count}q', data, offset)
+        offset += 8 * count
+
+        batch['batch_size'] = count
+        if batch.get('precision'):
+            batch['timestamps'] = list(micros)
+        else:
+            batch['timestamps'] = [micros_to_iso(us) for us in micros]
+        names = batch.pop('field_names', None)
+        floats = struct.unpack_from(f'>{count * len(names or [None])}d', data, offset)
+        if names is None:
+            batch['values'] = list(floats)
+        else:
+            batch['fields'] = {name: list(floats[i * count:(i + 1) * count]) for i, name in enumerate(names)}
+        return batch
+
+    @staticmethod
+    def _value_columns(batch: Dict[str, Any]):
+        """Value columns in wire order: one per field, or just 'values'"""
+        if 'fields' in batch:
+            return list(batch['fields'].values())
+        return [batch['values']]
+
+    def _pack_header(self, batch: Dict[str, Any]) -> bytes:
+        """Pack magic, version, flags and the metadata strings"""
+        if batch.get('v') != PAYLOAD_VERSION:
+            raise ValueError(f"{self.name} codec requires the columnar payload format")
+
+        device = batch['device']
+        strings = [device['device_id'], device['device_name'], device['location'], batch['sensor_type']]
+        flags = self.FLAG_WIDE_STRINGS | (self.FLAG_SIMULATED if batch.get('simulated') else 0)
+        if batch.get('precision'):
+            flags |= TIMESTAMP_PRECISIONS.index(batch['precision']) << self.PRECISION_SHIFT
+        if batch.get('sensor_id') is not None:
+            flags |= self.FLAG_SENSOR_ID
+            strings.append(batch['sensor_id'])
+        if 'fields' in batch:
+            flags |= self.FLAG_FIELDS
+            strings.extend(batch['fields'])
+
+        parts = [self.HEADER.pack(self.MAGIC, PAYLOAD_VERSION, flags, len(strings))]
+        for text in strings:
+            if text is None:
+                parts.append(self.STRING_LENGTH.pack(self.NONE_LENGTH))
+                continue
+            raw = str(text).encode()
+            if len(raw) >= self.NONE_LENGTH:
+                raise ValueError(f"{self.name} codec: metadata string longer than {self.NONE_LENGTH - 1} bytes")
+            parts.append(self.STRING_LENGTH.pack(len(raw)) + raw)
+        return b''.join(parts)
+
+    def _unpack_header(self, data: bytes):
+        """Inverse of _pack_header. Returns (batch dict without columns, offset)"""
+        magic, version, flags, string_count = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or version != PAYLOAD_VERSION:
+            raise ValueError(f"Not a {self.name} v{PAYLOAD_VERSION} batch")
+
+        offset = self.HEADER.size
+        strings = []
+        wide = flags & self.FLAG_WIDE_STRINGS
+        for _ in range(string_count):
+            if wide:
+                (length,) = self.STRING_LENGTH.unpack_from(data, offset)
+                offset += self.STRING_LENGTH.size
+                if length == self.NONE_LENGTH:
+                    strings.append(None)
+                    continue
+            else:
+                length = data[offset]
+                offset += 1
+            strings.append(data[offset:offset + length].decode())
+            offset += length
+
+        batch = {
+            'v': version,
+            'device': {'device_id': strings[0], 'device_name': strings[1], 'location': strings[2]},
+            'sensor_type': strings[3],
+            'sensor_id': strings[4] if flags & self.FLAG_SENSOR_ID else None,
+            'simulated': bool(flags & self.FLAG_SIMULATED)
+        }
+        precision = (flags & self.PRECISION_MASK) >> self.PRECISION_SHIFT
+        if precision:
+            batch['precision'] = TIMESTAMP_PRECISIONS[precision]
+        if flags & self.FLAG_FIELDS:
+            # Temporary: decode() turns the names into the 'fields' dict
+            batch['field_names'] = strings[5 if flags & self.FLAG_SENSOR_ID else 4:]
+        return batch, offset
+
+
+class GorillaCodec(StructCodec):
+    """
+    Struct header followed by Gorilla-compressed columns.
+
+    Timestamps are carried as delta-of-delta (epoch ints at the batch precision,
+    milliseconds for ISO batches), values as XOR-encoded float64. Meant for large
+    batches of slowly changing readings.
+    """
+    name = 'gorilla'
+    MAGIC = b'SG'
+
+    def encode(self, batch: Dict[str, Any]) -> bytes:
+        header = self._pack_header(batch)
+        if batch.get('precision'):
+            millis = batch['timestamps']
+        else:
+            millis = [iso_to_micros(ts) // 1000 for ts in batch['timestamps']]
+        columns = [[float('nan') if value is None else float(value) for value in column]
+                   for column in self._value_columns(batch)]
+        return header + self.COUNT.pack(len(millis)) + gorilla.compress_columns(millis, columns)
+
+    def decode(self, data: bytes) -> Dict[str, Any]:
+        batch, offset = self._unpack_header(data)
+        (count,) = self.COUNT.unpack_from(data, offset)
+        names = batch.pop('field_names', None)
+        millis, columns = gorilla.decompress_columns(data, count, len(names or [None]), offset + self.COUNT.size)
+
+        batch['batch_size'] = count
+        if batch.get('precision'):
+            batch['timestamps'] = millis
+        else:
+            batch['timestamps'] = [micros_to_iso(ms * 1000) for ms in millis]
+        if names is None:
+            batch['values'] = columns[0]
+        else:
+            batch['fields'] = dict(zip(names, columns))
+        return batch
+
+
+class MsgPackCodec:
+    """MessagePack-encoded payload (optional dependency)"""
+    name = 'msgpack'
+
+    def encode(self, batch: Dict[str, Any]) -> bytes:
+        return msgpack.packb(batch, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Dict[str, Any]:
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS = {
+    JSONCodec.name: JSONCodec(),
+    StructCodec.name: StructCodec(),
+    GorillaCodec.name: GorillaCodec(),
+    MsgPackCodec.name: MsgPackCodec(),
+}
+
+
+def get_codec(name: str = 'json'):
+    """Look up a codec by name"""
+    if name not in CODECS:
+        raise ValueError(f"Unknown codec '{name}'. Use one of: {', '.join(CODECS)}")
+    if name == MsgPackCodec.name and msgpack is None:
+        raise ValueError("msgpack codec selected but the msgpack package is not installed")
+    return CODECS[name]
+
+
+def topic_for_codec(topic: str, codec) -> str:
+    """Advertise the codec through a topic suffix (JSON keeps the bare topic)"""
+    if codec.name == JSONCodec.name:
+        return topic
+    return f"{topic}/{codec.name}"
+
+
+def codec_for_topic(topic: str):
+    """Pick the decoder for a sensors/<type>[/<codec>] topic"""
+    suffix = topic.rsplit('/', 1)[-1]
+    if topic.count('/') >= 2 and suffix in CODECS:
+        return get_codec(suffix)
+    return CODECS[JSONCodec.name]
+
+
+if __name__ == '__main__':
+    import random
+    import timeit
+
+    from mqtt.payload import encode_batch
+
+    device_info = {'pi_id': 'PI2', 'device_name': 'RaspberryPi_Kitchen', 'location': 'Building_A_Floor_1'}
+    readings = 50
+    start = datetime.utcnow()
+    timestamps = [(start + timedelta(milliseconds=500 * i)).isoformat() for i in range(readings)]
+    epoch_ms = [iso_to_micros(ts) // 1000 for ts in timestamps]
+    values = [round(random.uniform(-0.1, 0.1), 3) for _ in range(readings)]
+
+    candidates = [('json/legacy', CODECS['json'], 'legacy', 'iso'), ('json/columnar', CODECS['json'], 'columnar', 'iso'),
+                  ('json/epoch_ms', CODECS['json'], 'columnar', 'ms'),
+                  ('struct', CODECS['struct'], 'columnar', 'iso'), ('struct/epoch_ms', CODECS['struct'], 'columnar', 'ms'),
+                  ('gorilla', CODECS['gorilla'], 'columnar', 'iso'), ('gorilla/epoch_ms', CODECS['gorilla'], 'columnar', 'ms')]
+    if msgpack is not None:
+        candidates.append(('msgpack', CODECS['msgpack'], 'columnar', 'iso'))
+        candidates.append(('msgpack/epoch_ms', CODECS['msgpack'], 'columnar', 'ms'))
+
+    print(f"{readings}-reading accel_x batch")
+    print(f"{'codec':<20}{'bytes':>8}{'encode us/rdg':>16}{'decode us/rdg':>16}")
+    for label, codec, payload_format, precision in candidates:
+        batch = encode_batch(device_info, 'accel_x', None, True, epoch_ms if precision == 'ms' else timestamps,
+                             values, payload_format, precision)
+        encoded = codec.encode(batch)
+        size = len(encoded.encode() if isinstance(encoded, str) else encoded)
+        loops = 200
+        encode_us = timeit.timeit(lambda: codec.encode(batch), number=loops) / loops / readings * 1e6
+        decode_us = timeit.timeit(lambda: codec.decode(encoded), number=loops) / loops / readings * 1e6
+        print(f"{label:<20}{size:>8}{encode_us:>16.2f}{decode_us:>16.2f}")
@@ -0,0 +1,231 @@
+"""
+Gorilla-style time series compression.
+
+Timestamps are stored as delta-of-delta with variable-length buckets and
+values as XOR of consecutive float64 bit patterns, following Pelkonen et al.,
+"Gorilla: A Fast, Scalable, In-Memory Time Series Database" (VLDB 2015).
+Near-regular timestamps and slowly changing readings (DHT, DUS, GSG) shrink
+to a few bits per sample.
+
+Decoding parses the control bits into columns of deltas / XOR words first and
+then rebuilds the series in bulk (itertools.accumulate + one struct.unpack).
+"""
+import itertools
+import operator
+import struct
+from typing import List, Sequence, Tuple
+
+
+# (control bits, control length, payload bits) for delta-of-delta buckets
+DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+)
+DOD_FALLBACK = (0b1111, 4, 64)
+
+
+class BitWriter:
+    """Append-only big-endian bit stream"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value: int, nbits: int):
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+        while self.nbits >= 8:
+            self.nbits -= 8
+            self.buffer.append((self.acc >> self.nbits) & 0xFF)
+        self.acc &= (1 << self.nbits) - 1
+
+    def getvalue(self) -> bytes:
+        if self.nbits:
+            return bytes(self.buffer) + bytes(((self.acc << (8 - self.nbits)) & 0xFF,))
+        return bytes(self.buffer)
+
+
+class BitReader:
+    """Big-endian bit stream reader"""
+
+    def __init__(self, data: bytes, offset: int = 0):
+        self.data = data
+        self.pos = offset * 8
+
+    def read(self, nbits: int) -> int:
+        start_byte = self.pos >> 3
+        end_byte = (self.pos + nbits + 7) >> 3
+        chunk = int.from_bytes(self.data[start_byte:end_byte], 'big')
+        shift = (end_byte << 3) - (self.pos + nbits)
+        self.pos += nbits
+        return (chunk >> shift) & ((1 << nbits) - 1)
+
+    def read_bit(self) -> int:
+        byte = self.data[self.pos >> 3]
+        bit = (byte >> (7 - (self.pos & 7))) & 1
+        self.pos += 1
+        return bit
+
+
+def _signed(value: int, nbits: int) -> int:
+    """Interpret the low nbits of value as two's complement"""
+    if value & (1 << (nbits - 1)):
+        return value - (1 << nbits)
+    return value
+
+
+def float_bits(values: Sequence[float]) -> List[int]:
+    """Reinterpret float64 values as unsigned 64-bit integers"""
+    return list(struct.unpack(f'>{len(values)}Q', struct.pack(f'>{len(values)}d', *values)))
+
+
+# ============ ENCODING ============
+
+def encode_timestamps(writer: BitWriter, timestamps: Sequence[int]):
+    """Write integer timestamps as first value, first delta, then delta-of-deltas"""
+    if not timestamps:
+        return
+    writer.write(timestamps[0], 64)
+    if len(timestamps) == 1:
+        return
+
+    prev_delta = timestamps[1] - timestamps[0]
+    writer.write(prev_delta, 64)
+    prev = timestamps[1]
+
+    for timestamp in timestamps[2:]:
+        delta = timestamp - prev
+        dod = delta - prev_delta
+        prev_delta = delta
+        prev = timestamp
+
+        if dod == 0:
+            writer.write(0, 1)
+            continue
+        for control, control_bits, payload_bits in DOD_BUCKETS:
+            limit = 1 << (payload_bits - 1)
+            if -limit <= dod < limit:
+                writer.write(control, control_bits)
+                writer.write(dod, payload_bits)
+                break
+        else:
+            control, control_bits, payload_bits = DOD_FALLBACK
+            writer.write(control, control_bits)
+            writer.write(dod, payload_bits)
+
+
+def encode_values(writer: BitWriter, values: Sequence[float]):
+    """Write float64 values as XOR against the previous value"""
+    if not values:
+        return
+    words = float_bits(values)
+    prev = words[0]
+    writer.write(prev, 64)
+    prev_leading, prev_trailing = 65, 65  # No window yet
+
+    for word in words[1:]:
+        xor = word ^ prev
+        prev = word
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        writer.write(1, 1)
+
+        if prev_leading <= leading and prev_trailing <= trailing:
+            # Fits inside the previous meaningful-bit window
+            meaningful = 64 - prev_leading - prev_trailing
+            writer.write(0, 1)
+            writer.write(xor >> prev_trailing, meaningful)
+        else:
+            meaningful = 64 - leading - trailing
+            writer.write(1, 1)
+            writer.write(leading, 5)
+            writer.write(meaningful & 0x3F, 6)  # 64 is stored as 0
+            writer.write(xor >> trailing, meaningful)
+            prev_leading, prev_trailing = leading, trailing
+
+
+# ============ DECODING ============
+
+def decode_timestamps(reader: BitReader, count: int) -> List[int]:
+    """Read count timestamps written by encode_timestamps"""
+    if count == 0:
+        return []
+    first = _signed(reader.read(64), 64)
+    if count == 1:
+        return [first]
+
+    first_delta = _signed(reader.read(64), 64)
+    dods = []
+    for _ in range(count - 2):
+        if not reader.read_bit():
+            dods.append(0)
+            continue
+        if not reader.read_bit():
+            payload_bits = 7
+        elif not reader.read_bit():
+            payload_bits = 9
+        elif not reader.read_bit():
+            payload_bits = 12
+        else:
+            payload_bits = 64
+        dods.append(_signed(reader.read(payload_bits), payload_bits))
+
+    # Rebuild deltas, then timestamps, in bulk
+    deltas = itertools.accumulate(dods, initial=first_delta)
+    return list(itertools.accumulate(deltas, initial=first))
+
+
+def decode_values(reader: BitReader, count: int) -> List[float]:
+    """Read count float64 values written by encode_values"""
+    if count == 0:
+        return []
+    xors = [reader.read(64)]
+    leading, meaningful = 0, 64
+
+    for _ in range(count - 1):
+        if not reader.read_bit():
+            xors.append(0)
+            continue
+        if reader.read_bit():
+            leading = reader.read(5)
+            meaningful = reader.read(6) or 64
+        trailing = 64 - leading - meaningful
+        xors.append(reader.read(meaningful) << trailing)
+
+    words = list(itertools.accumulate(xors, operator.xor))
+    return list(struct.unpack(f'>{count}d', struct.pack(f'>{count}Q', *words)))
+
+
+def compress(timestamps: Sequence[int], values: Sequence[float]) -> bytes:
+    """Compress a timestamp column and a value column into one bit stream"""
+    return compress_columns(timestamps, [values])
+
+
+def decompress(data: bytes, count: int, offset: int = 0) -> Tuple[List[int], List[float]]:
+    """Inverse of compress()"""
+    timestamps, columns = decompress_columns(data, count, 1, offset)
+    return timestamps, columns[0]
+
+
+def compress_columns(timestamps: Sequence[int], columns: Sequence[Sequence[float]]) -> bytes:
+    """Compress a timestamp column and several value columns (multi-field readings)"""
+    writer = BitWriter()
+    encode_timestamps(writer, timestamps)
+    for values in columns:
+        encode_values(writer, values)
+    return writer.getvalue()
+
+
+def decompress_columns(data: bytes, count: int, column_count: int,
+                       offset: int = 0) -> Tuple[List[int], List[List[float]]]:
+    """Inverse of compress_columns()"""
+    reader = BitReader(data, offset)
+    timestamps = decode_timestamps(reader, count)
+    columns = [decode_values(reader, count) for _ in range(column_count)]
+    return timestamps, columns
@@ -0,0 +1,192 @@
+"""
+In-process metrics for the Pi publishers.
+
+A MetricsRegistry holds labelled counters, gauges and histograms. A snapshot
+is a plain dict that is published periodically to telemetry/<pi_id>/publisher
+and can also be served as JSON over HTTP:
+
+    {
+        "counters":   {"readings_published": {"sensor_type=temperature": 120, ...}, ...},
+        "gauges":     {"connected": 1, "queue_depth": {"lane=bulk": 3, ...}, ...},
+        "histograms": {"ack_latency_seconds": {"lane=bulk": {"count": ..., "sum": ..., "max": ...,
+                                                              "p50": ..., "p95": ..., "buckets": {...}}}}
+    }
+"""
+import bisect
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+
+# Upper bounds (seconds) for latency histograms
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upper bounds for size histograms (readings per batch, bytes per payload)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000)
+
+
+def _label_key(labels: Dict[str, str]) -> str:
+    return ','.join(f"{key}={labels[key]}" for key in sorted(labels))
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+
+class Gauge:
+    """Value that is set directly or read from a callback at snapshot time"""
+
+    def __init__(self, fn: Callable[[], float] = None):
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self.fn is not None:
+            try:
+                return self.fn()
+            except Exception:
+                return None
+        return self.value
+
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are estimated from bucket bounds"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.lock = threading.Lock()
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, q: float):
+        """Upper bound of the bucket holding the q-th quantile (max for the +Inf bucket)"""
+        with self.lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+            return self.max
+
+    def get(self) -> dict:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        with self.lock:
+            buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts) if count}
+            if self.counts[-1]:
+                buckets['+Inf'] = self.counts[-1]
+            return {
+                'count': self.count,
+                'sum': round(self.sum, 6),
+                'max': self.max,
+                'p50': p50,
+                'p95': p95,
+                'buckets': buckets
+            }
+
+
+class MetricsRegistry:
+    """Named, labelled metrics created on first use"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def _get(self, store: dict, factory, name: str, labels: Dict[str, str]):
+        key = (name, _label_key(labels))
+        metric = store.get(key)
+        if metric is None:
+            with self.lock:
+                metric = store.setdefault(key, factory())
+        return metric
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get(self.counters, Counter, name, labels)
+
+    def gauge(self, name: str, fn: Callable[[], float] = None, **labels) -> Gauge:
+        return self._get(self.gauges, lambda: Gauge(fn), name, labels)
+
+    def histogram(self, name: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels) -> Histogram:
+        return self._get(self.histograms, lambda: Histogram(buckets), name, labels)
+
+    def total(self, name: str) -> float:
+        """Sum of a counter over all label sets"""
+        with self.lock:
+            metrics = [metric for (metric_name, _), metric in self.counters.items() if metric_name == name]
+        return sum(metric.get() for metric in metrics)
+
+    def snapshot(self) -> dict:
+        """Current value of every metric, grouped by name and label set"""
+        with self.lock:
+            groups = {
+                'counters': list(self.counters.items()),
+                'gauges': list(self.gauges.items()),
+                'histograms': list(self.histograms.items())
+            }
+
+        result = {}
+        for group, items in groups.items():
+            values = result.setdefault(group, {})
+            for (name, label_key), metric in items:
+                if label_key:
+                    values.setdefault(name, {})[label_key] = metric.get()
+                else:
+                    values[name] = metric.get()
+        return result
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    snapshot_fn = None
+
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = json.dumps(self.snapshot_fn()).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep the device console for sensor output
+
+
+def serve_metrics(snapshot_fn: Callable[[], dict], host: str = '0.0.0.0', port: int = 9100):
+    """Serve snapshot_fn() as JSON on http://host:port/metrics from a daemon thread"""
+    handler = type('MetricsHandler', (_MetricsHandler,), {'snapshot_fn': staticmethod(snapshot_fn)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    print(f"Metrics: Serving JSON on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,155 @@
+"""
+Sensor batch payload formats shared by the Pi publishers and the server.
+
+legacy (v1) - {"batch_size": N, "readings": [{...full reading...}, ...]}
+columnar (v2) - one header plus parallel arrays:
+    {"v": 2, "device": {...}, "sensor_type": ..., "sensor_id": ..., "simulated": ...,
+     "batch_size": N, "timestamps": [...], "values": [...]}
+
+Multi-field readings (e.g. climate{temperature,humidity}, imu{ax..gz}) pass a
+dict as the value. Legacy readings then carry "fields" instead of "value", and
+columnar batches carry "fields": {name: [column]} instead of "values".
+
+Timestamps are naive UTC ISO strings by default. A columnar batch may instead
+carry integer epoch timestamps, announced by a "precision" key (s/ms/us/ns),
+which the server scales to nanoseconds for InfluxDB.
+"""
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List
+
+PAYLOAD_VERSION = 2
+PAYLOAD_FORMATS = ('legacy', 'columnar')
+TIMESTAMP_PRECISIONS = ('iso', 's', 'ms', 'us', 'ns')
+NANOS_PER_UNIT = {'s': 1_000_000_000, 'ms': 1_000_000, 'us': 1_000, 'ns': 1}
+
+
+def timestamp_clock(precision: str = 'iso') -> Callable[[], Any]:
+    """Return a function producing reading timestamps at the given precision"""
+    if precision == 'iso':
+        return lambda: datetime.utcnow().isoformat()
+    if precision == 'ns':
+        return time.time_ns
+    divisor = NANOS_PER_UNIT[precision]
+    return lambda: time.time_ns() // divisor
+
+
+def field_names(values: List[Dict[str, Any]]) -> List[str]:
+    """Field names of multi-field values, in order of first appearance"""
+    return list(dict.fromkeys(name for value in values for name in value))
+
+
+def encode_batch(device_info: Dict[str, Any], sensor_type: str, sensor_id, simulated: bool,
+                 timestamps: List[Any], values: List[Any], payload_format: str = 'columnar',
+                 precision: str = 'iso') -> Dict[str, Any]:
+    """Build a batch payload dict for one sensor. Dict values make a multi-field batch."""
+    multi_field = bool(values) and isinstance(values[0], dict)
+
+    if payload_format == 'legacy':
+        device_id = device_info['pi_id']
+        device_name = device_info['device_name']
+        location = device_info['location']
+        value_key = 'fields' if multi_field else 'value'
+        return {
+            'batch_size': len(values),
+            'readings': [
+                {
+                    'timestamp': timestamp,
+                    'device_id': device_id,
+                    'device_name': device_name,
+                    'location': location,
+                    'sensor_type': sensor_type,
+                    value_key: value,
+                    'simulated': simulated,
+                    'sensor_id': sensor_id
+                }
+                for timestamp, value in zip(timestamps, values)
+            ]
+        }
+
+    batch = {
+        'v': PAYLOAD_VERSION,
+        'device': {
+            'device_id': device_info['pi_id'],
+            'device_name': device_info['device_name'],
+            'location': device_info['location']
+        },
+        'sensor_type': sensor_type,
+        'sensor_id': sensor_id,
+        'simulated': simulated,
+        'batch_size': len(values),
+        'timestamps': timestamps
+    }
+    if multi_field:
+        batch['fields'] = {name: [value.get(name) for value in values] for name in field_names(values)}
+    else:
+        batch['values'] = values
+    if precision != 'iso':
+        batch['precision'] = precision
+    return batch
+
+
+def batch_sensor_type(payload: Dict[str, Any]) -> str:
+    """Get the sensor type of a batch without decoding it"""
+    if 'readings' in payload:
+        readings = payload['readings']
+        return readings[0].get('sensor_type', 'unknown') if readings else 'unknown'
+    return payload.get('sensor_type', 'unknown')
+
+
+def batch_device_id(payload: Dict[str, Any]) -> str:
+    """Get the device_id of a batch without iterating its readings"""
+    if 'readings' in payload:
+        readings = payload['readings']
+        return readings[0].get('device_id') if readings else None
+    return payload.get('device', {}).get('device_id')
+
+
+def iter_readings(payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield readings in the legacy per-reading shape, whatever the batch format"""
+    if 'readings' in payload:
+        yield from payload['readings']
+        return
+
+    version = payload.get('v')
+    if version != PAYLOAD_VERSION:
+        raise ValueError(f"Unsupported batch payload version: {version}")
+
+    device = payload['device']
+    device_id = device['device_id']
+    device_name = device['device_name']
+    location = device['location']
+    sensor_type = payload['sensor_type']
+    sensor_id = payload.get('sensor_id')
+    simulated = payload.get('simulated', False)
+    precision = payload.get('precision')
+
+    if 'fields' in payload:
+        names = list(payload['fields'])
+        columns = [payload['fields'][name] for name in names]
+        for timestamp, *row in zip(payload['timestamps'], *columns):
+            yield {
+                'timestamp': timestamp,
+                'precision': precision,
+                'device_id': device_id,
+                'device_name': device_name,
+                'location': location,
+                'sensor_type': sensor_type,
+                'fields': dict(zip(names, row)),
+                'simulated': simulated,
+                'sensor_id': sensor_id
+            }
+        return
+
+    for timestamp, value in zip(payload['timestamps'], payload['values']):
+        yield {
+            'timestamp': timestamp,
+            'precision': precision,
+            'device_id': device_id,
+            'device_name': device_name,
+            'location': location,
+            'sensor_type': sensor_type,
+            'value': value,
+            'simulated': simulated,
+            'sensor_id': sensor_id
+        }
@@ -1,215 +1,393 @@
 import threading
 import queue
+import heapq
+import itertools
 import time
 import json
 import paho.mqtt.client as mqtt
+from collections import deque
 from typing import Dict, Any
 from datetime import datetime
+from mqtt.spool import DiskSpool
+from mqtt.payload import encode_batch, timestamp_clock, TIMESTAMP_PRECISIONS
+from mqtt.codec import get_codec, topic_for_codec, GorillaCodec
+from mqtt.metrics import MetricsRegistry, SIZE_BUCKETS, serve_metrics
+from shared.mqtt_connection import MQTTConnection
+
+
+# Sensor types published through the critical lane unless settings say otherwise
+DEFAULT_CRITICAL_TYPES = ('door', 'motion', 'button', 'buzzer')
+# What to do with a bulk batch when the in-flight window is full
+INFLIGHT_POLICIES = ('block', 'drop_oldest', 'spool')
+# Rates reported with each metrics snapshot -> counter they are derived from
+RATE_COUNTERS = {
+    'bytes_per_second': 'bytes_published',
+    'readings_per_second': 'readings_published',
+    'enqueued_per_second': 'readings_enqueued',
+    'dropped_per_second': 'readings_dropped'
+}
+# Acks for mids we have not registered yet are kept this long (s). The connection
+# is shared, so acks of other components' publishes land here too
+EARLY_ACK_TTL = 10.0
 
 
 class MQTTPublisher:
-    def __init__(self, settings: Dict[str, Any]):
-        self.broker = settings['mqtt']['broker']
-        self.port = settings['mqtt']['port']
-        self.client_id = settings['mqtt']['client_id']
+    def __init__(self, settings: Dict[str, Any], connection: MQTTConnection = None):
         self.topics = settings['mqtt']['topics']
         self.batch_size = settings['mqtt']['batch_size']
         self.batch_interval = settings['mqtt']['batch_interval']
         self.device_info = settings['device']
+        self.payload_format = settings['mqtt'].get('payload_format', 'legacy')
+        self.codec = get_codec(settings['mqtt'].get('codec', 'json'))
+        if self.codec.name != 'json' and self.payload_format != 'columnar':
+            print(f"MQTT: '{self.codec.name}' codec requires the columnar payload format, switching to it")
+            self.payload_format = 'columnar'
+        # Reading timestamps: ISO strings (default) or integer epoch s/ms/us/ns
+        self.timestamp_precision = settings['mqtt'].get('timestamp_precision', 'iso')
+        if self.timestamp_precision not in TIMESTAMP_PRECISIONS:
+            print(f"MQTT: Unknown timestamp precision '{self.timestamp_precision}', using ISO timestamps")
+            self.timestamp_precision = 'iso'
+        if self.timestamp_precision != 'iso' and self.payload_format != 'columnar':
+            print("MQTT: Epoch timestamps require the columnar payload format, switching to it")
+            self.payload_format = 'columnar'
+        self.clock = timestamp_clock(self.timestamp_precision)
+        # Batches at least this large are Gorilla-compressed (0 disables)
+        self.compress_min_batch = settings['mqtt'].get('compress_min_batch', 0)
+        self.compressor = GorillaCodec()
+        if self.compress_min_batch and self.payload_format != 'columnar':
+            print("MQTT: Batch compression requires the columnar payload format, disabling it")
+            self.compress_min_batch = 0
         
-        self.client = None
-        self.connected = False
+        # The Pi's shared connection; a publisher without one opens and owns its own
+        self.owns_connection = connection is None
+        self.connection = connection or MQTTConnection.from_settings(settings)
         self.message_queue = queue.Queue()
         self.lock = threading.Lock()
         self.stop_event = threading.Event()
         self.daemon_thread = None
         
-        self.batches = {
-            'temperature': [],
-            'humidity': [],
-            'motion': [],
-            'distance': [],
-            'door': [],
-            'button': [],
-            'buzzer': [],
-            'brgb_power': [],
-            'brgb_color': [],
-            'accel_x': [],
-            'accel_y': [],
-            'accel_z': [],
-            'gyro_x': [],
-            'gyro_y': [],
-            'gyro_z': []
-        }
-        self.last_send_time = {
-            'temperature': time.time(),
-            'humidity': time.time(),
-            'motion': time.time(),
-            'distance': time.time(),
-            'door': time.time(),
-            'button': time.time(),
-            'buzzer': time.time(),
-            'brgb_power': time.time(),
-            'brgb_color': time.time(),
-            'accel_x': time.time(),
-            'accel_y': time.time(),
-            'accel_z': time.time(),
-            'gyro_x': time.time(),
-            'gyro_y': time.time(),
-            'gyro_z': time.time()
-        }
+        # Optional store-and-forward spool for batches taken while the broker is unreachable
+        spool_settings = settings['mqtt'].get('spool', {})
+        self.spool = None
+        self.drain_rate = spool_settings.get('drain_rate', 20)
+        self.drain_thread = None
+        if spool_settings.get('enabled', False):
+            self.spool = DiskSpool(
+                spool_settings.get('path', f"spool/{self.device_info['pi_id']}"),
+                max_bytes=spool_settings.get('max_bytes', 50 * 1024 * 1024),
+                segment_bytes=spool_settings.get('segment_bytes', 1024 * 1024)
+            )
         
-    def _on_connect(self, client, userdata, flags, rc):
-        if rc == 0:
-            self.connected = True
-            print(f"✓ MQTT: Connected to {self.broker}:{self.port}")
-        else:
-            self.connected = False
-            error_messages = {
-                1: "Incorrect protocol version",
-                2: "Invalid client identifier",
-                3: "Server unavailable",
-                4: "Bad username or password",
-                5: "Not authorized"
-            }
-            print(f"✗ MQTT: Connection failed - {error_messages.get(rc, f'Unknown error {rc}')}")
+        # Batches are created on demand per (sensor_type, sensor_id, simulated)
+        # and hold (timestamp, value) pairs; device metadata is added once per payload
+        self.batch_policies = settings['mqtt'].get('batch_policies', {})
+        self.batches = {}
+        self.last_send_time = {}
+        self.start_time = time.monotonic()
+        
+        # Min-heap of (flush_deadline, seq, batch_key); stale entries are skipped lazily
+        self.deadlines = []
+        self.deadline_seq = itertools.count()
+        self.flush_deadline = {}
+        self.batch_started = {}
+        
+        # Critical lane: state changes that feed the alarm logic skip batching and
+        # are published one by one at QoS 1, with their own in-flight budget
+        critical = settings['mqtt'].get('critical_lane', {})
+        self.critical_types = set(critical.get('sensor_types', DEFAULT_CRITICAL_TYPES))
+        self.critical_qos = critical.get('qos', 1)
+        self.critical_max_inflight = critical.get('max_inflight', 10)
+        self.critical_budget = threading.Semaphore(self.critical_max_inflight)
+        self.critical_wait = critical.get('inflight_timeout', 5.0)
+        self.critical_queue = queue.Queue()
+        self.critical_thread = None
+        
+        # Unacknowledged publishes: mid -> (lane, sent_at). PUBACKs that race
+        # ahead of the registration are parked in early_acks
+        self.inflight_lock = threading.Lock()
+        self.inflight = {}
+        self.early_acks = {}  # mid -> monotonic time the ack arrived
+        
+        # Bulk in-flight window: caps unacknowledged batches (and so paho's
+        # internal queue) when the broker is slow
+        inflight = settings['mqtt'].get('inflight', {})
+        self.bulk_max_inflight = inflight.get('max_messages', 20)
+        # paho's own in-flight limit matches both lane budgets
+        self.connection.max_inflight_messages_set(self.bulk_max_inflight + self.critical_max_inflight)
+        self.bulk_budget = threading.Semaphore(self.bulk_max_inflight)
+        self.inflight_policy = inflight.get('policy', 'spool')
+        if self.inflight_policy not in INFLIGHT_POLICIES:
+            print(f"MQTT: Unknown in-flight policy '{self.inflight_policy}', using 'spool'")
+            self.inflight_policy = 'spool'
+        self.block_timeout = inflight.get('block_timeout', 10.0)
+        # drop_oldest parks batches here while the window is full
+        self.deferred = deque()
+        self.max_deferred = inflight.get('max_deferred', 100)
+        # Batches spooled because the window was full are replayed once acks come back
+        self.replay_pending = False
+        
+        # Metrics, published to telemetry/<pi_id>/publisher and optionally over HTTP
+        metrics_settings = settings['mqtt'].get('metrics', {})
+        self.metrics = MetricsRegistry()
+        self.metrics_interval = metrics_settings.get('interval', 60)
+        self.metrics_topic = metrics_settings.get('topic', f"telemetry/{self.device_info['pi_id']}/publisher")
+        self.metrics_http_port = metrics_settings.get('http_port')
+        self.metrics_thread = None
+        self.metrics_server = None
+        self.rates = {}
+        self._register_gauges()
+        
+        self.connection.add_connect_listener(self._on_connect)
+        self.connection.add_publish_listener(self._on_publish)
+        
+    @property
+    def connected(self) -> bool:
+        return self.connection.connected
+        
+    def _register_gauges(self):
+        """Gauges are read from live publisher state when a snapshot is taken"""
+        gauge = self.metrics.gauge
+        gauge('connected', lambda: int(self.connected))
+        gauge('queue_depth', self.message_queue.qsize, lane='bulk')
+        gauge('queue_depth', self.critical_queue.qsize, lane='critical')
+        gauge('open_batches', lambda: sum(1 for batch in list(self.batches.values()) if batch))
+        gauge('buffered_readings', lambda: sum(len(batch) for batch in list(self.batches.values())))
+        gauge('deferred_batches', lambda: len(self.deferred))
+        gauge('inflight', lambda: self._inflight_count('bulk'), lane='bulk')
+        gauge('inflight', lambda: self._inflight_count('critical'), lane='critical')
+        if self.spool:
+            gauge('spool_pending_bytes', self.spool.pending_bytes)
+            gauge('spool_segments', lambda: len(self.spool.segments))
     
-    def _on_disconnect(self, client, userdata, rc):
-        self.connected = False
-        if rc != 0:
-            print(f"✗ MQTT: Unexpected disconnection (code {rc})")
-
-    def _on_publish(self, client, userdata, mid):
-        pass
+    def _inflight_count(self, lane: str) -> int:
+        with self.inflight_lock:
+            return sum(1 for entry_lane, _ in self.inflight.values() if entry_lane == lane)
         
-    def connect(self, retry_count=3, retry_delay=2):
-        """Connect to MQTT broker with retry logic"""
-        for attempt in range(retry_count):
-            try:
-                print(f"MQTT: Connection attempt {attempt + 1}/{retry_count} to {self.broker}:{self.port}")
-                
-                # Create new client
-                self.client = mqtt.Client(client_id=self.client_id, clean_session=True)
-                self.client.on_connect = self._on_connect
-                self.client.on_disconnect = self._on_disconnect
-                self.client.on_publish = self._on_publish
-                
-                # Set connection timeout
-                self.client.connect(self.broker, self.port, 60)
-                self.client.loop_start()
-                
-                # Wait for connection
-                timeout = 5
-                start_time = time.time()
-                while not self.connected and (time.time() - start_time) < timeout:
-                    time.sleep(0.1)
-                
-                if self.connected:
-                    return True
-                else:
-                    print(f"✗ MQTT: Connection timeout on attempt {attempt + 1}")
-                    self.client.loop_stop()
-                    
-            except Exception as e:
-                print(f"✗ MQTT: Connection error on attempt {attempt + 1}: {e}")
-            
-            if attempt < retry_count - 1:
-                print(f"MQTT: Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+    def _on_connect(self):
+        self._start_drain()
+
+    def _on_publish(self, mid):
+        with self.inflight_lock:
+            entry = self.inflight.pop(mid, None)
+            if entry is None:
+                now = time.monotonic()
+                self.early_acks[mid] = now
+                if len(self.early_acks) > 64:
+                    self.early_acks = {m: t for m, t in self.early_acks.items() if now - t < EARLY_ACK_TTL}
+                return
+        self._acked(*entry)
+
+    def _acked(self, lane: str, sent_at: float):
+        """Record the ack latency of a publish and return its in-flight budget"""
+        self._release_slot(lane)
+        self.metrics.histogram('ack_latency_seconds', lane=lane).observe(time.monotonic() - sent_at)
+        if lane == 'bulk' and (self.deferred or self.replay_pending):
+            self.message_queue.put(None)  # Wake the batch daemon to send parked batches
+
+    def _release_slot(self, lane: str):
+        if lane == 'critical':
+            self.critical_budget.release()
+        elif lane == 'bulk':
+            self.bulk_budget.release()
+
+    def _publish(self, topic: str, payload, qos: int, lane: str):
+        """Hand a message to paho and track it until the broker acknowledges it"""
+        sent_at = time.monotonic()
+        try:
+            result = self.connection.publish(topic, payload, qos=qos)
+        except Exception:
+            self._release_slot(lane)
+            self.metrics.counter('publish_failures', lane=lane).inc()
+            raise
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            self._release_slot(lane)
+            self.metrics.counter('publish_failures', lane=lane).inc()
+            return result
+
+        with self.inflight_lock:
+            acked_at = self.early_acks.pop(result.mid, None)
+            if acked_at is not None and time.monotonic() - acked_at < EARLY_ACK_TTL:
+                acked = True
+            else:
+                self.inflight[result.mid] = (lane, sent_at)
+                acked = False
+        if acked:
+            self._acked(lane, sent_at)
+        return result
         
-        print("✗ MQTT: All connection attempts failed")
-        return False
+    def connect(self, timeout: float = 10.0):
+        """Connect the (shared) broker connection; it keeps reconnecting in the background"""
+        return self.connection.connect(timeout)
     
     def disconnect(self):
         """Disconnect from MQTT broker"""
         print("MQTT: Disconnecting...")
         self.stop_event.set()
+        self.message_queue.put(None)  # Wake the batch daemon
+        self.critical_queue.put(None)
         
         if self.daemon_thread and self.daemon_thread.is_alive():
             self.daemon_thread.join(timeout=2.0)
         
-        if self.client:
-            self.client.loop_stop()
-            self.client.disconnect()
+        if self.critical_thread and self.critical_thread.is_alive():
+            self.critical_thread.join(timeout=2.0)
+        
+        if self.drain_thread and self.drain_thread.is_alive():
+            self.drain_thread.join(timeout=2.0)
+        
+        if self.metrics_thread and self.metrics_thread.is_alive():
+            self.metrics_thread.join(timeout=2.0)
+        
+        if self.metrics_server:
+            self.metrics_server.shutdown()
+        
+        if self.owns_connection:
+            self.connection.disconnect()
+        
+        if self.spool:
+            self.spool.close()
         
         print("MQTT: Disconnected")
     
     def add_reading(self, sensor_type: str, value: Any, simulated: bool, sensor_id: str = None):
-        """Add sensor reading to queue (thread-safe)"""
-        reading = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'device_id': self.device_info['pi_id'],
-            'device_name': self.device_info['device_name'],
-            'location': self.device_info['location'],
-            'sensor_type': sensor_type,
-            'value': value,
-            'simulated': simulated,
-            'sensor_id': sensor_id
-        }
-        self.message_queue.put(reading)
+        """Add sensor reading to its lane's queue (thread-safe). A dict value is a multi-field reading."""
+        reading = (sensor_type, sensor_id, simulated, self.clock(), value, time.monotonic())
+        self.metrics.counter('readings_enqueued', sensor_type=sensor_type).inc()
+        if sensor_type not in self.topics:
+            self.metrics.counter('readings_unmapped_topic', sensor_type=sensor_type).inc()
+        if sensor_type in self.critical_types:
+            self.critical_queue.put(reading)
+        else:
+            self.message_queue.put(reading)
+
+    def _codec_for_batch(self, size: int):
+        """Large batches are compressed, everything else uses the configured codec"""
+        if self.compress_min_batch and size >= self.compress_min_batch:
+            return self.compressor
+        return self.codec
+
+    def _encode_payload(self, sensor_type: str, sensor_id, simulated: bool, timestamps, values, codec=None):
+        """Encode one sensor's readings in the configured payload format and codec"""
+        return (codec or self.codec).encode(encode_batch(
+            self.device_info, sensor_type, sensor_id, simulated,
+            timestamps, values, self.payload_format, self.timestamp_precision
+        ))
+
+    def _topic(self, sensor_type: str, codec=None) -> str:
+        """Topic for a sensor type, with the codec suffix for binary codecs"""
+        return topic_for_codec(self.topics.get(sensor_type, f"sensors/{sensor_type}"), codec or self.codec)
 
     def publish_reading_now(self, sensor_type: str, value: Any, simulated: bool, sensor_id: str = None):
-        """Publish a single reading immediately using the same batch payload shape."""
+        """Publish a single reading immediately through the critical lane (blocking)."""
+        return self._publish_critical(
+            sensor_type, sensor_id, simulated, self.clock(), value, time.monotonic()
+        )
+
+    def _publish_critical(self, sensor_type: str, sensor_id, simulated: bool, timestamp, value: Any,
+                          enqueued: float) -> bool:
+        """Publish one reading on its own, using the same batch payload shape"""
+        topic = self._topic(sensor_type)
+        payload = self._encode_payload(sensor_type, sensor_id, simulated, [timestamp], [value])
+
         if not self.connected:
+            self._spool_batch(topic, payload, 1, sensor_type, 'disconnected')
             return False
 
-        reading = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'device_id': self.device_info['pi_id'],
-            'device_name': self.device_info['device_name'],
-            'location': self.device_info['location'],
-            'sensor_type': sensor_type,
-            'value': value,
-            'simulated': simulated,
-            'sensor_id': sensor_id
-        }
-
-        topic = self.topics.get(sensor_type, f"sensors/{sensor_type}")
-        payload = json.dumps({
-            'batch_size': 1,
-            'readings': [reading]
-        })
+        # Wait for a free in-flight slot; a broker that stops acking gets the spool instead
+        if not self.critical_budget.acquire(timeout=self.critical_wait):
+            print(f"✗ MQTT: Critical in-flight budget exhausted, {sensor_type} reading not sent")
+            self.metrics.counter('window_full', lane='critical').inc()
+            self._spool_batch(topic, payload, 1, sensor_type, 'window_full')
+            return False
 
         try:
-            result = self.client.publish(topic, payload, qos=1)
+            result = self._publish(topic, payload, self.critical_qos, 'critical')
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                self._record_published('critical', sensor_type, 1, payload, enqueued)
                 print(f"✓ MQTT: Published 1 {sensor_type} reading → {topic}")
                 return True
             print(f"✗ MQTT: Immediate publish failed for {sensor_type} (rc={result.rc})")
         except Exception as e:
             print(f"✗ MQTT: Failed to publish immediate reading - {e}")
 
+        self._spool_batch(topic, payload, 1, sensor_type, 'publish_failed')
         return False
+
+    def _process_critical(self):
+        """Daemon thread that publishes critical readings as soon as they arrive"""
+        print(f"MQTT: Critical lane started ({', '.join(sorted(self.critical_types))})")
+        
+        while not self.stop_event.is_set():
+            reading = self.critical_queue.get()
+            if reading is None:
+                continue
+            try:
+                self._publish_critical(*reading)
+            except Exception as e:
+                print(f"✗ MQTT: Error in critical lane - {e}")
+        
+        # Readings queued during shutdown still go out (or to the spool)
+        while True:
+            try:
+                reading = self.critical_queue.get_nowait()
+            except queue.Empty:
+                break
+            if reading is not None:
+                self._publish_critical(*reading)
+        print("MQTT: Critical lane stopped")
     
     def _process_batches(self):
-        """Daemon thread that processes batches"""
+        """Daemon thread that processes batches.
+
+        Sleeps until the next reading arrives or the earliest batch deadline
+        passes, whichever comes first - an idle publisher does no work.
+        """
         print("MQTT: Batch processing daemon started")
         
         while not self.stop_event.is_set():
             try:
+                timeout = None
+                if self.deadlines:
+                    timeout = max(0.0, self.deadlines[0][0] - time.monotonic())
+                
                 try:
-                    reading = self.message_queue.get(timeout=0.5)
+                    reading = self.message_queue.get(timeout=timeout)
                 except queue.Empty:
-                    self._check_batch_timeouts()
+                    self._flush_due_batches()
+                    continue
+                
+                if reading is None:
+                    self.message_queue.task_done()
+                    self._send_deferred()
+                    if self.replay_pending and self.connected:
+                        self.replay_pending = False
+                        self._start_drain()
                     continue
                 
-                sensor_type = reading['sensor_type']
+                sensor_type, sensor_id, simulated, timestamp, value, enqueued = reading
+                key = (sensor_type, sensor_id, simulated)
+                batch_size, batch_interval = self.get_batch_policy(sensor_type)
                 
-                # FIKSOVANO: Bolji error handling
                 with self.lock:
-                    if sensor_type not in self.batches:
-                        print(f"⚠️  MQTT: Unknown sensor type '{sensor_type}', skipping")
-                        self.message_queue.task_done()
-                        continue
-                    
-                    self.batches[sensor_type].append(reading)
-                    batch_full = len(self.batches[sensor_type]) >= self.batch_size
+                    batch = self.batches.setdefault(key, [])
+                    batch.append((timestamp, value))
+                    batch_full = len(batch) >= batch_size
+                    if len(batch) == 1:
+                        self.batch_started[key] = enqueued
+                    if len(batch) == 1 and not batch_full:
+                        deadline = self.last_send_time.get(key, self.start_time) + batch_interval
+                        self.flush_deadline[key] = deadline
+                        heapq.heappush(self.deadlines, (deadline, next(self.deadline_seq), key))
                 
                 if batch_full:
-                    self._send_batch(sensor_type)
+                    self._send_batch(key)
                 
                 self.message_queue.task_done()
                 
+                # A busy queue must not starve batches whose deadline already passed
+                if self.deadlines and self.deadlines[0][0] <= time.monotonic():
+                    self._flush_due_batches()
+                
             except Exception as e:
                 print(f"✗ MQTT: Error in batch processing - {e}")
                 import traceback
@@ -218,56 +396,293 @@ class MQTTPublisher:
         self._flush_all_batches()
         print("MQTT: Batch processing daemon stopped")
     
-    def _check_batch_timeouts(self):
-        """Check if any batch needs to be sent due to time interval"""
-        current_time = time.time()
+    def _flush_due_batches(self):
+        """Send every batch whose flush deadline has passed"""
+        now = time.monotonic()
         
-        for sensor_type in list(self.batches.keys()):  # FIKSOVANO: list() za thread safety
-            with self.lock:
-                has_data = len(self.batches[sensor_type]) > 0
-                time_elapsed = current_time - self.last_send_time[sensor_type]
-            
-            if has_data and time_elapsed >= self.batch_interval:
-                self._send_batch(sensor_type)
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, _, key = heapq.heappop(self.deadlines)
+            # Skip entries superseded by a size-triggered flush
+            if self.flush_deadline.get(key) != deadline:
+                continue
+            self._send_batch(key)
     
-    def _send_batch(self, sensor_type: str):
-        """Send batch for specific sensor type"""
-        if not self.connected:
+    def get_batch_policy(self, sensor_type: str):
+        """Get (batch_size, batch_interval) for a sensor type, falling back to the global policy"""
+        policy = self.batch_policies.get(sensor_type, {})
+        return (
+            policy.get('batch_size', self.batch_size),
+            policy.get('batch_interval', self.batch_interval)
+        )
+    
+    def _send_batch(self, key):
+        """Send batch for a (sensor_type, sensor_id, simulated) key"""
+        sensor_type, sensor_id, simulated = key
+        if not self.connected and not self.spool:
             with self.lock:
-                self.batches[sensor_type].clear()
-                self.last_send_time[sensor_type] = time.time()
+                if self.batches[key]:
+                    self.metrics.counter('readings_dropped', sensor_type=sensor_type,
+                                         reason='disconnected').inc(len(self.batches[key]))
+                self.batches[key].clear()
+                self.last_send_time[key] = time.monotonic()
+                self.flush_deadline.pop(key, None)
             return
         
         with self.lock:
-            if not self.batches[sensor_type]:
+            if not self.batches[key]:
                 return
-            batch_data = self.batches[sensor_type].copy()
-            self.batches[sensor_type].clear()
-            self.last_send_time[sensor_type] = time.time()
-        
-        topic = self.topics.get(sensor_type, f"sensors/{sensor_type}")
-        payload = json.dumps({
-            'batch_size': len(batch_data),
-            'readings': batch_data
-        })
+            batch_data = self.batches[key].copy()
+            self.batches[key].clear()
+            self.last_send_time[key] = time.monotonic()
+            self.flush_deadline.pop(key, None)
+            oldest = self.batch_started.pop(key, self.last_send_time[key])
+        
+        codec = self._codec_for_batch(len(batch_data))
+        topic = self._topic(sensor_type, codec)
+        timestamps = [timestamp for timestamp, _ in batch_data]
+        values = [value for _, value in batch_data]
+        payload = self._encode_payload(sensor_type, sensor_id, simulated, timestamps, values, codec)
         
+        if not self.connected:
+            self._spool_batch(topic, payload, len(batch_data), sensor_type, 'disconnected')
+            return
+        
+        batch = (topic, payload, len(batch_data), sensor_type, oldest)
+        if self.inflight_policy == 'drop_oldest':
+            # Keep batches in order: everything goes through the deferred queue
+            self._defer_batch(batch)
+            self._send_deferred()
+            return
+        
+        if not self.bulk_budget.acquire(blocking=False):
+            self.metrics.counter('window_full', lane='bulk').inc()
+            if self.inflight_policy != 'block' or not self.bulk_budget.acquire(timeout=self.block_timeout):
+                print(f"⚠️  MQTT: In-flight window full ({self.bulk_max_inflight}), spooling {sensor_type} batch")
+                if self._spool_batch(topic, payload, len(batch_data), sensor_type, 'window_full'):
+                    self.replay_pending = True
+                return
+        
+        self._publish_bulk(*batch)
+    
+    def _publish_bulk(self, topic: str, payload, count: int, sensor_type: str, oldest: float):
+        """Publish one batch; the caller already holds a bulk in-flight slot"""
         try:
-            result = self.client.publish(topic, payload, qos=1)
+            result = self._publish(topic, payload, 1, 'bulk')
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                print(f"✓ MQTT: Published {len(batch_data)} {sensor_type} readings → {topic}")
-            else:
-                print(f"✗ MQTT: Publish failed for {sensor_type} (rc={result.rc})")
+                self._record_published('bulk', sensor_type, count, payload, oldest)
+                print(f"✓ MQTT: Published {count} {sensor_type} readings → {topic}")
+                return
+            print(f"✗ MQTT: Publish failed for {sensor_type} (rc={result.rc})")
         except Exception as e:
             print(f"✗ MQTT: Failed to publish batch - {e}")
+        self._spool_batch(topic, payload, count, sensor_type, 'publish_failed')
+    
+    def _record_published(self, lane: str, sensor_type: str, count: int, payload, oldest: float):
+        """Count a message handed to paho and how long its oldest reading waited"""
+        metrics = self.metrics
+        metrics.counter('messages_published', lane=lane).inc()
+        metrics.counter('readings_published', sensor_type=sensor_type).inc(count)
+        metrics.counter('bytes_published', sensor_type=sensor_type).inc(len(payload))
+        metrics.histogram('batch_wait_seconds', lane=lane).observe(time.monotonic() - oldest)
+        metrics.histogram('batch_readings', SIZE_BUCKETS, lane=lane).observe(count)
+    
+    def _defer_batch(self, batch):
+        """Park a batch until the window opens, dropping the oldest one when full"""
+        with self.lock:
+            if len(self.deferred) >= self.max_deferred:
+                _, _, dropped, sensor_type, _ = self.deferred.popleft()
+                self.metrics.counter('readings_dropped', sensor_type=sensor_type, reason='window_full').inc(dropped)
+                print(f"⚠️  MQTT: In-flight window full, dropped oldest {sensor_type} batch ({dropped} readings)")
+            self.deferred.append(batch)
+    
+    def _send_deferred(self):
+        """Publish parked batches while the in-flight window has room"""
+        while self.deferred and self.connected:
+            if not self.bulk_budget.acquire(blocking=False):
+                self.metrics.counter('window_full', lane='bulk').inc()
+                return
+            with self.lock:
+                if not self.deferred:
+                    self.bulk_budget.release()
+                    return
+                batch = self.deferred.popleft()
+            self._publish_bulk(*batch)
     
     def _flush_all_batches(self):
         """Send all remaining batches"""
-        if self.connected:
+        if self.connected or self.spool:
             print("MQTT: Flushing all remaining batches...")
-            for sensor_type in list(self.batches.keys()):
-                self._send_batch(sensor_type)
+            for key in list(self.batches.keys()):
+                self._send_batch(key)
+            self._send_deferred()
+            with self.lock:
+                leftover = list(self.deferred)
+                self.deferred.clear()
+            for topic, payload, count, sensor_type, _ in leftover:
+                self._spool_batch(topic, payload, count, sensor_type, 'shutdown')
+    
+    # ============ STORE & FORWARD ============
+    
+    def _spool_batch(self, topic: str, payload, count: int, sensor_type: str = 'unknown',
+                     reason: str = 'disconnected') -> bool:
+        """Persist an unsent batch so it can be replayed after reconnect"""
+        if self.spool:
+            try:
+                self.spool.append(topic, payload, count)
+                self.metrics.counter('readings_spooled', sensor_type=sensor_type, reason=reason).inc(count)
+                print(f"💾 MQTT: Spooled {count} readings for {topic}")
+                return True
+            except Exception as e:
+                print(f"✗ MQTT: Failed to spool batch - {e}")
+        self.metrics.counter('readings_dropped', sensor_type=sensor_type, reason=reason).inc(count)
+        return False
+    
+    def _start_drain(self):
+        """Start replaying spooled batches (called on connect)"""
+        if not self.spool or not self.spool.has_pending():
+            return
+        if self.drain_thread and self.drain_thread.is_alive():
+            return
+        self.drain_thread = threading.Thread(target=self._drain_spool, daemon=True)
+        self.drain_thread.start()
+    
+    def _drain_spool(self):
+        """Replay spooled batches oldest first at drain_rate messages per second"""
+        print(f"MQTT: Replaying spooled batches ({self.spool.pending_bytes()} bytes pending)")
+        delay = 1.0 / self.drain_rate if self.drain_rate > 0 else 0
+        
+        def publish(topic, payload):
+            # Replay shares the bulk in-flight window with live batches
+            if not self.connected or not self.bulk_budget.acquire(timeout=1.0):
+                return False
+            try:
+                result = self._publish(topic, payload, 1, 'bulk')
+            except Exception:
+                return False
+            return result.rc == mqtt.MQTT_ERR_SUCCESS
+        
+        while self.connected and not self.stop_event.is_set():
+            try:
+                if self.spool.drain(publish, max_messages=1) == 0:
+                    if not self.spool.has_pending():
+                        break
+                    # Window full or publish refused - retry shortly
+                    self.stop_event.wait(1.0)
+                    continue
+            except Exception as e:
+                print(f"✗ MQTT: Spool replay error - {e}")
+                break
+            if delay:
+                self.stop_event.wait(delay)
+        
+        stats = self.spool.get_stats()
+        print(f"MQTT: Spool replay paused/finished - replayed {stats['replayed']}, "
+              f"evicted {stats['evicted']}, pending {stats['pending_bytes']} bytes")
+    
+    def get_spool_stats(self):
+        """Get spooled / replayed / evicted reading counters"""
+        return self.spool.get_stats() if self.spool else None
+    
+    def _latency_ms(self, name: str, lane: str) -> dict:
+        """p50 / p95 / max of a latency histogram in milliseconds"""
+        histogram = self.metrics.histogram(name, lane=lane)
+        to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            'p50_ms': to_ms(histogram.percentile(0.5)),
+            'p95_ms': to_ms(histogram.percentile(0.95)),
+            'max_ms': to_ms(histogram.max)
+        }
+    
+    def get_lane_stats(self):
+        """Get published / failed counts and latency percentiles per lane"""
+        return {
+            lane: {
+                'published': self.metrics.counter('messages_published', lane=lane).get(),
+                'failed': self.metrics.counter('publish_failures', lane=lane).get(),
+                'queue_latency': self._latency_ms('batch_wait_seconds', lane),
+                'ack_latency': self._latency_ms('ack_latency_seconds', lane)
+            }
+            for lane in ('critical', 'bulk')
+        }
+    
+    def get_inflight_stats(self):
+        """Get in-flight window depth, policy counters and ack latency"""
+        with self.inflight_lock:
+            lanes = [lane for lane, _ in self.inflight.values()]
+        return {
+            'inflight': len(lanes),
+            'inflight_bulk': lanes.count('bulk'),
+            'inflight_critical': lanes.count('critical'),
+            'max_inflight': self.bulk_max_inflight,
+            'policy': self.inflight_policy,
+            'window_full': self.metrics.total('window_full'),
+            'deferred': len(self.deferred),
+            'dropped_readings': self.metrics.total('readings_dropped'),
+            'ack_latency': {lane: self._latency_ms('ack_latency_seconds', lane) for lane in ('critical', 'bulk')}
+        }
+    
+    def format_status(self) -> str:
+        """One-line publisher status for the device heartbeat"""
+        stats = self.get_inflight_stats()
+        ack = stats['ack_latency']['bulk']['p95_ms']
+        critical_ack = stats['ack_latency']['critical']['p95_ms']
+        return (f"MQTT: {'connected' if self.connected else 'disconnected'}, "
+                f"in-flight {stats['inflight']}/{stats['max_inflight']}, "
+                f"ack p95 bulk {ack} ms / critical {critical_ack} ms, "
+                f"deferred {stats['deferred']}, dropped {stats['dropped_readings']}, "
+                f"{self.rates.get('bytes_per_second', 0)} B/s")
+    
+    # ============ TELEMETRY ============
+    
+    def get_metrics(self) -> dict:
+        """Full metrics snapshot, as published to the telemetry topic"""
+        snapshot = self.metrics.snapshot()
+        snapshot.update({
+            'pi_id': self.device_info['pi_id'],
+            'timestamp': datetime.utcnow().isoformat(),
+            'uptime_s': round(time.monotonic() - self.start_time, 1),
+            'rates': self.rates,
+            'spool': self.get_spool_stats()
+        })
+        return snapshot
+    
+    def _update_rates(self, last: dict, elapsed: float) -> dict:
+        """Per-second rates of the main counters since the previous report"""
+        totals = {rate: self.metrics.total(name) for rate, name in RATE_COUNTERS.items()}
+        if elapsed > 0:
+            self.rates = {rate: round((totals[rate] - last.get(rate, 0)) / elapsed, 2) for rate in totals}
+        return totals
+    
+    def _report_metrics(self):
+        """Daemon thread that publishes a metrics snapshot every metrics_interval seconds"""
+        print(f"MQTT: Publishing metrics to {self.metrics_topic} every {self.metrics_interval}s")
+        last_totals, last_time = {}, time.monotonic()
+        
+        while not self.stop_event.wait(self.metrics_interval):
+            now = time.monotonic()
+            last_totals, last_time = self._update_rates(last_totals, now - last_time), now
+            if not self.connected:
+                continue
+            try:
+                # Straight to paho: QoS 0 gets no PUBACK, so it stays out of the in-flight
+                # table and the lane budgets that _publish keeps for sensor data
+                result = self.connection.publish(self.metrics_topic, json.dumps(self.get_metrics()), qos=0)
+                if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                    print(f"✗ MQTT: Failed to publish metrics (rc={result.rc})")
+            except Exception as e:
+                print(f"✗ MQTT: Failed to publish metrics - {e}")
     
     def start_daemon(self):
-        """Start the daemon thread for batch processing"""
+        """Start the daemon threads for batch processing, the critical lane and metrics"""
         self.daemon_thread = threading.Thread(target=self._process_batches, daemon=True)
-        self.daemon_thread.start()
\ No newline at end of file
+        self.daemon_thread.start()
+        self.critical_thread = threading.Thread(target=self._process_critical, daemon=True)
+        self.critical_thread.start()
+        if self.metrics_interval > 0:
+            self.metrics_thread = threading.Thread(target=self._report_metrics, daemon=True)
+            self.metrics_thread.start()
+        if self.metrics_http_port:
+            try:
+                self.metrics_server = serve_metrics(self.get_metrics, port=self.metrics_http_port)
+            except OSError as e:
+                print(f"✗ MQTT: Metrics HTTP endpoint unavailable - {e}")
@@ -0,0 +1,100 @@
+"""
+Report-by-exception filter for periodic sensors.
+
+Sensors are still sampled at their read_interval, but a sample is only handed
+to the MQTT publisher when it differs enough from the last reported value, or
+when the heartbeat is due. Configured per component in settings.json:
+
+    "DHT1": {
+        ...
+        "report": {
+            "deadband": 0.2,            # absolute change needed to report
+            "relative_deadband": 0.0,   # change as a fraction of the last reported value
+            "min_interval": 0,          # never report a channel more often than this (s)
+            "heartbeat": 60,            # always report at least this often (s), 0 = never
+            "humidity": {"deadband": 1.0}   # per-channel overrides
+        }
+    }
+
+Without a "report" block every sample is published, as before.
+
+Leave the distance sensors (DUS1/DUS2) unfiltered: the server infers entering
+and exiting from their last few seconds of samples when a PIR fires, and reads
+an empty history as someone entering.
+"""
+import time
+from typing import Any, Dict, Optional
+
+FILTER_KEYS = ('deadband', 'relative_deadband', 'min_interval', 'heartbeat')
+
+
+class ReportFilter:
+    """Per-channel deadband / min interval / heartbeat filter"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.defaults = {key: float(config.get(key, 0)) for key in FILTER_KEYS}
+        self.overrides = {
+            channel: {key: float(value.get(key, self.defaults[key])) for key in FILTER_KEYS}
+            for channel, value in config.items()
+            if isinstance(value, dict)
+        }
+        # channel -> (last reported value, monotonic time of that report)
+        self.last = {}
+
+        # Counters
+        self.reported = 0
+        self.suppressed = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional['ReportFilter']:
+        """Build a filter from a component's settings, or None if it has no report block"""
+        config = settings.get('report')
+        return cls(config) if config else None
+
+    def should_report(self, channel: str, value, now: float = None) -> bool:
+        """Decide whether a new sample of a channel should be published"""
+        return self.should_report_fields({channel: value}, now)
+
+    def should_report_fields(self, fields: Dict[str, Any], now: float = None) -> bool:
+        """
+        Decide whether a multi-field sample (e.g. climate, imu) should be published.
+        It is reported as a whole when any field is due; all fields are then
+        remembered as reported.
+        """
+        now = time.monotonic() if now is None else now
+        if not any(self._due(channel, value, now) for channel, value in fields.items()):
+            self.suppressed += 1
+            return False
+
+        for channel, value in fields.items():
+            self.last[channel] = (value, now)
+        self.reported += 1
+        return True
+
+    def _due(self, channel: str, value, now: float) -> bool:
+        """True if a channel moved outside its deadband or its heartbeat is due"""
+        if channel not in self.last:
+            return True
+        config = self.overrides.get(channel, self.defaults)
+        last_value, last_time = self.last[channel]
+        elapsed = now - last_time
+        if elapsed < config['min_interval']:
+            return False
+        return self._changed(last_value, value, config) or bool(
+            config['heartbeat'] and elapsed >= config['heartbeat'])
+
+    @staticmethod
+    def _changed(last_value, value, config: Dict[str, float]) -> bool:
+        """True if value moved outside the deadband around the last reported value"""
+        if not isinstance(value, (int, float)) or not isinstance(last_value, (int, float)):
+            return value != last_value
+        threshold = max(config['deadband'], config['relative_deadband'] * abs(last_value))
+        if threshold == 0:
+            return value != last_value
+        return abs(value - last_value) > threshold
+
+    def get_stats(self) -> dict:
+        return {
+            'reported': self.reported,
+            'suppressed': self.suppressed
+        }
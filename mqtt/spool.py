@@ -0,0 +1,238 @@
+import os
+import struct
+import threading
+import zlib
+from typing import Callable, Optional, Tuple
+
+
+# Record header: payload length, topic length, reading count, crc32(topic + payload)
+RECORD_HEADER = struct.Struct('>IHII')
+SEGMENT_SUFFIX = '.seg'
+CURSOR_FILE = 'cursor'
+
+
+class DiskSpool:
+    """
+    Append-only on-disk store-and-forward queue for unsent MQTT batches.
+
+    Batches are appended to numbered segment files. A persisted cursor marks
+    the oldest record not yet replayed, so the spool survives restarts.
+    When the total size exceeds max_bytes the oldest segment is evicted
+    (drop-oldest), so the SD card never fills up.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, segment_bytes: int = 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = min(segment_bytes, max_bytes)
+        self.lock = threading.Lock()
+
+        # Counters (readings, not messages)
+        self.spooled = 0
+        self.replayed = 0
+        self.evicted = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self.segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.path)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        self.sizes = {seq: os.path.getsize(self._segment_path(seq)) for seq in self.segments}
+        self.cursor = self._load_cursor()
+        self.active = None
+        # Never append behind a possibly torn tail left by a crash
+        self.rotate_pending = bool(self.segments)
+
+        if self.segments:
+            print(f"MQTT Spool: Recovered {len(self.segments)} segment(s), {self.pending_bytes()} bytes pending in {self.path}")
+
+    # ============ PATHS & CURSOR ============
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.path, f"{seq:010d}{SEGMENT_SUFFIX}")
+
+    def _load_cursor(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.path, CURSOR_FILE), 'r') as f:
+                seq, offset = f.read().split()
+                seq, offset = int(seq), int(offset)
+        except (OSError, ValueError):
+            seq, offset = (self.segments[0] if self.segments else 0), 0
+
+        # Cursor may point at a segment that was deleted before a crash
+        if self.segments and seq < self.segments[0]:
+            seq, offset = self.segments[0], 0
+        return seq, offset
+
+    def _save_cursor(self):
+        cursor_path = os.path.join(self.path, CURSOR_FILE)
+        tmp_path = cursor_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(f"{self.cursor[0]} {self.cursor[1]}")
+        os.replace(tmp_path, cursor_path)
+
+    # ============ WRITE SIDE ============
+
+    def append(self, topic: str, payload, count: int):
+        """Append one unsent batch to the newest segment"""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        topic_bytes = topic.encode()
+        crc = zlib.crc32(topic_bytes + payload)
+        record = RECORD_HEADER.pack(len(payload), len(topic_bytes), count, crc) + topic_bytes + payload
+
+        with self.lock:
+            if (self.rotate_pending or not self.segments
+                    or self.sizes[self.segments[-1]] + len(record) > self.segment_bytes):
+                self._rotate()
+                self.rotate_pending = False
+
+            seq = self.segments[-1]
+            if self.active is None:
+                self.active = open(self._segment_path(seq), 'ab')
+            self.active.write(record)
+            self.active.flush()
+            self.sizes[seq] += len(record)
+            self.spooled += count
+
+            self._enforce_cap()
+
+    def _rotate(self):
+        """Start a new segment file"""
+        if self.active is not None:
+            self.active.close()
+            self.active = None
+        seq = self.segments[-1] + 1 if self.segments else max(self.cursor[0], 0)
+        self.segments.append(seq)
+        self.sizes[seq] = 0
+        open(self._segment_path(seq), 'ab').close()
+
+    def _enforce_cap(self):
+        """Evict oldest segments until the spool fits in max_bytes"""
+        while sum(self.sizes.values()) > self.max_bytes and len(self.segments) > 1:
+            seq = self.segments[0]
+            start = self.cursor[1] if self.cursor[0] == seq else 0
+            dropped = self._count_readings(seq, start)
+            self._delete_segment(seq)
+            self.evicted += dropped
+            if self.cursor[0] <= seq:
+                self.cursor = (self.segments[0], 0)
+                self._save_cursor()
+            print(f"⚠️  MQTT Spool: Size cap reached, evicted oldest segment ({dropped} readings)")
+
+    def _delete_segment(self, seq: int):
+        self.segments.remove(seq)
+        self.sizes.pop(seq, None)
+        try:
+            os.remove(self._segment_path(seq))
+        except OSError:
+            pass
+
+    def _count_readings(self, seq: int, offset: int) -> int:
+        total = 0
+        with open(self._segment_path(seq), 'rb') as f:
+            f.seek(offset)
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                payload_len, topic_len, count, _ = RECORD_HEADER.unpack(header)
+                f.seek(topic_len + payload_len, os.SEEK_CUR)
+                total += count
+        return total
+
+    # ============ READ SIDE ============
+
+    def _read_record(self) -> Optional[Tuple[str, bytes, int, Tuple[int, int]]]:
+        """Read the record at the cursor. Returns (topic, payload, count, next_cursor) or None."""
+        while self.segments:
+            seq, offset = self.cursor
+            if seq not in self.sizes:
+                self.cursor = (self.segments[0], 0)
+                continue
+
+            if offset < self.sizes[seq]:
+                with open(self._segment_path(seq), 'rb') as f:
+                    f.seek(offset)
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) == RECORD_HEADER.size:
+                        payload_len, topic_len, count, crc = RECORD_HEADER.unpack(header)
+                        body = f.read(topic_len + payload_len)
+                        if len(body) == topic_len + payload_len and zlib.crc32(body) == crc:
+                            next_cursor = (seq, offset + RECORD_HEADER.size + len(body))
+                            return body[:topic_len].decode(), body[topic_len:], count, next_cursor
+                print(f"⚠️  MQTT Spool: Corrupt or torn record in segment {seq}, skipping rest of segment")
+
+            # Segment exhausted (or unreadable) - move on unless it is still being written
+            if seq == self.segments[-1]:
+                if offset < self.sizes[seq]:
+                    self.cursor = (seq, self.sizes[seq])
+                return None
+            self._delete_segment(seq)
+            self.cursor = (self.segments[0], 0) if self.segments else (seq + 1, 0)
+        return None
+
+    def drain(self, publish: Callable[[str, bytes], bool], max_messages: int = 1) -> int:
+        """
+        Replay up to max_messages batches, oldest first.
+        Stops at the first batch publish() refuses. Returns number of batches sent.
+        """
+        sent = 0
+        with self.lock:
+            while sent < max_messages:
+                record = self._read_record()
+                if record is None:
+                    break
+                topic, payload, count, next_cursor = record
+                if not publish(topic, payload):
+                    break
+                self.cursor = next_cursor
+                self.replayed += count
+                sent += 1
+
+            if sent:
+                self._compact()
+                self._save_cursor()
+        return sent
+
+    def _compact(self):
+        """Drop the active segment once everything in it has been replayed"""
+        if len(self.segments) == 1 and self.cursor == (self.segments[0], self.sizes[self.segments[0]]):
+            seq = self.segments[0]
+            if self.active is not None:
+                self.active.close()
+                self.active = None
+            self._delete_segment(seq)
+            self.cursor = (seq + 1, 0)
+
+    # ============ STATUS ============
+
+    def pending_bytes(self) -> int:
+        """Bytes not yet replayed"""
+        total = sum(self.sizes.values())
+        seq, offset = self.cursor
+        if seq in self.sizes:
+            total -= offset
+        return total
+
+    def has_pending(self) -> bool:
+        with self.lock:
+            return self.pending_bytes() > 0
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'spooled': self.spooled,
+                'replayed': self.replayed,
+                'evicted': self.evicted,
+                'pending_bytes': self.pending_bytes(),
+                'segments': len(self.segments)
+            }
+
+    def close(self):
+        with self.lock:
+            if self.active is not None:
+                self.active.close()
+                self.active = None
+            self._save_cursor()
@@ -1,14 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import paho.mqtt.client as mqtt
-from influxdb_client import InfluxDBClient, Point
+from influxdb_client import InfluxDBClient, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
 import json
 from datetime import datetime
 import threading
 import os
+import socket
+import sys
 import time
 from flask_cors import CORS
+
+# Allow importing the shared packages (mqtt/, shared/) when run from server/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from state_manager import system_state
+from mqtt.payload import iter_readings, batch_sensor_type, batch_device_id
+from mqtt.codec import codec_for_topic, timestamp_to_iso
+from shared.topic_router import TopicRouter, shared_subscription
+from shared.mqtt_state_publisher import MQTTStatePublisher
+from influx_writer import InfluxBatchWriter
+from wal import WriteAheadLog, claim_directory
+from snapshots import ChangeCounter, JSONSnapshot
+from line_protocol import LineProtocolBuilder
+from device_partitions import DevicePartitions
 
 app = Flask(__name__)
 CORS(app)
@@ -22,13 +37,65 @@ MQTT_BROKER = os.getenv('MQTT_BROKER', 'localhost')
 MQTT_PORT = int(os.getenv('MQTT_PORT', 1883))
 SECURITY_PIN = os.getenv('SECURITY_PIN', '1234')
 
+# Ingestion mode
+#   standalone - this process subscribes to sensors/# and events/#, tracks state and stores readings
+#   authority  - tracks state and serves the API; storage is left to the ingest workers
+#   worker     - one of N processes sharing $share/<INGEST_GROUP>/sensors/#, only stores readings
+INGEST_MODES = ('standalone', 'authority', 'worker')
+INGEST_MODE = os.getenv('INGEST_MODE', 'standalone')
+INGEST_GROUP = os.getenv('INGEST_GROUP', 'ingest')
+# Workers need distinct client ids, or the broker keeps disconnecting them
+MQTT_CLIENT_ID = os.getenv('MQTT_CLIENT_ID') or (
+    f"ingest_worker_{socket.gethostname()}_{os.getpid()}" if INGEST_MODE == 'worker' else "flask_data_client")
+
+# Influx write pipeline (decoupled from the MQTT network thread, buffered in a local WAL)
+INFLUX_WRITE_WORKERS = int(os.getenv('INFLUX_WRITE_WORKERS', 2))
+INFLUX_WRITE_BATCH_SIZE = int(os.getenv('INFLUX_WRITE_BATCH_SIZE', 500))
+INFLUX_FLUSH_INTERVAL = float(os.getenv('INFLUX_FLUSH_INTERVAL', 1.0))
+# Keep on a volume: the WAL holds readings InfluxDB has not acknowledged yet.
+# Workers each claim a worker-N subdirectory of it.
+INFLUX_WAL_DIR = os.getenv('INFLUX_WAL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wal'))
+INFLUX_WAL_MAX_MB = int(os.getenv('INFLUX_WAL_MAX_MB', 512))
+INFLUX_WAL_SEGMENT_MB = int(os.getenv('INFLUX_WAL_SEGMENT_MB', 8))
+INFLUX_WAL_SYNC_INTERVAL = float(os.getenv('INFLUX_WAL_SYNC_INTERVAL', 0.2))
+
+# State processing: one ordered worker per device, off the MQTT network thread
+INGEST_MAX_PARTITIONS = int(os.getenv('INGEST_MAX_PARTITIONS', 16))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 1000))  # bulk readings are dropped beyond this
+INGEST_QUEUE_MAX = int(os.getenv('INGEST_QUEUE_MAX', 5000))     # everything else blocks the MQTT client here
+
+# /system/state/changes long-poll (seconds)
+STATE_LONG_POLL_TIMEOUT = float(os.getenv('STATE_LONG_POLL_TIMEOUT', 25))
+STATE_LONG_POLL_MAX = 60
+# Retained system/state/* topics: at most one update per topic per interval (seconds)
+STATE_PUBLISH_INTERVAL = float(os.getenv('STATE_PUBLISH_INTERVAL', 1.0))
+
 # Global MQTT clients
 influx_client = None
 write_api = None
+influx_writer = None
 data_mqtt_client = None  # Receives sensor data
 command_mqtt_client = None  # Sends commands to RPIs
+state_publisher = None  # Mirrors system state to retained MQTT topics
 mqtt_connected = False
-alarm_command_sent = False
+ingest_partitions = DevicePartitions(max_partitions=INGEST_MAX_PARTITIONS, queue_size=INGEST_QUEUE_SIZE,
+                                     max_queue_size=INGEST_QUEUE_MAX)
+
+# Readings -> InfluxDB lines (all timestamps in nanoseconds)
+line_builder = LineProtocolBuilder()
+
+# Multi-field measurement -> {field name: sensor type used by the state logic}
+FIELD_ALIASES = {
+    'climate': {'temperature': 'temperature', 'humidity': 'humidity'},
+    'imu': {
+        'ax': 'accel_x', 'ay': 'accel_y', 'az': 'accel_z',
+        'gx': 'gyro_x', 'gy': 'gyro_y', 'gz': 'gyro_z'
+    }
+}
+
+# Bulk readings the ingest partitions may drop under overload (door, motion etc. never are)
+SHEDDABLE_SENSOR_TYPES = set(FIELD_ALIASES) | {
+    alias for aliases in FIELD_ALIASES.values() for alias in aliases.values()}
 
 BRGB_COLOR_INDEX_TO_NAME = {
     0: 'off',
@@ -45,7 +112,16 @@ BRGB_COLOR_INDEX_TO_NAME = {
 }
 
 # Device tracking
-device_last_seen = {'PI1': None, 'PI2': None, 'PI3': None}
+DEVICE_INFO = {
+    'PI1': {'device_name': 'Entrance Device', 'location': 'Main Door'},
+    'PI2': {'device_name': 'Kitchen Device', 'location': 'Kitchen'},
+    'PI3': {'device_name': 'Bedrooms Device', 'location': 'Bedrooms'}
+}
+DEVICE_ONLINE_SECONDS = 30
+device_last_seen = {'PI1': None, 'PI2': None, 'PI3': None}  # time.time() of the last reading
+# Bumped after device_sensors/device_last_seen and lcd_display_state change (cached GET snapshots)
+device_changes = ChangeCounter()
+lcd_changes = ChangeCounter()
 device_sensors = {
     'PI1': {
         'door': {'type': 'door', 'last_value': None, 'last_reading': None},
@@ -92,17 +168,50 @@ lcd_display_state = {
 
 def init_influxdb():
     """Initialize InfluxDB"""
-    global influx_client, write_api
+    global influx_client, write_api, influx_writer
     try:
         influx_client = InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG)
         write_api = influx_client.write_api(write_options=SYNCHRONOUS)
-        influx_client.ping()
-        print(" InfluxDB connected")
-        return True
     except Exception as e:
         print(f" InfluxDB failed: {e}")
         return False
 
+    connected = influx_client.ping()
+    if connected:
+        print(" InfluxDB connected")
+
+    if INGEST_MODE == 'authority':
+        # Queries only (/stats), readings are written by the ingest workers
+        print(" InfluxDB writes left to ingest workers")
+        return True
+
+    wal_dir = claim_directory(INFLUX_WAL_DIR) if INGEST_MODE == 'worker' else INFLUX_WAL_DIR
+    if not connected:
+        # Readings still go to the WAL and are written once InfluxDB answers
+        print(f" InfluxDB not reachable at {INFLUXDB_URL}, buffering readings in {wal_dir}")
+
+    wal = WriteAheadLog(
+        wal_dir,
+        max_bytes=INFLUX_WAL_MAX_MB * 1024 * 1024,
+        segment_bytes=INFLUX_WAL_SEGMENT_MB * 1024 * 1024,
+        sync_interval=INFLUX_WAL_SYNC_INTERVAL
+    )
+    influx_writer = InfluxBatchWriter(
+        write_points,
+        wal,
+        workers=INFLUX_WRITE_WORKERS,
+        batch_size=INFLUX_WRITE_BATCH_SIZE,
+        flush_interval=INFLUX_FLUSH_INTERVAL
+    )
+    influx_writer.start()
+    return True
+
+
+def write_points(lines):
+    """Write a batch of line-protocol lines to InfluxDB as one body (runs on writer threads)"""
+    write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record='\n'.join(lines),
+                    write_precision=WritePrecision.NS)
+
 
 def on_connect(client, userdata, flags, rc):
     """MQTT connection callback"""
@@ -111,32 +220,31 @@ def on_connect(client, userdata, flags, rc):
         mqtt_connected = True
         print(" MQTT connected")
         
-        # Subscribe to sensor data
-        client.subscribe("sensors/#")
+        # Sensor data, plus RPI events (motion detected, door opened, etc.) unless storage-only
+        topics = ingest_subscriptions()
+        client.subscribe([(topic, 0) for topic in topics])
         
-        # Subscribe to RPI events (motion detected, door opened, etc.)
-        client.subscribe("events/#")
-        
-        print(" Subscribed to topics")
+        print(f" Subscribed to {', '.join(topics)}")
     else:
         print(f" MQTT failed: {rc}")
 
 
+def ingest_subscriptions(mode=INGEST_MODE, group=INGEST_GROUP):
+    """Topic filters of the data client in an ingestion mode"""
+    if mode == 'worker':
+        return [shared_subscription(group, "sensors/#")]
+    return ["sensors/#", "events/#"]
+
+
+# topic filter -> handler(topic, raw payload)
+mqtt_router = TopicRouter()
+
+
 def on_message(client, userdata, msg):
     """Process MQTT messages and update SERVER state"""
     try:
-        topic = msg.topic
-        payload = json.loads(msg.payload.decode())
-        
-        # ========== SENSOR DATA ==========
-        if topic.startswith("sensors/"):
-            print(f"📥 MQTT: {topic} → {payload.get('readings', [{}])[0].get('sensor_type', 'unknown')} reading")
-            handle_sensor_data(payload)
-        
-        # ========== RPI EVENTS ==========
-        elif topic.startswith("events/"):
-            print(f"📥 MQTT: {topic}")
-            handle_rpi_event(topic, payload)
+        if not mqtt_router.dispatch(msg.topic, msg.payload):
+            print(f"📥 MQTT: {msg.topic} (no handler)")
             
     except Exception as e:
         print(f"❌ Error processing message: {e}")
@@ -144,170 +252,276 @@ def on_message(client, userdata, msg):
         traceback.print_exc()
 
 
-def handle_sensor_data(payload):
-    """Handle sensor data batch"""
-    if not write_api:
-        return
-    
-    readings = payload.get('readings', [])
-    points = []
+# ========== SENSOR DATA ==========
+@mqtt_router.route("sensors/#")
+def on_sensor_message(topic, raw_payload):
+    # JSON, struct or msgpack - advertised by the topic suffix
+    payload = codec_for_topic(topic).decode(raw_payload)
+    print(f"📥 MQTT: {topic} → {batch_sensor_type(payload)} reading")
+    if INGEST_MODE == 'worker':
+        # Storage only: no shared state, so no per-device ordering to keep
+        handle_sensor_data(payload, update_state=False)
+    else:
+        ingest_partitions.submit(batch_device_id(payload), handle_sensor_data, payload,
+                                 sheddable=batch_sensor_type(payload) in SHEDDABLE_SENSOR_TYPES)
+
+
+# ========== RPI EVENTS ==========
+def rpi_event(event):
+    """Register a handler(device_id, payload) for events/<device_id>/<event>"""
+    def register(handler):
+        def on_event(topic, raw_payload):
+            payload = json.loads(raw_payload.decode())
+            print(f"📥 MQTT: {topic}")
+            # Same partition as the device's sensor batches, so events stay in order with them
+            device_id = topic.split('/')[1]
+            ingest_partitions.submit(device_id, handler, device_id, payload)
+        mqtt_router.add(f"events/+/{event}", on_event)
+        return handler
+    return register
+
+
+def handle_sensor_data(payload, update_state=True):
+    """Handle sensor data batch (legacy or columnar, single- or multi-field payload)"""
+    lines = []
+    route_key, route = None, None
+    now = time.time()
     
-    for reading in readings:
-        device_id = reading.get('device_id')
+    for reading in iter_readings(payload):
         sensor_type = reading.get('sensor_type')
-        value = reading.get('value')
-        
-        if sensor_type == 'motion':
-            print(f"🔍 Processing motion: device={device_id}, value={value} (type: {type(value)})")
-        
-        # Update device tracking
-        if device_id in device_last_seen:
-            device_last_seen[device_id] = datetime.now().isoformat()
-        
-        if device_id in device_sensors and sensor_type in device_sensors[device_id]:
-            device_sensors[device_id][sensor_type]['last_value'] = value
-            device_sensors[device_id][sensor_type]['last_reading'] = reading.get('timestamp')
-        
-        # Update LCD display state for PI3 (Bedrooms)
-        if device_id == 'PI3' and sensor_type == 'temperature':
-            if 'dht1' in reading.get('sensor_id', '').lower():
-                lcd_display_state['PI3']['dht1']['temperature'] = value
-                lcd_display_state['PI3']['last_updated'] = datetime.now().isoformat()
-            elif 'dht2' in reading.get('sensor_id', '').lower():
-                lcd_display_state['PI3']['dht2']['temperature'] = value
-                lcd_display_state['PI3']['last_updated'] = datetime.now().isoformat()
-        elif device_id == 'PI3' and sensor_type == 'humidity':
-            if 'dht1' in reading.get('sensor_id', '').lower():
-                lcd_display_state['PI3']['dht1']['humidity'] = value
-                lcd_display_state['PI3']['last_updated'] = datetime.now().isoformat()
-            elif 'dht2' in reading.get('sensor_id', '').lower():
-                lcd_display_state['PI3']['dht2']['humidity'] = value
-                lcd_display_state['PI3']['last_updated'] = datetime.now().isoformat()
-        
-        # Update LCD display state for PI2 (Kitchen)
-        if device_id == 'PI2' and sensor_type == 'temperature':
-            if 'dht3' in reading.get('sensor_id', '').lower():
-                lcd_display_state['PI2']['dht3']['temperature'] = value
-                lcd_display_state['PI2']['last_updated'] = datetime.now().isoformat()
-        elif device_id == 'PI2' and sensor_type == 'humidity':
-            if 'dht3' in reading.get('sensor_id', '').lower():
-                lcd_display_state['PI2']['dht3']['humidity'] = value
-                lcd_display_state['PI2']['last_updated'] = datetime.now().isoformat()
-        
-        # ===== UPDATE SERVER STATE BASED ON SENSOR TYPE =====
+        device_id = reading.get('device_id')
         
-        # Distance readings for motion tracking
-        if sensor_type == 'distance':
-            system_state.add_distance_reading(device_id, value)
+        if 'fields' in reading:
+            # Multi-field reading: update state per field, store as one point
+            fields = {name: value for name, value in reading['fields'].items()
+                      if value is not None and value == value}  # Skip missing / NaN fields
+        else:
+            fields = {'value': reading.get('value')}
         
-        # Motion detection for people counting
-        elif sensor_type == 'motion' and value == 1:  # 1 = motion detected
-            distance_history = system_state.distance_history.get(device_id, [])
-            print(f"🔍 Motion detected on {device_id}, checking {len(distance_history)} distance readings...")
-            
-            # SECURITY: If building is empty (0 people), ANY motion triggers alarm
-            if system_state.people_count == 0:
-                system_state.trigger_alarm(f"🚨 INTRUSION DETECTED: Motion detected in empty building ({device_id})")
-                print(f"🚨 ALARM: Motion detected with empty building ({device_id})")
+        if update_state:
+            # All readings of a columnar batch share one key, so this resolves once per batch
+            key = (device_id, sensor_type, reading.get('sensor_id'))
+            if key != route_key:
+                route_key, route = key, sensor_route(key)
             
-            direction = system_state.detect_motion_direction(device_id)
-            print(f"🔍 Motion detected on {device_id}, direction: {direction}")
-            
-            if direction == 'entering':
-                system_state.update_people_count(+1)
-                print(f"➡️  Person ENTERING via {device_id}")
-            elif direction == 'exiting':
-                system_state.update_people_count(-1)
-                print(f"⬅️  Person EXITING via {device_id}")
-            else:
-                # No clear direction - wait for more distance data
-                print(f"⏳ Unclear direction - accumulating distance history ({len(distance_history)} readings so far)")
-        
-        # Door state updates
-        elif sensor_type == 'door':
-            door_id = 'DS1' if device_id == 'PI1' else 'DS2'
-            system_state.update_door_state(door_id, value == 1)
-        
-        # GSG (Gyroscope/Accelerometer) - detect dangerous movement
-        elif sensor_type in ['accel_x', 'accel_y', 'accel_z'] and device_id == 'PI2':
-            # Threshold: acceleration > 1.5g indicates dangerous shaking/movement
-            if abs(value) > 1.5:
-                system_state.trigger_alarm(f"⚠️ Saint George is in dangerous - High acceleration detected ({sensor_type}={value:.2f}g)")
-                print(f"⚠️ ALARM: GSG detected dangerous movement on {device_id}: {sensor_type}={value:.2f}g")
-        
-        # Buzzer activation events
-        elif sensor_type == 'buzzer' and value == 1:
-            print(f"🔔 BUZZER ACTIVATED on {device_id}")
-            # Buzzer activation is tracked automatically by InfluxDB write below
-
-        # BRGB state synchronization for frontend
-        elif sensor_type == 'brgb_power' and device_id == 'PI3':
-            system_state.update_brgb_state(on=bool(int(value)))
-        elif sensor_type == 'brgb_color' and device_id == 'PI3':
-            color_index = int(value)
-            color_name = BRGB_COLOR_INDEX_TO_NAME.get(color_index, 'off')
-            system_state.update_brgb_state(
-                on=color_name != 'off',
-                color=color_name,
-                color_index=color_index
-            )
-        
-        # Create InfluxDB point
-        point = Point(sensor_type) \
-            .tag("device_id", device_id) \
-            .tag("device_name", reading['device_name']) \
-            .tag("location", reading['location']) \
-            .tag("simulated", str(reading['simulated'])) \
-            .field("value", float(value)) \
-            .time(reading['timestamp'])
+            # Update device tracking
+            if device_id in device_last_seen:
+                device_last_seen[device_id] = now
+            # /devices reports ISO times whatever precision the batch was sent with
+            reading_time = timestamp_to_iso(reading.get('timestamp'), reading.get('precision'))
+            for name, value in fields.items():
+                state_type, tracked, handlers = route.get(name) or resolve_field_route(route, key, name)
+                if tracked is not None:
+                    tracked['last_value'] = value
+                    tracked['last_reading'] = reading_time
+                for handler in handlers:
+                    handler(reading, device_id, state_type, value)
         
-        points.append(point)
-    
-    if points:
-        write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=points)
+        # Create InfluxDB line
+        if influx_writer and fields:
+            line = line_builder.line(reading, fields)
+            if line:
+                lines.append(line)
+    
+    if update_state and route_key is not None:
+        device_changes.bump()
+    
+    # Storage is asynchronous - state updates above never wait on InfluxDB
+    if lines and influx_writer:
+        influx_writer.submit(lines)
+
+
+# ==================== SENSOR STATE ROUTING ====================
+# State handlers are resolved once per (device_id, sensor_type, sensor_id) key
+# and reading field, so a reading only runs the handlers that apply to it and
+# adding a sensor does not lengthen the path of the others. A route factory
+# returns a handler(reading, device_id, sensor_type, value) for a key, or None.
+
+SENSOR_ROUTE_FACTORIES = []
+SENSOR_ROUTES_MAX = 4096
+# (device_id, sensor_type, sensor_id) -> {field: (state sensor type, device_sensors entry, handlers)}
+sensor_routes = {}
+
+# LCD panels -> DHT sensor slots shown on them
+LCD_SENSORS = {'PI3': ('dht1', 'dht2'), 'PI2': ('dht3',)}
+
+
+def sensor_route_factory(factory):
+    """Register a route factory(device_id, sensor_type, sensor_id) -> handler or None"""
+    SENSOR_ROUTE_FACTORIES.append(factory)
+    sensor_routes.clear()
+    return factory
+
+
+def sensor_handler(*sensor_types, device_id=None):
+    """Register a handler(reading, device_id, sensor_type, value) for sensor types (optionally one device)"""
+    def register(handler):
+        def factory(reading_device_id, sensor_type, sensor_id):
+            if sensor_type in sensor_types and device_id in (None, reading_device_id):
+                return handler
+            return None
+        sensor_route_factory(factory)
+        return handler
+    return register
+
+
+def sensor_route(key):
+    """Per-field routes of one (device_id, sensor_type, sensor_id) key, filled in lazily"""
+    route = sensor_routes.get(key)
+    if route is None:
+        if len(sensor_routes) >= SENSOR_ROUTES_MAX:
+            sensor_routes.clear()
+        route = sensor_routes[key] = {}
+    return route
+
+
+def resolve_field_route(route, key, field):
+    """Resolve the state sensor type, tracking entry and handlers of one reading field"""
+    device_id, sensor_type, sensor_id = key
+    # Single-value readings carry 'value'; multi-field ones map their fields to state types
+    state_type = sensor_type if field == 'value' else FIELD_ALIASES.get(sensor_type, {}).get(field, field)
+    tracked = device_sensors.get(device_id, {}).get(state_type)
+    handlers = tuple(handler for handler in
+                     (factory(device_id, state_type, sensor_id) for factory in SENSOR_ROUTE_FACTORIES)
+                     if handler is not None)
+    route[field] = (state_type, tracked, handlers)
+    return route[field]
+
+
+# ===== LCD DISPLAY STATE (PI3 bedrooms, PI2 kitchen) =====
+@sensor_route_factory
+def lcd_route(device_id, sensor_type, sensor_id):
+    if sensor_type not in ('temperature', 'humidity') or device_id not in LCD_SENSORS:
+        return None
+    sensor_id = (sensor_id or '').lower()
+    for slot in LCD_SENSORS[device_id]:
+        if slot in sensor_id:
+            panel, field = lcd_display_state[device_id], sensor_type
+            
+            def update_lcd(reading, device_id, sensor_type, value):
+                panel[slot][field] = value
+                panel['last_updated'] = datetime.now().isoformat()
+                lcd_changes.bump()
+            return update_lcd
+    return None
+
 
+# ===== UPDATE SERVER STATE BASED ON SENSOR TYPE =====
 
-def handle_rpi_event(topic, payload):
-    """Handle RPI events that affect system state"""
+# Distance readings for motion tracking
+@sensor_handler('distance')
+def handle_distance(reading, device_id, sensor_type, value):
+    system_state.add_distance_reading(device_id, value)
 
-    if 'led_state' in topic:
-        device_id = topic.split('/')[1]
-        led_id = payload.get('led_id', 'DL1')
-        is_on = payload.get('on', False)
-        system_state.update_led_state(led_id, is_on)
+
+# Motion detection for people counting
+@sensor_handler('motion')
+def handle_motion(reading, device_id, sensor_type, value):
+    if value != 1:  # 1 = motion detected
+        return
     
-    # events/PI1/motion_detected
-    if 'motion_detected' in topic:
-        device_id = topic.split('/')[1]
-        direction = system_state.detect_motion_direction(device_id)
-        
-        if direction == 'entering':
-            system_state.update_people_count(+1)
-            print(f"➡️  Person ENTERING via {device_id}")
-        elif direction == 'exiting':
-            system_state.update_people_count(-1)
-            print(f"⬅️  Person EXITING via {device_id}")
-        
-        # Check for alarm condition (motion with 0 people)
-        if system_state.people_count == 0:
-            system_state.trigger_alarm(f"Motion detected with empty building ({device_id})")
+    # SECURITY: If building is empty (0 people), ANY motion triggers alarm
+    if system_state.people_count == 0:
+        system_state.trigger_alarm(f"🚨 INTRUSION DETECTED: Motion detected in empty building ({device_id})")
+        print(f"🚨 ALARM: Motion detected with empty building ({device_id})")
     
-    # events/PI2/button_pressed
-    elif 'button_pressed' in topic:
-        seconds = system_state.timer_button_add_seconds
-        system_state.add_timer_seconds(seconds)
-        send_command("PI2", "timer_add", {"seconds": seconds})
+    direction = system_state.detect_motion_direction(device_id)
     
-    # events/PI2/gyro_movement
-    elif 'gyro_movement' in topic:
-        system_state.trigger_alarm("Significant gyroscope movement (Icon disturbed)")
+    if direction == 'entering':
+        system_state.update_people_count(+1)
+        print(f"➡️  Person ENTERING via {device_id}")
+    elif direction == 'exiting':
+        system_state.update_people_count(-1)
+        print(f"⬅️  Person EXITING via {device_id}")
+    else:
+        # No clear direction - wait for more distance data
+        print(f"⏳ Unclear direction on {device_id} - accumulating distance history")
+
+
+# Door state updates
+@sensor_handler('door')
+def handle_door(reading, device_id, sensor_type, value):
+    door_id = 'DS1' if device_id == 'PI1' else 'DS2'
+    system_state.update_door_state(door_id, value == 1)
+
+
+# GSG (Gyroscope/Accelerometer) - detect dangerous movement
+@sensor_handler('accel_x', 'accel_y', 'accel_z', device_id='PI2')
+def handle_gsg_acceleration(reading, device_id, sensor_type, value):
+    # Threshold: acceleration > 1.5g indicates dangerous shaking/movement
+    if abs(value) > 1.5:
+        system_state.trigger_alarm(f"⚠️ Saint George is in dangerous - High acceleration detected ({sensor_type}={value:.2f}g)")
+        print(f"⚠️ ALARM: GSG detected dangerous movement on {device_id}: {sensor_type}={value:.2f}g")
+
+
+# Buzzer activation events
+@sensor_handler('buzzer')
+def handle_buzzer(reading, device_id, sensor_type, value):
+    if value == 1:
+        print(f"🔔 BUZZER ACTIVATED on {device_id}")
+        # Buzzer activation is tracked automatically by the InfluxDB write in handle_sensor_data
+
+
+# BRGB state synchronization for frontend
+@sensor_handler('brgb_power', device_id='PI3')
+def handle_brgb_power(reading, device_id, sensor_type, value):
+    system_state.update_brgb_state(on=bool(int(value)))
+
+
+@sensor_handler('brgb_color', device_id='PI3')
+def handle_brgb_color(reading, device_id, sensor_type, value):
+    color_index = int(value)
+    color_name = BRGB_COLOR_INDEX_TO_NAME.get(color_index, 'off')
+    system_state.update_brgb_state(
+        on=color_name != 'off',
+        color=color_name,
+        color_index=color_index
+    )
+
+
+@rpi_event("led_state")
+def handle_led_state(device_id, payload):
+    led_id = payload.get('led_id', 'DL1')
+    is_on = payload.get('on', False)
+    system_state.update_led_state(led_id, is_on)
+
+
+# events/PI1/motion_detected
+@rpi_event("motion_detected")
+def handle_motion_detected(device_id, payload):
+    direction = system_state.detect_motion_direction(device_id)
+    
+    if direction == 'entering':
+        system_state.update_people_count(+1)
+        print(f"➡️  Person ENTERING via {device_id}")
+    elif direction == 'exiting':
+        system_state.update_people_count(-1)
+        print(f"⬅️  Person EXITING via {device_id}")
+    
+    # Check for alarm condition (motion with 0 people)
+    if system_state.people_count == 0:
+        system_state.trigger_alarm(f"Motion detected with empty building ({device_id})")
+
+
+# events/PI2/button_pressed
+@rpi_event("button_pressed")
+def handle_button_pressed(device_id, payload):
+    seconds = system_state.timer_button_add_seconds
+    system_state.add_timer_seconds(seconds)
+    send_command("PI2", "timer_add", {"seconds": seconds})
+
+
+# events/PI2/gyro_movement
+@rpi_event("gyro_movement")
+def handle_gyro_movement(device_id, payload):
+    system_state.trigger_alarm("Significant gyroscope movement (Icon disturbed)")
 
 
 def start_data_mqtt_client():
     """Start MQTT client for receiving data"""
     global data_mqtt_client
     
-    data_mqtt_client = mqtt.Client(client_id="flask_data_client", clean_session=True)
+    data_mqtt_client = mqtt.Client(client_id=MQTT_CLIENT_ID, clean_session=True)
     data_mqtt_client.on_connect = on_connect
     data_mqtt_client.on_message = on_message
     
@@ -332,6 +546,20 @@ def init_command_mqtt_client():
         return False
 
 
+def init_state_publisher():
+    """Publish every system state change to the retained system/state/* topics"""
+    global state_publisher
+    state_publisher = MQTTStatePublisher(MQTT_BROKER, MQTT_PORT, min_interval=STATE_PUBLISH_INTERVAL)
+    if not state_publisher.connect():
+        return False
+    system_state.register_callback('state_changed', state_publisher.publish_changes)
+    # Initial retained values, so subscribers see the whole state before the first change
+    with system_state.lock:
+        state = system_state.published
+        state_publisher.publish_changes({'version': system_state.version, 'changes': state, 'state': state})
+    return True
+
+
 def send_command(device_id, command, data=None):
     """Send command to RPI device"""
     if command_mqtt_client:
@@ -345,69 +573,34 @@ def send_command(device_id, command, data=None):
         return False
 
 
-# ==================== STATE MONITORING ====================
-
-def monitor_system_state():
-    """Background thread to monitor state and trigger alarms"""
-    global alarm_command_sent
-    print("State monitor started")
-    
-    while True:
-        try:
-            # Check for door open too long
-            door_id, duration = system_state.check_door_alarms()
-            if door_id:
-                system_state.trigger_alarm(
-                    f"{door_id} open for {duration:.0f}s (unlocked)",
-                    source='door_timeout',
-                    metadata={'door_id': door_id}
-                )
-
-            # Broadcast alarm activation exactly once per alarm cycle
-            if system_state.alarm_active and not alarm_command_sent:
-                send_command("all", "alarm_triggered", {"reason": system_state.alarm_reason or "Alarm active"})
-                alarm_command_sent = True
-
-            # Reset one-shot flag after alarm is cleared
-            if not system_state.alarm_active and alarm_command_sent:
-                alarm_command_sent = False
-            
-            if system_state.timer_expired:
-                send_command("PI2", "timer_expired", {})
+# ==================== STATE NOTIFICATIONS ====================
+# Door timeouts, the timer countdown and arming run on SystemState's deadline
+# scheduler; the devices are told about the results from these callbacks.
 
-            # Update timer
-            system_state.get_timer_remaining()
-            
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error in monitor: {e}")
-            time.sleep(5)
-
-def timer_countdown_thread():
-    """Background thread to manage timer countdown on server"""
-    print("⏱️  Timer countdown thread started")
-    
-    while True:
-        try:
-            # Check if timer is running and update
-            remaining = system_state.get_timer_remaining()
-            
-            # If timer expired, notify PI2
-            if system_state.timer_expired and system_state.timer_blinking:
-                if command_mqtt_client:
-                    command_mqtt_client.publish(
-                        "commands/PI2/timer_expired",
-                        json.dumps({})
-                    )
-                    # Reset flag so we don't spam
-                    system_state.timer_expired = False
-            
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Timer thread error: {e}")
-            time.sleep(5)
+def on_alarm_triggered(data):
+    """Broadcast alarm activation once per alarm cycle"""
+    # Deferred to the scheduler thread, so MQTT I/O does not run under the state lock
+    system_state.scheduler.call_later('notify:alarm', 0, send_command, "all", "alarm_triggered",
+                                      {"reason": data.get("reason") or "Alarm active"})
+
+
+def on_timer_expired(data):
+    """Tell PI2 to blink once the timer runs out"""
+    system_state.scheduler.call_later('notify:timer', 0, notify_timer_expired)
+
+
+def notify_timer_expired():
+    if send_command("PI2", "timer_expired", {}):
+        # Reset flag so we don't spam
+        system_state.clear_timer_expired()
+
+
+def start_state_deadlines():
+    """Hook device notifications to state events and start the deadline scheduler"""
+    system_state.register_callback('alarm_triggered', on_alarm_triggered)
+    system_state.register_callback('timer_expired', on_timer_expired)
+    system_state.scheduler.start()
+    print("⏱️  State deadline scheduler started")
 
 # ==================== API ENDPOINTS ====================
 
@@ -415,45 +608,136 @@ def timer_countdown_thread():
 def health():
     return jsonify({
         "status": "healthy",
-        "influxdb": "connected" if influx_client else "disconnected",
-        "mqtt": "connected" if mqtt_connected else "disconnected"
+        "influxdb": "connected" if influx_client and (not influx_writer or influx_writer.healthy) else "disconnected",
+        "mqtt": "connected" if mqtt_connected else "disconnected",
+        "influx_backlog_bytes": influx_writer.wal.get_stats()["backlog_bytes"] if influx_writer else None
     }), 200
 
 
-@app.route('/system/state', methods=['GET'])
-def get_system_state():
-    """Get complete system state"""
-    return jsonify(system_state.get_full_state()), 200
+@app.route('/ingest/stats', methods=['GET'])
+def ingest_stats():
+    """Get InfluxDB write pipeline statistics"""
+    if not influx_writer:
+        return jsonify({"error": "InfluxDB not available"}), 503
+    return jsonify(influx_writer.get_stats()), 200
 
 
-@app.route('/devices', methods=['GET'])
-def get_all_devices():
-    """Get all devices"""
+@app.route('/ingest/partitions', methods=['GET'])
+def ingest_partition_stats():
+    """Get per-device state processing statistics"""
+    return jsonify(ingest_partitions.get_stats()), 200
+
+
+# ===== CACHED STATE SNAPSHOTS =====
+# Polled GET endpoints serve pre-serialized bodies, rebuilt once per state change
+
+def snapshot(build, version):
+    """JSONSnapshot serialized like jsonify()"""
+    return JSONSnapshot(build, version, lambda data: app.json.dumps(data, separators=(',', ':')))
+
+
+def snapshot_response(cached: JSONSnapshot):
+    """Serve a snapshot, or 304 Not Modified if the client already has this version"""
+    etag, body = cached.get()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def system_state_version():
+    # A running timer changes the state every second without a mutation
+    if system_state.timer_running:
+        return system_state.version, system_state.get_timer_remaining()
+    return system_state.version
+
+
+def devices_version():
+    # 'online' flips by time alone
+    now = time.time()
+    return device_changes.value, tuple(
+        last_seen is not None and now - last_seen < DEVICE_ONLINE_SECONDS for last_seen in device_last_seen.values())
+
+
+def build_devices():
+    now = time.time()
     devices = []
-    device_info = {
-        'PI1': {'device_name': 'Entrance Device', 'location': 'Main Door'},
-        'PI2': {'device_name': 'Kitchen Device', 'location': 'Kitchen'},
-        'PI3': {'device_name': 'Bedrooms Device', 'location': 'Bedrooms'}
-    }
-    
-    for device_id, info in device_info.items():
+    for device_id, info in DEVICE_INFO.items():
         last_seen = device_last_seen.get(device_id)
-        online = False
-        
-        if last_seen:
-            diff = (datetime.now() - datetime.fromisoformat(last_seen)).total_seconds()
-            online = diff < 30
-        
         devices.append({
             'device_id': device_id,
             'device_name': info['device_name'],
             'location': info['location'],
-            'online': online,
-            'last_seen': last_seen or 'Never',
+            'online': bool(last_seen) and now - last_seen < DEVICE_ONLINE_SECONDS,
+            'last_seen': datetime.fromtimestamp(last_seen).isoformat() if last_seen else 'Never',
             'sensors': device_sensors.get(device_id, {})
         })
-    
-    return jsonify(devices), 200
+    return devices
+
+
+def build_lcd_display():
+    pi3_lcd = lcd_display_state.get('PI3', {})
+    pi2_lcd = lcd_display_state.get('PI2', {})
+    return {
+        'PI3': {
+            'device_id': 'PI3',
+            'location': 'Bedrooms',
+            'dht1': pi3_lcd.get('dht1', {}),
+            'dht2': pi3_lcd.get('dht2', {}),
+            'last_updated': pi3_lcd.get('last_updated')
+        },
+        'PI2': {
+            'device_id': 'PI2',
+            'location': 'Kitchen',
+            'dht3': pi2_lcd.get('dht3', {}),
+            'last_updated': pi2_lcd.get('last_updated')
+        }
+    }
+
+
+system_state_snapshot = snapshot(system_state.get_full_state, system_state_version)
+devices_snapshot = snapshot(build_devices, devices_version)
+lcd_display_snapshot = snapshot(build_lcd_display, lambda: lcd_changes.value)
+
+
+@app.route('/system/state', methods=['GET'])
+def get_system_state():
+    """Get complete system state"""
+    return snapshot_response(system_state_snapshot)
+
+
+@app.route('/system/state/changes', methods=['GET'])
+def get_system_state_changes():
+    """
+    Get the system state fields changed since a version
+    ?since=<version from the last response> - long-polls up to ?timeout=<s> while nothing changes.
+    Without since (or too far behind) the response carries the full state instead.
+    """
+    since = request.args.get('since', type=int)
+    timeout = request.args.get('timeout', STATE_LONG_POLL_TIMEOUT, type=float)
+    timeout = max(0.0, min(timeout, STATE_LONG_POLL_MAX))
+
+    system_state.tick()
+    if since is None:
+        return jsonify(system_state.get_changes(None)), 200
+    return jsonify(system_state.wait_for_changes(since, timeout)), 200
+
+
+@app.route('/system/state/publisher', methods=['GET'])
+def get_state_publisher_stats():
+    """Get retained state topic publishing statistics"""
+    if not state_publisher:
+        return jsonify({"error": "State publisher not running"}), 503
+    return jsonify(state_publisher.get_stats()), 200
+
+
+@app.route('/devices', methods=['GET'])
+def get_all_devices():
+    """Get all devices"""
+    return snapshot_response(devices_snapshot)
 
 
 @app.route('/lamp/control', methods=['POST'])
@@ -532,23 +816,7 @@ def get_ir_devices():
 @app.route('/lcd/display', methods=['GET'])
 def get_lcd_display():
     """Get LCD display data from PI3 (Bedrooms) and PI2 (Kitchen)"""
-    pi3_lcd = lcd_display_state.get('PI3', {})
-    pi2_lcd = lcd_display_state.get('PI2', {})
-    return jsonify({
-        'PI3': {
-            'device_id': 'PI3',
-            'location': 'Bedrooms',
-            'dht1': pi3_lcd.get('dht1', {}),
-            'dht2': pi3_lcd.get('dht2', {}),
-            'last_updated': pi3_lcd.get('last_updated')
-        },
-        'PI2': {
-            'device_id': 'PI2',
-            'location': 'Kitchen',
-            'dht3': pi2_lcd.get('dht3', {}),
-            'last_updated': pi2_lcd.get('last_updated')
-        }
-    }), 200
+    return snapshot_response(lcd_display_snapshot)
 
 
 @app.route('/security/arm', methods=['POST'])
@@ -657,10 +925,26 @@ def set_timer_button_seconds():
         return jsonify({"error": "Seconds must be an integer"}), 400
     if seconds < 1:
         return jsonify({"error": "Seconds must be >= 1"}), 400
-    system_state.timer_button_add_seconds = seconds
+    system_state.set_timer_button_seconds(seconds)
     return jsonify({"success": True, "seconds": system_state.timer_button_add_seconds}), 200
 
 
+# /stats key -> Flux filter. DHT and GSG samples are stored as climate/imu points
+# with one field per channel; older data still sits in per-channel measurements.
+STATS_FILTERS = {
+    'temperature': '(r._measurement == "temperature" and r._field == "value") or '
+                   '(r._measurement == "climate" and r._field == "temperature")',
+    'humidity': '(r._measurement == "humidity" and r._field == "value") or '
+                '(r._measurement == "climate" and r._field == "humidity")',
+    'imu': '(r._measurement == "accel_x" and r._field == "value") or '
+           '(r._measurement == "imu" and r._field == "ax")',
+    'motion': 'r._measurement == "motion"',
+    'distance': 'r._measurement == "distance"',
+    'door': 'r._measurement == "door"',
+    'button': 'r._measurement == "button"'
+}
+
+
 @app.route('/stats', methods=['GET'])
 def stats():
     """Get statistics"""
@@ -671,11 +955,11 @@ def stats():
         query_api = influx_client.query_api()
         stats = {}
         
-        for sensor_type in ['temperature', 'humidity', 'motion', 'distance', 'door', 'button']:
+        for sensor_type, predicate in STATS_FILTERS.items():
             query = f'''
             from(bucket: "{INFLUXDB_BUCKET}")
                 |> range(start: -24h)
-                |> filter(fn: (r) => r["_measurement"] == "{sensor_type}")
+                |> filter(fn: (r) => {predicate})
                 |> count()
             '''
             result = query_api.query(query, org=INFLUXDB_ORG)
@@ -698,24 +982,39 @@ if __name__ == '__main__':
     print("🏠 IoT Flask Server with Centralized State")
     print("="*60)
     
+    if INGEST_MODE not in INGEST_MODES:
+        sys.exit(f"Unknown INGEST_MODE '{INGEST_MODE}'. Use one of: {', '.join(INGEST_MODES)}")
+    print(f"Ingest mode: {INGEST_MODE}")
+    
+    if INGEST_MODE == 'worker':
+        # Storage only: no state, no commands, no API
+        init_influxdb()
+        start_data_mqtt_client()
+        sys.exit(1)
+    
     # Initialize InfluxDB
     init_influxdb()
     
     # Initialize command MQTT client
     init_command_mqtt_client()
     
+    # Mirror state changes to system/state/* for push-updated dashboards
+    init_state_publisher()
+    
     # Start data MQTT client in background
     mqtt_thread = threading.Thread(target=start_data_mqtt_client, daemon=True)
     mqtt_thread.start()
     
-    # Start state monitor
-    monitor_thread = threading.Thread(target=monitor_system_state, daemon=True)
-    monitor_thread.start()
-    
-    timer_thread = threading.Thread(target=timer_countdown_thread, daemon=True)
-    timer_thread.start()
+    # Door timeouts, timer countdown and arming
+    start_state_deadlines()
 
     time.sleep(2)
     
     print("\n🚀 Server starting on port 5000...")
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    try:
+        app.run(host='0.0.0.0', port=5000, debug=False)
+    finally:
+        # Finish queued state work, then make its readings durable
+        ingest_partitions.stop()
+        if influx_writer:
+            influx_writer.stop()
\ No newline at end of file
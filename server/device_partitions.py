@@ -0,0 +1,149 @@
+"""
+Per-device ingestion partitions
+Sensor batches and RPI events are handed off the MQTT network thread to one
+worker per device_id. Work for a device runs in arrival order on its own
+worker (the distance/motion direction logic depends on it), while devices
+never wait on each other: a burst of PI3 climate batches cannot delay PI1's
+entrance motion handling.
+
+Only work submitted as sheddable (bulk readings such as climate/imu) is
+dropped when a device falls queue_size messages behind. Everything else -
+events, door and motion batches - is never dropped, since losing e.g. a
+door-close would leave the state wrong until the next change. It is still
+bounded: at max_queue_size pending messages submit() blocks, which stalls the
+MQTT network thread and pushes back on the broker instead of growing memory.
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict
+
+
+class DevicePartition:
+    """Ordered work queue of one device, drained by a single worker thread"""
+
+    def __init__(self, name: str, queue_size: int, max_queue_size: int):
+        self.name = name
+        self.queue_size = queue_size
+        # Sheddable work is refused at queue_size, the rest waits for room here (see put)
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = None
+
+        # Counters (only the worker writes processed/failed, only submitters write dropped/blocked)
+        self.processed = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.last_lag = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._worker, name=f"ingest-{self.name}", daemon=True)
+        self.thread.start()
+
+    def put(self, task, sheddable: bool = False) -> bool:
+        if sheddable and self.queue.qsize() >= self.queue_size:
+            self.dropped += 1
+            return False
+        if self.queue.full():
+            self.blocked += 1
+        self.queue.put(task)
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def stop(self, timeout: float):
+        """Let the worker finish what is queued, then exit"""
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            print(f"⚠️  Ingest {self.name}: worker stuck, not stopped")
+            return
+        self.thread.join(timeout=timeout)
+
+    def _worker(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                break
+            enqueued, fn, args = task
+
+            self.last_lag = time.monotonic() - enqueued
+            try:
+                fn(*args)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Ingest {self.name}: error processing message - {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_depth': self.max_depth,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'blocked': self.blocked,
+            'failed': self.failed,
+            'last_lag_ms': round(self.last_lag * 1000, 2) if self.last_lag is not None else None
+        }
+
+
+class DevicePartitions:
+    """Routes work to per-device partitions, created on first use"""
+
+    def __init__(self, max_partitions: int = 16, queue_size: int = 1000, max_queue_size: int = 5000):
+        """
+        Args:
+            max_partitions: Worker threads at most; further devices share them by hash
+            queue_size: Max pending messages per device before new sheddable ones are dropped
+            max_queue_size: Max pending messages per device; submit() blocks until there is room
+        """
+        self.max_partitions = max_partitions
+        self.queue_size = queue_size
+        self.max_queue_size = max(max_queue_size, queue_size)
+
+        self.lock = threading.Lock()
+        self.partitions = {}  # device_id -> DevicePartition
+        self.workers = []     # distinct partitions, in creation order
+
+    def submit(self, device_id: str, fn: Callable, *args, sheddable: bool = False) -> bool:
+        """
+        Queue fn(*args) behind earlier work of the same device.
+        Sheddable work is dropped (False) once queue_size messages are pending;
+        other work blocks while max_queue_size are.
+        """
+        partition = self.partitions.get(device_id) or self._partition(device_id)
+        if partition.put((time.monotonic(), fn, args), sheddable):
+            return True
+        print(f"⚠️  Ingest {partition.name}: queue full, dropped message from {device_id}")
+        return False
+
+    def _partition(self, device_id: str) -> DevicePartition:
+        with self.lock:
+            partition = self.partitions.get(device_id)
+            if partition is not None:
+                return partition
+            if len(self.workers) < self.max_partitions:
+                partition = DevicePartition(str(device_id), self.queue_size, self.max_queue_size)
+                partition.start()
+                self.workers.append(partition)
+                print(f" Ingest partition started for {device_id}")
+            else:
+                # Out of workers: the device shares one, ordering is still per device
+                partition = self.workers[hash(device_id) % len(self.workers)]
+            self.partitions[device_id] = partition
+            return partition
+
+    def stop(self, timeout: float = 5.0):
+        """Stop workers once their queues are drained"""
+        with self.lock:
+            workers = list(self.workers)
+        for partition in workers:
+            partition.stop(timeout)
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Per-partition statistics, keyed by the device that created the partition"""
+        with self.lock:
+            workers = list(self.workers)
+        return {partition.name: partition.get_stats() for partition in workers}
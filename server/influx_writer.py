@@ -0,0 +1,248 @@
+"""
+Durable asynchronous InfluxDB writer
+Decouples storage from the MQTT network thread: lines are appended to a local
+write-ahead log and replayed to InfluxDB in batches by a small pool of worker
+threads. While InfluxDB is down or slow the workers back off and the log
+grows (up to its size cap); nothing is lost when a write fails or the server
+restarts.
+"""
+import itertools
+import queue
+import threading
+import time
+from typing import Callable, List
+
+from wal import WriteAheadLog
+
+
+class InfluxBatchWriter:
+    """WAL-backed ingestion drained by batching writer workers"""
+
+    def __init__(self, write_fn: Callable[[List[str]], None], wal: WriteAheadLog,
+                 workers: int = 2, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_backoff: float = 30.0):
+        """
+        Args:
+            write_fn: Callable that writes a list of line-protocol lines (e.g. write_api.write wrapper)
+            wal: Write-ahead log the lines are stored in until written
+            workers: Number of writer threads, i.e. concurrent writes to InfluxDB
+            batch_size: Flush a batch once it holds this many lines
+            flush_interval: Flush a non-empty batch at least this often (seconds)
+            max_backoff: Longest wait between retries while InfluxDB fails (seconds)
+        """
+        self.write_fn = write_fn
+        self.wal = wal
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        # Batches read from the WAL, at most one waiting per worker
+        self.batches = queue.Queue(maxsize=workers)
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.reader_thread = None
+        self.worker_threads = []
+        self.healthy = True
+        self.retry_at = 0.0
+        self.backoff = 1.0
+
+        # Counters
+        self.points_enqueued = 0
+        self.points_written = 0
+        self.points_dropped = 0
+        self.points_rejected = 0
+        self.batches_written = 0
+        self.write_failures = 0
+        self.last_write_duration = None
+        self.last_error = None
+        # Batches read from the WAL but not yet written: token -> timestamp of their first line
+        self.unacked = {}
+        self.tokens = itertools.count()
+
+    def start(self):
+        """Start the WAL reader and writer worker threads"""
+        self.wal.start()
+        self.reader_thread = threading.Thread(target=self._reader, name='influx-wal-reader', daemon=True)
+        self.reader_thread.start()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"influx-writer-{i}", daemon=True)
+            thread.start()
+            self.worker_threads.append(thread)
+        print(f" Influx writer started ({self.workers} workers, batch={self.batch_size}, "
+              f"interval={self.flush_interval}s, wal={self.wal.path})")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop workers; lines not yet written stay in the WAL for the next start"""
+        self.stop_event.set()
+        self.wal.wake()
+        # Batches not yet taken by a worker are dropped here and replayed from the WAL later;
+        # draining also frees a reader blocked on handing out its batch
+        self._drain()
+        if self.reader_thread:
+            self.reader_thread.join(timeout=timeout)
+        self._drain()
+        for _ in self.worker_threads:
+            self.batches.put(None)  # one stop sentinel per worker
+        for thread in self.worker_threads:
+            thread.join(timeout=timeout)
+        self.reader_thread, self.worker_threads = None, []
+        self.wal.close()
+
+    def _drain(self):
+        while True:
+            try:
+                self.batches.get_nowait()
+            except queue.Empty:
+                return
+
+    def submit(self, points: List[str]) -> int:
+        """Store lines in the WAL without waiting on InfluxDB. Returns number of lines accepted."""
+        try:
+            self.wal.append(points)
+        except (OSError, ValueError) as e:
+            with self.lock:
+                self.points_dropped += len(points)
+                self.last_error = str(e)
+            print(f"❌ Influx writer: WAL append failed, dropped {len(points)} points - {e}")
+            return 0
+
+        with self.lock:
+            self.points_enqueued += len(points)
+        return len(points)
+
+    # ============ REPLAY ============
+
+    def _reader(self):
+        """Cut the WAL into batches by size, time or segment end"""
+        batch, batch_seq, batch_bytes, deadline = [], None, 0, None
+
+        while not self.stop_event.is_set():
+            chunk = self.wal.read(self.batch_size - len(batch))
+            if chunk is None:
+                self.wal.wait_readable()
+                continue
+
+            seq, lines, nbytes, end = chunk
+            if batch and seq != batch_seq:
+                # The batch's segment was evicted under the reader: never mix segments in a batch
+                self._hand_out((batch_seq, batch, batch_bytes, token))
+                batch, batch_bytes = [], 0
+            if lines:
+                if not batch:
+                    batch_seq, deadline = seq, time.monotonic() + self.flush_interval
+                    token = self._track(lines[0])
+                batch.extend(lines)
+                batch_bytes += nbytes
+
+            if batch and (len(batch) >= self.batch_size or end or time.monotonic() >= deadline):
+                # Batches never span segments, so a segment is done once its batches are acked
+                self._hand_out((batch_seq, batch, batch_bytes, token))
+                batch, batch_bytes = [], 0
+            if end:
+                self.wal.finish(seq)
+            elif not lines:
+                # Caught up: sleep until the WAL syncs more lines (or the batch is due)
+                self.wal.wait_readable(max(0.0, deadline - time.monotonic()) if batch else None)
+
+    def _hand_out(self, batch):
+        """Wait for a free worker (bounded concurrency)"""
+        self.wal.begin(batch[0])
+        self.batches.put(batch)
+
+    def _worker(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            seq, lines, nbytes, token = batch
+            if self._write(lines):
+                self.wal.ack(seq, nbytes)
+                with self.lock:
+                    self.unacked.pop(token, None)
+
+    def _track(self, first_line: str) -> int:
+        """Register a new batch for the lag metric"""
+        token = next(self.tokens)
+        with self.lock:
+            self.unacked[token] = self._timestamp_ns(first_line)
+        return token
+
+    def _write(self, lines: List[str]) -> bool:
+        """Write one batch, retrying with backoff until it is stored or rejected for good"""
+        while True:
+            # One failing write makes every worker wait, instead of all hammering InfluxDB
+            wait = self.retry_at - time.monotonic()
+            if wait > 0 and self.stop_event.wait(wait):
+                return False
+
+            start = time.monotonic()
+            try:
+                self.write_fn(lines)
+            except Exception as e:
+                status = getattr(e, 'status', None)
+                if status is not None and 400 <= status < 500 and status != 429:
+                    # Malformed or refused data: retrying cannot help
+                    with self.lock:
+                        self.points_rejected += len(lines)
+                        self.last_error = str(e)
+                    print(f"❌ Influx writer: InfluxDB rejected {len(lines)} points ({status})")
+                    return True
+
+                with self.lock:
+                    self.write_failures += 1
+                    self.last_error = str(e)
+                    if self.healthy:
+                        print(f"❌ Influx writer: write failed, buffering in WAL - {e}")
+                    self.healthy = False
+                    self.retry_at = time.monotonic() + self.backoff
+                    self.backoff = min(self.backoff * 2, self.max_backoff)
+                if self.stop_event.is_set():
+                    return False
+                continue
+
+            with self.lock:
+                if not self.healthy:
+                    print(" Influx writer: InfluxDB writable again, replaying WAL")
+                self.healthy = True
+                self.backoff = 1.0
+                self.points_written += len(lines)
+                self.batches_written += 1
+                self.last_write_duration = time.monotonic() - start
+            return True
+
+    @staticmethod
+    def _timestamp_ns(line: str):
+        try:
+            return int(line.rsplit(' ', 1)[1])
+        except (IndexError, ValueError):
+            return None
+
+    def get_stats(self) -> dict:
+        """Get writer statistics"""
+        wal_stats = self.wal.get_stats()
+        # Lines not yet read by the reader are newer than every batch in flight
+        next_line = self.wal.peek() if wal_stats['backlog_bytes'] else None
+        with self.lock:
+            # How far storage is behind: age of the oldest reading not yet written
+            oldest = min((ns for ns in self.unacked.values() if ns), default=None)
+            if oldest is None and next_line:
+                oldest = self._timestamp_ns(next_line)
+            if not wal_stats['backlog_bytes'] or oldest is None:
+                lag = 0.0  # nothing, or only lines appended since the last sync
+            else:
+                lag = max(0.0, round(time.time() - oldest / 1e9, 1))
+            return {
+                'healthy': self.healthy,
+                'workers': self.workers,
+                'points_enqueued': self.points_enqueued,
+                'points_written': self.points_written,
+                'points_dropped': self.points_dropped,
+                'points_rejected': self.points_rejected,
+                'batches_written': self.batches_written,
+                'write_failures': self.write_failures,
+                'lag_seconds': lag,
+                'last_write_ms': round(self.last_write_duration * 1000, 2) if self.last_write_duration is not None else None,
+                'last_error': self.last_error,
+                'wal': wal_stats
+            }
@@ -0,0 +1,166 @@
+"""
+InfluxDB line protocol for sensor readings
+Builds the lines handle_sensor_data used to get from Point objects. The
+escaped "measurement,device_id=..,device_name=..,location=..,simulated=.."
+prefix of a series is cached, so a reading costs one lookup plus formatting
+its fields and timestamp. All timestamps are written in nanoseconds, so any
+mix of batches goes out as one request body.
+
+Output matches Point.to_line_protocol(): sorted tags, empty tags skipped,
+whole floats without '.0', NaN/inf fields dropped.
+
+Run `python -m server.line_protocol` (from the repository root) for a
+comparison with the Point path.
+"""
+import math
+from typing import Any, Dict, Optional
+
+from mqtt.codec import iso_to_micros
+from mqtt.payload import NANOS_PER_UNIT
+
+_ESCAPE_MEASUREMENT = str.maketrans({',': r'\,', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+_ESCAPE_KEY = str.maketrans({',': r'\,', '=': r'\=', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+
+# Tags of a sensor point, already in the sorted order line protocol expects
+SERIES_TAGS = ('device_id', 'device_name', 'location', 'simulated')
+
+
+def escape_tag_value(value) -> str:
+    escaped = str(value).translate(_ESCAPE_KEY)
+    # A trailing backslash would escape the separator that follows
+    return escaped + ' ' if escaped.endswith('\\') else escaped
+
+
+def format_float(value) -> Optional[str]:
+    """Float field value as line protocol, None for missing values and ones InfluxDB rejects (NaN/inf)"""
+    if value is None:
+        return None
+    value = float(value)
+    if not math.isfinite(value):
+        return None
+    text = repr(value)
+    return text[:-2] if text.endswith('.0') else text
+
+
+class LineProtocolBuilder:
+    """Sensor readings -> line protocol, with per-series prefix cache"""
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache_size = cache_size
+        self.prefixes = {}    # (measurement, device_id, device_name, location, simulated) -> prefix
+        self.field_keys = {}  # field name -> 'escaped_name='
+
+    def prefix(self, measurement: str, device_id, device_name, location, simulated) -> str:
+        """Escaped 'measurement,tags ' of a series (cached)"""
+        key = (measurement, device_id, device_name, location, simulated)
+        prefix = self.prefixes.get(key)
+        if prefix is None:
+            tags = ','.join(f"{tag}={escape_tag_value(value)}"
+                            for tag, value in zip(SERIES_TAGS, (device_id, device_name, location, str(simulated)))
+                            if value is not None and value != '')
+            prefix = str(measurement).translate(_ESCAPE_MEASUREMENT) + (',' + tags if tags else '') + ' '
+            if len(self.prefixes) >= self.cache_size:
+                self.prefixes.clear()
+            self.prefixes[key] = prefix
+        return prefix
+
+    def field_key(self, name: str) -> str:
+        key = self.field_keys.get(name)
+        if key is None:
+            key = self.field_keys[name] = str(name).translate(_ESCAPE_KEY) + '='
+        return key
+
+    @staticmethod
+    def timestamp_ns(timestamp, precision: Optional[str]) -> int:
+        """Epoch int at the batch precision, or naive UTC ISO string -> nanoseconds"""
+        if precision in NANOS_PER_UNIT:
+            return timestamp * NANOS_PER_UNIT[precision]
+        return iso_to_micros(timestamp) * 1000
+
+    def line(self, reading: Dict[str, Any], fields: Dict[str, Any]) -> Optional[str]:
+        """One reading as a line, or None if none of its fields can be written"""
+        prefix = self.prefix(reading['sensor_type'], reading['device_id'], reading['device_name'],
+                             reading['location'], reading['simulated'])
+        field_keys = self.field_keys
+        parts = []
+        for name in sorted(fields) if len(fields) > 1 else fields:
+            value = format_float(fields[name])
+            if value is not None:
+                parts.append((field_keys.get(name) or self.field_key(name)) + value)
+        if not parts:
+            return None
+        return f"{prefix}{','.join(parts)} {self.timestamp_ns(reading['timestamp'], reading.get('precision'))}"
+
+
+if __name__ == '__main__':
+    import random
+    import time
+    from datetime import datetime, timedelta
+
+    from influxdb_client import Point, WritePrecision
+
+    WRITE_PRECISIONS = {'s': WritePrecision.S, 'ms': WritePrecision.MS,
+                        'us': WritePrecision.US, 'ns': WritePrecision.NS}
+
+    def make_readings(count: int, precision: str):
+        start = datetime.utcnow()
+        devices = [('PI1', 'RaspberryPi_Entrance', 'Building_A_Entrance', 'distance', None),
+                   ('PI2', 'RaspberryPi_Kitchen', 'Building_A_Floor_1', 'imu', ('ax', 'ay', 'az', 'gx', 'gy', 'gz')),
+                   ('PI3', 'RaspberryPi_Bedrooms', 'Building_A_Floor_2', 'climate', ('temperature', 'humidity'))]
+        readings = []
+        for i in range(count):
+            device_id, device_name, location, sensor_type, names = devices[i % len(devices)]
+            moment = start + timedelta(milliseconds=100 * i)
+            timestamp = moment.isoformat() if precision == 'iso' else int(moment.timestamp() * 1000)
+            fields = ({name: round(random.uniform(-50, 50), 2) for name in names} if names
+                      else {'value': round(random.uniform(20, 200), 1)})
+            readings.append(({'timestamp': timestamp, 'precision': None if precision == 'iso' else precision,
+                              'device_id': device_id, 'device_name': device_name, 'location': location,
+                              'sensor_type': sensor_type, 'simulated': True}, fields))
+        return readings
+
+    def point_path(readings):
+        # As handle_sensor_data did it; write_api serializes each Point the same way
+        points = []
+        for reading, fields in readings:
+            point = Point(reading['sensor_type']) \
+                .tag("device_id", reading['device_id']) \
+                .tag("device_name", reading['device_name']) \
+                .tag("location", reading['location']) \
+                .tag("simulated", str(reading['simulated'])) \
+                .time(reading['timestamp'], WRITE_PRECISIONS.get(reading.get('precision'), WritePrecision.NS))
+            for name, value in fields.items():
+                point.field(name, float(value))
+            points.append(point)
+        return '\n'.join(point.to_line_protocol() for point in points)
+
+    def builder_path(readings, builder=LineProtocolBuilder()):
+        return '\n'.join(builder.line(reading, fields) for reading, fields in readings)
+
+    def same_output(point_lines, builder_lines, precision):
+        # Point keeps epoch ints at the batch precision, the builder writes nanoseconds
+        scale = NANOS_PER_UNIT.get(precision, 1)
+        for point_line, builder_line in zip(point_lines.split('\n'), builder_lines.split('\n')):
+            series, timestamp = point_line.rsplit(' ', 1)
+            if builder_line != f"{series} {int(timestamp) * scale}":
+                return False
+        return True
+
+    def best_of(fn, readings, rounds):
+        best = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn(readings)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    print(f"{'points':>8}{'timestamps':>12}{'Point us/pt':>14}{'builder us/pt':>15}{'speedup':>9}")
+    for precision in ('iso', 'ms'):
+        for count in (1_000, 10_000, 100_000):
+            readings = make_readings(count, precision)
+            same = same_output(point_path(readings), builder_path(readings), precision)
+            rounds = 5 if count < 100_000 else 2
+            point_us = best_of(point_path, readings, rounds) / count * 1e6
+            builder_us = best_of(builder_path, readings, rounds) / count * 1e6
+            print(f"{count:>8}{precision:>12}{point_us:>14.2f}{builder_us:>15.2f}{point_us / builder_us:>8.1f}x"
+                  f"{'' if same else '  OUTPUT DIFFERS'}")
@@ -0,0 +1,125 @@
+"""
+Motion direction check
+Runs the PI2 publisher (RPI2 settings.json, DUS2 and DPIR2 callbacks) and the
+server's data client against a local broker, walks a person in and then out
+past the kitchen door, and verifies that each pass changes the people count
+in the right direction. This only works if the DUS2 readings reach the server
+before the DPIR2 motion reading they lead up to.
+
+    python motion_direction_check.py
+    python motion_direction_check.py --broker localhost:1883    # against mosquitto instead
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+import app
+from mqtt.publisher import MQTTPublisher
+from mqtt.report_filter import ReportFilter
+from shared.mqtt_connection import MQTTConnection
+from RPI2.settings.settings import load_settings
+from RPI2.components.dus2 import dus2_callback
+from RPI2.components.dpir2 import dpir2_callback
+from shared_ingest_check import StandInBroker
+
+SETTINGS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'RPI2', 'settings', 'settings.json')
+# (name, DUS2 distances in cm as the person walks past, expected people count change)
+PASSES = (
+    ('entering', [180, 150, 120, 90], +1),
+    ('exiting', [90, 120, 150, 180], -1)
+)
+# The server judges direction from the last 5 s of distance history
+HISTORY_WINDOW = 5.0
+
+
+def start_server_client(host: str, port: int):
+    """The server's data client, wired to the real app callbacks"""
+    client = mqtt.Client(client_id="check-server", clean_session=True)
+    subscribed = threading.Event()
+    client.on_connect = app.on_connect
+    client.on_message = app.on_message
+    client.on_subscribe = lambda c, userdata, mid, granted: subscribed.set()
+    client.connect(host, port, 60)
+    client.loop_start()
+    if not subscribed.wait(5):
+        raise RuntimeError(f"server client: no SUBACK from {host}:{port}")
+    return client
+
+
+def walk_past(publisher, settings, distances, interval):
+    """DUS2 samples while the person approaches (or leaves), then DPIR2 fires"""
+    report_filter = ReportFilter.from_settings(settings['DUS2'])
+    for distance in distances:
+        dus2_callback(distance, time.time(), publisher, settings['DUS2'], report_filter)
+        time.sleep(interval)
+    dpir2_callback(True, time.time(), publisher, settings['DPIR2'])
+
+
+def wait_for_count(expected: int, timeout: float) -> int:
+    deadline = time.monotonic() + timeout
+    while app.system_state.people_count != expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return app.system_state.people_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--broker', help="host:port of a real broker (default: start the stand-in)")
+    parser.add_argument('--interval', type=float, default=0.3, help="seconds between DUS2 samples")
+    args = parser.parse_args()
+
+    if args.broker:
+        host, port = args.broker.rsplit(':', 1)
+        port = int(port)
+    else:
+        broker = StandInBroker().start()
+        host, port = '127.0.0.1', broker.port
+        print(f"Stand-in broker on {host}:{port}")
+
+    # PI2 exactly as deployed, apart from where it connects and the spool/metrics side channels
+    settings = load_settings(SETTINGS_PATH)
+    settings['mqtt'].update(broker=host, port=port, client_id="check-PI2")
+    settings['mqtt']['spool'] = {'enabled': False}
+    settings['mqtt']['metrics'] = {'interval': 0}
+
+    server_client = start_server_client(host, port)
+    connection = MQTTConnection.from_settings(settings)
+    publisher = MQTTPublisher(settings, connection)
+    if not publisher.connect(timeout=5):
+        sys.exit(f"PI2 publisher could not connect to {host}:{port}")
+    publisher.start_daemon()
+
+    # Someone is inside already, so the first motion is not an intrusion
+    app.system_state.update_people_count(+1)
+    failures = []
+    for i, (name, distances, delta) in enumerate(PASSES):
+        if i:
+            time.sleep(HISTORY_WINDOW)  # passes far enough apart not to share distance history
+        before = app.system_state.people_count
+        walk_past(publisher, settings, distances, args.interval)
+        after = wait_for_count(before + delta, timeout=5)
+        ok = after == before + delta
+        print(f"{'✓' if ok else '✗'} {name}: people count {before} → {after} (expected {before + delta})")
+        if not ok:
+            failures.append(f"{name} pass was not counted as {name}")
+
+    publisher.disconnect()
+    connection.disconnect()
+    server_client.disconnect()
+    server_client.loop_stop()
+    app.ingest_partitions.stop()
+
+    for failure in failures:
+        print(f"✗ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✓ PI2 motion direction OK")
+
+
+if __name__ == '__main__':
+    main()
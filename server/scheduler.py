@@ -0,0 +1,87 @@
+"""
+Deadline scheduler for server-side timeouts
+One thread sleeps until the earliest deadline (a heap ordered by due time)
+instead of polling every second, so timeouts fire on time and an idle server
+does not wake up at all. Each deadline has a key ('door:DS1', 'timer', ...);
+scheduling a key again replaces its deadline, and cancel(key) drops it.
+"""
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Hashable
+
+
+class DeadlineScheduler:
+    """Runs callbacks at deadlines on a single thread, one pending deadline per key"""
+
+    def __init__(self, name: str = 'scheduler'):
+        self.name = name
+        self.condition = threading.Condition()
+        self.heap = []     # (due, seq, key) - entries replaced or cancelled stay until popped
+        self.entries = {}  # key -> (due, seq, fn, args) of its live deadline
+        self.counter = itertools.count()
+        self.thread = None
+        self.stopped = False
+
+    def start(self):
+        """Start the scheduler thread"""
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+
+    def call_later(self, key: Hashable, delay: float, fn: Callable, *args):
+        """Run fn(*args) after delay seconds, replacing the key's pending deadline"""
+        due = time.monotonic() + max(0.0, delay)
+        with self.condition:
+            seq = next(self.counter)
+            self.entries[key] = (due, seq, fn, args)
+            heapq.heappush(self.heap, (due, seq, key))
+            if self.heap[0][1] == seq:
+                # New earliest deadline: shorten the thread's sleep
+                self.condition.notify()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Drop the key's pending deadline. False if there was none."""
+        with self.condition:
+            return self.entries.pop(key, None) is not None
+
+    def pending(self, key: Hashable) -> bool:
+        with self.condition:
+            return key in self.entries
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.stopped:
+                        return
+                    # Skip heap entries of cancelled or rescheduled keys
+                    while self.heap:
+                        due, seq, key = self.heap[0]
+                        entry = self.entries.get(key)
+                        if entry is not None and entry[1] == seq:
+                            break
+                        heapq.heappop(self.heap)
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    wait = self.heap[0][0] - time.monotonic()
+                    if wait > 0:
+                        self.condition.wait(wait)
+                        continue
+                    due, seq, key = heapq.heappop(self.heap)
+                    _, _, fn, args = self.entries.pop(key)
+                    break
+
+            # Outside the condition: callbacks take other locks and may schedule again
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Error in scheduled {key}: {e}")
@@ -0,0 +1,379 @@
+"""
+Shared-subscription ingestion check
+Runs N ingest workers and the state authority against a local broker
+stand-in and verifies that every sensor batch is stored by exactly one
+worker, while the authority's SystemState reflects every batch and event.
+
+Each client is a process of its own running app.py's data client
+(app.on_connect / app.on_message) with its INGEST_MODE and INGEST_GROUP,
+as deployed; only the InfluxDB writer of the workers is replaced.
+
+    python shared_ingest_check.py [--workers 3] [--batches 300]
+    python shared_ingest_check.py --broker localhost:1883    # against mosquitto instead
+
+The stand-in speaks just enough MQTT 3.1.1 for this (QoS 0 delivery, $share
+groups served round-robin). It is not a broker for the Pis.
+"""
+import argparse
+import itertools
+import json
+import os
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+# Allow importing the shared packages (mqtt/, shared/) when run from server/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mqtt.payload import encode_batch, iter_readings
+from shared.topic_router import TopicRouter
+
+CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK = 1, 2, 3, 4, 8, 9
+UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 10, 11, 12, 13, 14
+SHARE_PREFIX = '$share/'
+
+
+def encode_length(length: int) -> bytes:
+    """MQTT variable-length remaining length"""
+    out = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        out.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(out)
+
+
+def encode_string(text: str) -> bytes:
+    raw = text.encode()
+    return struct.pack('>H', len(raw)) + raw
+
+
+def packet(packet_type: int, body: bytes, flags: int = 0) -> bytes:
+    return bytes((packet_type << 4 | flags,)) + encode_length(len(body)) + body
+
+
+class _Session(socketserver.BaseRequestHandler):
+    """One client connection of the stand-in broker"""
+
+    def setup(self):
+        self.alive = True
+        self.send_lock = threading.Lock()
+
+    def send(self, data: bytes):
+        if not self.alive:
+            return
+        with self.send_lock:
+            try:
+                self.request.sendall(data)
+            except OSError:
+                self.alive = False
+
+    def deliver(self, topic: str, payload: bytes):
+        self.send(packet(PUBLISH, encode_string(topic) + payload))
+
+    def read_exactly(self, count: int) -> bytes:
+        data = b''
+        while len(data) < count:
+            chunk = self.request.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def read_packet(self):
+        header = self.read_exactly(1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self.read_exactly(1)[0]
+            length += (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header >> 4, header & 0x0F, self.read_exactly(length)
+
+    def handle(self):
+        broker = self.server
+        try:
+            while True:
+                packet_type, flags, body = self.read_packet()
+                if packet_type == CONNECT:
+                    self.send(packet(CONNACK, b'\x00\x00'))
+                elif packet_type == SUBSCRIBE:
+                    (packet_id,), offset, granted = struct.unpack_from('>H', body), 2, []
+                    while offset < len(body):
+                        (length,) = struct.unpack_from('>H', body, offset)
+                        broker.subscribe(self, body[offset + 2:offset + 2 + length].decode())
+                        offset += 3 + length
+                        granted.append(0)
+                    self.send(packet(SUBACK, struct.pack('>H', packet_id) + bytes(granted)))
+                elif packet_type == PUBLISH:
+                    (length,) = struct.unpack_from('>H', body)
+                    topic, offset = body[2:2 + length].decode(), 2 + length
+                    if (flags >> 1) & 0x03:
+                        self.send(packet(PUBACK, body[offset:offset + 2]))
+                        offset += 2
+                    broker.publish(topic, body[offset:])
+                elif packet_type == UNSUBSCRIBE:
+                    self.send(packet(UNSUBACK, body[:2]))
+                elif packet_type == PINGREQ:
+                    self.send(packet(PINGRESP, b''))
+                elif packet_type == DISCONNECT:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.alive = False
+
+
+class StandInBroker(socketserver.ThreadingTCPServer):
+    """In-process MQTT broker stand-in with $share/<group>/<filter> support"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Session)
+        self.lock = threading.Lock()
+        self.router = TopicRouter()
+        self.groups = {}  # (group, filter) -> [sessions]
+        self.turns = {}   # (group, filter) -> round-robin counter
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='stand-in-broker', daemon=True).start()
+        return self
+
+    def subscribe(self, session: _Session, topic: str):
+        with self.lock:
+            if not topic.startswith(SHARE_PREFIX):
+                self.router.add(topic, lambda t, payload: session.deliver(t, payload))
+                return
+            group, topic_filter = topic[len(SHARE_PREFIX):].split('/', 1)
+            key = (group, topic_filter)
+            if key not in self.groups:
+                self.groups[key], self.turns[key] = [], itertools.count()
+                self.router.add(topic_filter, lambda t, payload: self._deliver_shared(key, t, payload))
+            self.groups[key].append(session)
+
+    def _deliver_shared(self, key, topic: str, payload: bytes):
+        with self.lock:
+            members = [session for session in self.groups[key] if session.alive]
+            session = members[next(self.turns[key]) % len(members)] if members else None
+        if session:
+            session.deliver(topic, payload)
+
+    def publish(self, topic: str, payload: bytes):
+        self.router.dispatch(topic, payload)
+
+
+class PointCounter:
+    """Stands in for a worker's InfluxBatchWriter: remembers which batches it stored"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stored = {}  # batch id (location tag) -> times stored
+        self.points = 0
+
+    def submit(self, points):
+        batch_id = points[0].split('location=', 1)[1].split(',', 1)[0]
+        with self.lock:
+            self.stored[batch_id] = self.stored.get(batch_id, 0) + 1
+            self.points += len(points)
+        return len(points)
+
+
+def run_client():
+    """
+    Child process: app.py's data client in the INGEST_MODE of its environment.
+    Prints 'ready' once subscribed, then answers each 'report' line on stdin
+    with a JSON line, until 'stop' (or EOF).
+    """
+    out, sys.stdout = sys.stdout, sys.stderr  # app's logging must not mix with the reports
+    import app
+
+    counter = PointCounter()
+    if app.INGEST_MODE != 'authority':
+        # Like init_influxdb(): the authority has no writer, workers store everything
+        app.influx_writer = counter
+
+    subscribed = threading.Event()
+    client = mqtt.Client(client_id=app.MQTT_CLIENT_ID, clean_session=True)
+    client.on_connect = app.on_connect
+    client.on_message = app.on_message
+    client.on_subscribe = lambda c, userdata, mid, granted: subscribed.set()
+    client.connect(app.MQTT_BROKER, app.MQTT_PORT, 60)
+    client.loop_start()
+    if not subscribed.wait(5):
+        sys.exit(f"{app.MQTT_CLIENT_ID}: no SUBACK from {app.MQTT_BROKER}:{app.MQTT_PORT}")
+    out.write("ready\n")
+    out.flush()
+
+    for command in sys.stdin:
+        if command.strip() != 'report':
+            break
+        with counter.lock:
+            report = {'stored': dict(counter.stored), 'points': counter.points}
+        state = app.system_state
+        report['state'] = {
+            'last_seen': app.device_last_seen['PI1'] is not None,
+            'distance': app.device_sensors['PI1']['distance']['last_value'],
+            'door_open': state.door_states.get('DS1', {}).get('open', False),
+            'timer_seconds': state.timer_seconds,
+            'timer_button_seconds': state.timer_button_add_seconds
+        }
+        out.write(json.dumps(report) + "\n")
+        out.flush()
+
+    client.disconnect()
+    client.loop_stop()
+    app.ingest_partitions.stop()
+
+
+class ClientProcess:
+    """Handle on a run_client() child"""
+
+    def __init__(self, name: str, mode: str, group: str, host: str, port: int, verbose: bool = False):
+        self.name = name
+        env = dict(os.environ, INGEST_MODE=mode, INGEST_GROUP=group, MQTT_CLIENT_ID=name,
+                   MQTT_BROKER=host, MQTT_PORT=str(port))
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--client'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env, text=True,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=None if verbose else subprocess.DEVNULL
+        )
+        if self._read_line() != 'ready':
+            raise RuntimeError(f"{name} did not start")
+
+    def _read_line(self) -> str:
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"{self.name} exited ({self.process.wait()})")
+        return line.strip()
+
+    def report(self) -> dict:
+        self.process.stdin.write("report\n")
+        self.process.stdin.flush()
+        return json.loads(self._read_line())
+
+    def stop(self):
+        try:
+            self.process.communicate("stop\n", timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--batches', type=int, default=300)
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--broker', help="host:port of a real broker (default: start the stand-in)")
+    parser.add_argument('--verbose', action='store_true', help="show the clients' logs")
+    parser.add_argument('--client', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        run_client()
+        return
+
+    if args.broker:
+        host, port = args.broker.rsplit(':', 1)
+        port = int(port)
+    else:
+        broker = StandInBroker().start()
+        host, port = '127.0.0.1', broker.port
+        print(f"Stand-in broker on {host}:{port}")
+
+    group = f"check{int(time.time())}"
+    clients = [ClientProcess(f"worker-{i}", 'worker', group, host, port, args.verbose)
+               for i in range(args.workers)]
+    authority = ClientProcess("authority", 'authority', group, host, port, args.verbose)
+
+    # Distance batches, then a door opening; every batch is told apart by its location tag
+    publisher = mqtt.Client(client_id="check-publisher")
+    publisher.connect(host, port, 60)
+    publisher.loop_start()
+    device = {'pi_id': 'PI1', 'device_name': 'check', 'location': None}
+    batches = []
+    for i in range(args.batches - 1):
+        device['location'] = f"batch-{i}"
+        batches.append(('distance', encode_batch(device, 'distance', 'DUS1', True, [i, i + 1],
+                                                 [100.0 + i, 90.0 + i], precision='ms')))
+    device['location'] = f"batch-{args.batches - 1}"
+    batches.append(('door', encode_batch(device, 'door', 'DS1', True, [args.batches], [1], precision='ms')))
+    for sensor_type, batch in batches:
+        publisher.publish(f"sensors/{sensor_type}", json.dumps(batch))
+    for _ in range(args.events):
+        publisher.publish("events/PI2/button_pressed", json.dumps({}))
+    readings = sum(sum(1 for _ in iter_readings(batch)) for _, batch in batches)
+
+    def complete(reports):
+        stored = sum(len(reports[client.name]['stored']) for client in clients)
+        state = reports[authority.name]['state']
+        return (stored >= args.batches and state['door_open']
+                and state['timer_seconds'] >= args.events * state['timer_button_seconds'])
+
+    deadline = time.monotonic() + 10
+    while True:
+        reports = {client.name: client.report() for client in clients + [authority]}
+        if complete(reports) or time.monotonic() >= deadline:
+            break
+        time.sleep(0.1)
+    time.sleep(0.2)  # let any duplicate arrive
+    reports = {client.name: client.report() for client in clients + [authority]}
+    publisher.disconnect()
+    publisher.loop_stop()
+    for client in clients + [authority]:
+        client.stop()
+
+    stored = {}
+    for client in clients:
+        for batch_id, times in reports[client.name]['stored'].items():
+            stored.setdefault(batch_id, []).extend([client.name] * times)
+    duplicates = sum(1 for names in stored.values() if len(names) > 1)
+    points = sum(reports[client.name]['points'] for client in clients)
+    state = reports[authority.name]['state']
+    expected_state = {
+        'last_seen': True,
+        'distance': 90.0 + args.batches - 2,  # last reading of the last distance batch
+        'door_open': True,
+        'timer_seconds': args.events * state['timer_button_seconds'],
+        'timer_button_seconds': state['timer_button_seconds']
+    }
+
+    print(f"{'worker':<12}{'batches':>8}")
+    for client in clients:
+        print(f"{client.name:<12}{len(reports[client.name]['stored']):>8}")
+    print(f"stored {len(stored)}/{args.batches} batches, {points}/{readings} points, {duplicates} duplicates")
+    print(f"authority state: {state}")
+
+    failures = []
+    if len(stored) != args.batches or points != readings:
+        failures.append("not every batch was stored")
+    if duplicates:
+        failures.append("batches stored by more than one worker")
+    if sum(1 for client in clients if reports[client.name]['stored']) != args.workers:
+        failures.append("load was not shared by all workers")
+    if reports[authority.name]['stored']:
+        failures.append("authority stored readings")
+    if state != expected_state:
+        failures.append(f"authority state does not reflect the readings and events (expected {expected_state})")
+    if any(reports[client.name]['state']['last_seen'] or reports[client.name]['state']['timer_seconds']
+           for client in clients):
+        failures.append("a worker updated state")
+    for failure in failures:
+        print(f"✗ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✓ Shared subscription ingest OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Pre-serialized JSON snapshots for polled GET endpoints
+State changes bump a version; an endpoint's JSON body is rebuilt only when
+its version key changes, and clients that send the body's ETag back in
+If-None-Match get a 304 without a body. Under N polling clients the cost is
+one serialization per change instead of one per request.
+"""
+import hashlib
+import threading
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class ChangeCounter:
+    """Version of state that is mutated outside SystemState (device and LCD dicts)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def bump(self):
+        # Called after the mutation, so a snapshot keyed on the new value includes it
+        with self.lock:
+            self.value += 1
+
+
+class JSONSnapshot:
+    """Cached JSON body and ETag of one endpoint"""
+
+    def __init__(self, build: Callable[[], Any], version: Callable[[], Hashable],
+                 dumps: Callable[[Any], str]):
+        """
+        Args:
+            build: Returns the response data from live state
+            version: Returns a key that changes whenever build() would return something new
+            dumps: JSON serializer (the Flask app's, so output matches jsonify)
+        """
+        self.build = build
+        self.version = version
+        self.dumps = dumps
+        self.lock = threading.Lock()
+        self.cached: Optional[Tuple[Hashable, str, bytes]] = None  # (version key, etag, body)
+
+        # Counters
+        self.builds = 0
+        self.hits = 0
+
+    def get(self) -> Tuple[str, bytes]:
+        """(etag, body) for the current version, rebuilding it at most once per change"""
+        key = self.version()
+        cached = self.cached
+        if cached is None or cached[0] != key:
+            with self.lock:
+                cached = self.cached
+                if cached is None or cached[0] != key:
+                    body = (self.dumps(self.build()) + '\n').encode()
+                    # Content hash: a rebuild that yields the same body keeps the ETag
+                    cached = self.cached = (key, hashlib.blake2b(body, digest_size=8).hexdigest(), body)
+                    self.builds += 1
+                    return cached[1:]
+        self.hits += 1
+        return cached[1:]
+
+    def get_stats(self) -> dict:
+        return {
+            'builds': self.builds,
+            'hits': self.hits
+        }
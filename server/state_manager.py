@@ -2,16 +2,24 @@
 Centralized System State Manager
 ONLY runs on Flask server - single source of truth
 """
+import copy
+import math
 import threading
 import time
+from collections import deque
 from typing import Dict, Optional, Callable
 from datetime import datetime
 
+from scheduler import DeadlineScheduler
+
+DOOR_OPEN_ALARM_SECONDS = 5.0
+ARMING_DELAY_SECONDS = 10
+
 
 class SystemState:
     """Centralized system state - lives ONLY on server"""
     
-    def __init__(self):
+    def __init__(self, journal_size: int = 256):
         self.lock = threading.RLock()
         
         # Person counting
@@ -20,6 +28,9 @@ class SystemState:
             'PI1': [],  # [(distance, timestamp), ...]
             'PI2': []
         }
+        # Distance history is per device and written by that device's ingest
+        # partition only, so it has its own locks instead of the global one
+        self.device_locks = {device_id: threading.Lock() for device_id in self.distance_history}
         
         # Alarm system
         self.alarm_active = False
@@ -58,6 +69,15 @@ class SystemState:
         
         # Callbacks for state changes
         self.callbacks = {}
+        # Bumped on every change, so readers can cache what they derive from the state
+        self.version = 0
+        # Recent changes as (version, {field: new value}) for delta sync; older clients get the full state
+        self.journal = deque(maxlen=journal_size)
+        self.published = copy.deepcopy(self.get_full_state())
+        self.recording = False
+        self.changed = threading.Condition(self.lock)
+        # Door timeouts, timer ticks and arming run on deadlines (started by the server)
+        self.scheduler = DeadlineScheduler('state-deadlines')
     
     def register_callback(self, event: str, callback: Callable):
         """Register callback for state changes"""
@@ -67,6 +87,11 @@ class SystemState:
     
     def trigger_callbacks(self, event: str, data=None):
         """Trigger all callbacks for an event"""
+        # Every state change is announced here (with the lock held)
+        self.record_changes()
+        self.run_callbacks(event, data)
+    
+    def run_callbacks(self, event: str, data=None):
         if event in self.callbacks:
             for callback in self.callbacks[event]:
                 try:
@@ -76,9 +101,17 @@ class SystemState:
     
     # ============ DISTANCE & MOTION TRACKING ============
     
+    def device_lock(self, device_id: str) -> threading.Lock:
+        """Lock guarding one device's distance history"""
+        lock = self.device_locks.get(device_id)
+        if lock is None:
+            with self.lock:
+                lock = self.device_locks.setdefault(device_id, threading.Lock())
+        return lock
+    
     def add_distance_reading(self, device_id: str, distance: float):
         """Add distance reading for motion direction detection"""
-        with self.lock:
+        with self.device_lock(device_id):
             timestamp = time.time()
             history = self.distance_history.get(device_id, [])
             history.append((distance, timestamp))
@@ -95,7 +128,7 @@ class SystemState:
     
     def detect_motion_direction(self, device_id: str) -> Optional[str]:
         """Detect if person entering or exiting based on distance trend"""
-        with self.lock:
+        with self.device_lock(device_id):
             history = self.distance_history.get(device_id, [])
             
             # If no distance data at all, assume entering (person approaching to trigger motion)
@@ -198,6 +231,7 @@ class SystemState:
                 self.door_states[door_id]['open'] = True
                 self.door_states[door_id]['open_since'] = time.time()
                 print(f"🚪 {door_id}: OPENED")
+                self._schedule_door_alarm(door_id)
                 self.trigger_callbacks('door_opened', {'door_id': door_id})
                 
             elif not is_open and was_open:
@@ -205,6 +239,7 @@ class SystemState:
                 self.door_states[door_id]['open'] = False
                 self.door_states[door_id]['open_since'] = None
                 print(f"🚪 {door_id}: CLOSED")
+                self.scheduler.cancel(('door', door_id))
                 self.trigger_callbacks('door_closed', {'door_id': door_id})
 
                 # Auto-clear only door-timeout alarm when that same door changes state
@@ -222,10 +257,27 @@ class SystemState:
             for door_id, state in self.door_states.items():
                 if state['open'] and state['open_since']:
                     duration = time.time() - state['open_since']
-                    if duration > 5.0:
+                    if duration >= DOOR_OPEN_ALARM_SECONDS:
                         return door_id, duration
         return None, 0
     
+    def _schedule_door_alarm(self, door_id: str):
+        """Raise the door-timeout alarm when an open door reaches the threshold"""
+        open_since = self.door_states[door_id]['open_since']
+        delay = open_since + DOOR_OPEN_ALARM_SECONDS - time.time()
+        self.scheduler.call_later(('door', door_id), delay, self._door_open_too_long, door_id)
+    
+    def _door_open_too_long(self, door_id: str):
+        with self.lock:
+            state = self.door_states.get(door_id)
+            if state and state['open'] and state['open_since']:
+                duration = time.time() - state['open_since']
+                self.trigger_alarm(
+                    f"{door_id} open for {duration:.0f}s (unlocked)",
+                    source='door_timeout',
+                    metadata={'door_id': door_id}
+                )
+    
     # ============ SECURITY SYSTEM ============
     
     def arm_security(self):
@@ -234,26 +286,26 @@ class SystemState:
             if self.arming_countdown:
                 return False  # Already arming
             
-            def countdown():
-                for i in range(10, 0, -1):
-                    print(f"Arming in {i}...")
-                    time.sleep(1)
-                
-                with self.lock:
-                    self.security_armed = True
-                    self.arming_countdown = None
-                    print("Security system ARMED")
-                    self.trigger_callbacks('security_armed', True)
-            
-            self.arming_countdown = threading.Thread(target=countdown, daemon=True)
-            self.arming_countdown.start()
+            print(f"Arming in {ARMING_DELAY_SECONDS}s...")
+            self.arming_countdown = time.time() + ARMING_DELAY_SECONDS
+            self.scheduler.call_later('arming', ARMING_DELAY_SECONDS, self._finish_arming)
             return True
     
+    def _finish_arming(self):
+        with self.lock:
+            if not self.arming_countdown:
+                return  # Disarmed meanwhile
+            self.security_armed = True
+            self.arming_countdown = None
+            print("Security system ARMED")
+            self.trigger_callbacks('security_armed', True)
+    
     def disarm_security(self):
         """Disarm security system"""
         with self.lock:
             if self.arming_countdown:
                 self.arming_countdown = None  # Cancel countdown
+                self.scheduler.cancel('arming')
             
             was_armed = self.security_armed
             self.security_armed = False
@@ -289,6 +341,10 @@ class SystemState:
                 self.alarm_metadata = {}
                 print("Alarm cleared")
                 self.trigger_callbacks('alarm_cleared', None)
+                # A door left open raises the alarm again once it is past the threshold
+                for door_id, state in self.door_states.items():
+                    if state['open'] and state['open_since']:
+                        self._schedule_door_alarm(door_id)
     
     # ============ TIMER SYSTEM ============
     
@@ -299,6 +355,7 @@ class SystemState:
             self.timer_expired = False
             self.timer_blinking = False
             print(f"Timer set: {seconds}s")
+            self._schedule_timer_tick()
             self.trigger_callbacks('timer_updated', self.get_timer_state())
     
     def start_timer(self):
@@ -308,6 +365,7 @@ class SystemState:
                 self.timer_running = True
                 self.timer_start_time = time.time()
                 print("Timer started")
+                self._schedule_timer_tick()
                 self.trigger_callbacks('timer_updated', self.get_timer_state())
     
     def stop_timer(self):
@@ -317,6 +375,7 @@ class SystemState:
             self.timer_start_time = None
             self.timer_blinking = False
             print("Timer stopped")
+            self._schedule_timer_tick()
             self.trigger_callbacks('timer_updated', self.get_timer_state())
     
     def get_timer_remaining(self) -> int:
@@ -351,8 +410,37 @@ class SystemState:
                     self.timer_start_time -= seconds
             
             print(f"Added {seconds}s. Total: {self.timer_seconds}s")
+            self._schedule_timer_tick()
             self.trigger_callbacks('timer_updated', self.get_timer_state())
     
+    def _schedule_timer_tick(self):
+        """Wake up when the running timer's remaining seconds next change (and when it expires)"""
+        if self.timer_running and self.timer_start_time:
+            elapsed = time.time() - self.timer_start_time
+            self.scheduler.call_later('timer', math.floor(elapsed) + 1 - elapsed, self._timer_tick)
+        else:
+            self.scheduler.cancel('timer')
+    
+    def _timer_tick(self):
+        with self.lock:
+            self.get_timer_remaining()  # expires the timer at zero
+            self.tick()
+            self._schedule_timer_tick()
+    
+    def set_timer_button_seconds(self, seconds: int):
+        """Set how many seconds the PI2 button adds to the timer"""
+        with self.lock:
+            if self.timer_button_add_seconds != seconds:
+                self.timer_button_add_seconds = seconds
+                self.trigger_callbacks('timer_button_seconds_changed', seconds)
+    
+    def clear_timer_expired(self):
+        """Forget the expiry once PI2 has been told about it"""
+        with self.lock:
+            if self.timer_expired:
+                self.timer_expired = False
+                self.trigger_callbacks('timer_updated', self.get_timer_state())
+    
     def get_timer_state(self) -> dict:
         """Get timer state"""
         return {
@@ -362,6 +450,59 @@ class SystemState:
             'blinking': self.timer_blinking
         }
     
+    # ============ CHANGE JOURNAL ============
+    
+    def record_changes(self):
+        """Journal the fields of get_full_state() that differ from the last recorded state"""
+        with self.lock:
+            if self.recording:
+                # Reading the timer can expire it; the outer call sees the result
+                return
+            self.recording = True
+            try:
+                state = copy.deepcopy(self.get_full_state())
+            finally:
+                self.recording = False
+            
+            changes = {key: value for key, value in state.items() if self.published.get(key) != value}
+            if not changes:
+                return
+            self.version += 1
+            self.journal.append((self.version, changes))
+            self.published = state
+            self.changed.notify_all()
+            # Field-level delta for subscribers that mirror the whole state (must not block)
+            self.run_callbacks('state_changed', {'version': self.version, 'changes': changes, 'state': state})
+    
+    def tick(self):
+        """Record changes made by time alone (the running timer counting down)"""
+        with self.lock:
+            if self.timer_running:
+                self.record_changes()
+    
+    def get_changes(self, since: Optional[int]) -> Optional[dict]:
+        """
+        Fields changed after version `since`, None if there are none.
+        Returns the full state instead when since is None, the journal no longer
+        reaches back to it, or it is from before a server restart.
+        """
+        with self.lock:
+            if since == self.version:
+                return None
+            if since is None or since > self.version or not self.journal or since < self.journal[0][0] - 1:
+                return {'version': self.version, 'full': True, 'state': copy.deepcopy(self.published)}
+            changes = {}
+            for version, fields in self.journal:
+                if version > since:
+                    changes.update(fields)
+            return {'version': self.version, 'full': False, 'changes': changes}
+    
+    def wait_for_changes(self, since: int, timeout: float) -> dict:
+        """get_changes(), waiting up to timeout seconds for a change if there is none yet"""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != since, timeout)
+            return self.get_changes(since) or {'version': self.version, 'full': False, 'changes': {}}
+    
     # ============ STATE EXPORT ============
     
     def get_full_state(self) -> dict:
@@ -0,0 +1,346 @@
+"""
+Write-ahead log for InfluxDB lines
+Lines are appended to numbered segment files (plain line protocol, one point
+per line) and fsynced in groups every sync_interval seconds; readers only see
+synced data. A segment is deleted once the reader has passed it and every
+batch read from it was acknowledged, so whatever is on disk after a crash is
+replayed on the next start. InfluxDB overwrites identical points, so replaying
+a batch twice is harmless.
+When an append takes the total size over max_bytes the oldest segments are
+evicted (drop-oldest), so storage outages cannot fill the disk. The active
+segment is never evicted, so the log can exceed max_bytes by at most one
+append while it is the only segment left.
+"""
+import itertools
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+SEGMENT_SUFFIX = '.lp'
+LOCK_FILE = 'lock'
+
+# Lock files of claimed directories, held open (and locked) until the process exits
+_claims = []
+
+
+def claim_directory(parent: str, prefix: str = 'worker') -> str:
+    """
+    Claim the first <parent>/<prefix>-N directory no other live process holds.
+    Replicas sharing one volume each get their own log this way, and a
+    replacement replica picks up (and replays) the log its predecessor left.
+    """
+    import fcntl  # POSIX only, like the containers the workers run in
+
+    for index in itertools.count():
+        path = os.path.join(parent, f"{prefix}-{index}")
+        os.makedirs(path, exist_ok=True)
+        handle = open(os.path.join(path, LOCK_FILE), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _claims.append(handle)
+        return path
+
+
+class WriteAheadLog:
+    """Segmented on-disk log of InfluxDB lines waiting to be written"""
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024,
+                 segment_bytes: int = 8 * 1024 * 1024, sync_interval: float = 0.2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = min(segment_bytes, max_bytes)
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.sync_thread = None
+        self.sync_needed = threading.Event()            # set by append, so an idle log never syncs
+        self.readable = threading.Condition(self.lock)  # notified when the reader has something new
+        self.wakeups = 0
+
+        # Counters
+        self.appended = 0       # lines
+        self.appended_bytes = 0
+        self.evicted_bytes = 0
+        self.syncs = 0
+        self.last_sync_duration = None
+
+        os.makedirs(self.path, exist_ok=True)
+        self.segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.path)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        # seq -> bytes written / bytes synced (readable) / bytes acknowledged
+        self.sizes = {seq: os.path.getsize(self._segment_path(seq)) for seq in self.segments}
+        self.synced = dict(self.sizes)
+        self.acked = {seq: 0 for seq in self.segments}
+        self.outstanding = {seq: 0 for seq in self.segments}  # batches read but not acknowledged
+        self.finished = set()                                  # segments the reader has passed
+        # Evicted seq -> batches read from it that are still being written. Their
+        # bytes count as evicted until acked (they reached InfluxDB after all).
+        self.evicted = {}
+        self.disk_bytes = sum(self.sizes.values())
+        recovered = len(self.segments)
+
+        # Never append behind a possibly torn tail left by a crash
+        self.active = None
+        self.dirty = False
+        with self.lock:
+            self._rotate()
+        self.read_seq, self.read_offset = self.segments[0], 0
+        self.reader = None
+
+        if recovered:
+            print(f" WAL: Recovered {recovered} segment(s), {self.backlog_bytes()} bytes to replay in {self.path}")
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.path, f"{seq:010d}{SEGMENT_SUFFIX}")
+
+    # ============ WRITE SIDE ============
+
+    def start(self):
+        """Start the group-commit (fsync) thread"""
+        self.sync_thread = threading.Thread(target=self._sync_loop, name="wal-sync", daemon=True)
+        self.sync_thread.start()
+
+    def append(self, lines: List[str]):
+        """Append lines to the newest segment. Durable after the next sync."""
+        data = ('\n'.join(lines) + '\n').encode()
+        with self.lock:
+            seq = self.segments[-1]
+            if self.sizes[seq] and self.sizes[seq] + len(data) > self.segment_bytes:
+                self._sync()
+                self._rotate()
+                seq = self.segments[-1]
+            self.active.write(data)
+            self.sizes[seq] += len(data)
+            self.disk_bytes += len(data)
+            if self.disk_bytes > self.max_bytes:
+                self._enforce_cap()
+            self.dirty = True
+            self.appended += len(lines)
+            self.appended_bytes += len(data)
+        self.sync_needed.set()
+
+    def _rotate(self):
+        """Start a new segment file"""
+        if self.active is not None:
+            self.active.close()
+        seq = self.segments[-1] + 1 if self.segments else 0
+        self.segments.append(seq)
+        self.sizes[seq] = self.synced[seq] = self.acked[seq] = self.outstanding[seq] = 0
+        self.active = open(self._segment_path(seq), 'ab')
+        # The previous segment is sealed now: the reader can finish it
+        self.readable.notify_all()
+
+    def _sync(self):
+        """Flush and fsync the active segment, making its lines visible to the reader"""
+        if not self.dirty:
+            return
+        start = time.monotonic()
+        self.active.flush()
+        os.fsync(self.active.fileno())
+        seq = self.segments[-1]
+        self.synced[seq] = self.sizes[seq]
+        self.dirty = False
+        self.syncs += 1
+        self.last_sync_duration = time.monotonic() - start
+        self.readable.notify_all()
+
+    def _sync_loop(self):
+        while True:
+            self.sync_needed.wait()
+            # Group commit: one fsync for everything appended within sync_interval
+            if self.stop_event.wait(self.sync_interval):
+                return  # close() syncs the rest
+            self.sync_needed.clear()
+            try:
+                with self.lock:
+                    self._sync()
+            except OSError as e:
+                print(f"❌ WAL: fsync failed - {e}")
+
+    def _enforce_cap(self):
+        """Evict oldest segments until the log fits in max_bytes"""
+        while self.disk_bytes > self.max_bytes and len(self.segments) > 1:
+            seq = self.segments[0]
+            dropped = self.sizes[seq] - self.acked[seq]
+            self.evicted[seq] = self.outstanding[seq]
+            self._delete_segment(seq)
+            self.evicted_bytes += dropped
+            print(f"⚠️  WAL: Size cap reached, evicted oldest segment ({dropped} bytes not yet written)")
+        # Keep an entry while batches from it are out, or the reader may still hold lines of it
+        for seq in [seq for seq, outstanding in self.evicted.items() if not outstanding and seq != self.read_seq]:
+            del self.evicted[seq]
+
+    def _delete_segment(self, seq: int):
+        self.segments.remove(seq)
+        self.disk_bytes -= self.sizes[seq]
+        for table in (self.sizes, self.synced, self.acked, self.outstanding):
+            table.pop(seq, None)
+        self.finished.discard(seq)
+        try:
+            os.remove(self._segment_path(seq))
+        except OSError:
+            pass
+        if seq == self.read_seq:
+            self.readable.notify_all()
+
+    # ============ READ SIDE (single reader) ============
+
+    def read(self, max_lines: int) -> Optional[Tuple[int, List[str], int, bool]]:
+        """
+        Read up to max_lines synced lines at the read position.
+        Returns (seq, lines, bytes, end_of_segment) or None when there is no segment to read.
+        end_of_segment is True once a sealed segment has been read completely; the
+        next read continues with the following segment.
+        """
+        with self.lock:
+            if self.read_seq not in self.sizes:
+                # Evicted under the reader (or finished): continue with the oldest remaining segment
+                self._close_reader()
+                later = [seq for seq in self.segments if seq > self.read_seq]
+                if not later:
+                    return None
+                self.read_seq, self.read_offset = later[0], 0
+            seq = self.read_seq
+            readable = self.synced[seq]
+            sealed = seq != self.segments[-1]
+
+        lines = []
+        offset = self.read_offset
+        if offset < readable:
+            try:
+                if self.reader is None:
+                    self.reader = open(self._segment_path(seq), 'rb')
+                self.reader.seek(offset)
+                while len(lines) < max_lines and offset < readable:
+                    raw = self.reader.readline(readable - offset)
+                    if not raw.endswith(b'\n'):
+                        # Torn tail of a segment recovered after a crash
+                        print(f"⚠️  WAL: Torn line at the end of segment {seq}, skipping it")
+                        offset = readable
+                        break
+                    offset += len(raw)
+                    lines.append(raw[:-1].decode())
+            except OSError:
+                # Evicted while reading - the next read moves on
+                self._close_reader()
+                return seq, [], 0, False
+
+        nbytes = offset - self.read_offset
+        self.read_offset = offset
+        end = sealed and offset >= readable
+        if end:
+            self._close_reader()
+        return seq, lines, nbytes, end
+
+    def peek(self) -> Optional[str]:
+        """Oldest synced line the reader has not read yet (None if there is none)"""
+        with self.lock:
+            for seq in self.segments:
+                if seq < self.read_seq:
+                    continue
+                offset = self.read_offset if seq == self.read_seq else 0
+                if offset >= self.synced[seq]:
+                    continue
+                try:
+                    with open(self._segment_path(seq), 'rb') as segment:
+                        segment.seek(offset)
+                        raw = segment.readline(self.synced[seq] - offset)
+                except OSError:
+                    return None
+                return raw.rstrip(b'\n').decode(errors='replace')
+        return None
+
+    def wait_readable(self, timeout: Optional[float] = None):
+        """Block the reader until read() has something new (or timeout, or wake())"""
+        with self.readable:
+            wakeups = self.wakeups
+            self.readable.wait_for(lambda: self.wakeups != wakeups or self._has_readable(), timeout)
+
+    def _has_readable(self) -> bool:
+        seq = self.read_seq
+        return (self.stop_event.is_set() or seq not in self.sizes
+                or self.synced[seq] > self.read_offset or seq != self.segments[-1])
+
+    def wake(self):
+        """Release a reader blocked in wait_readable (used when stopping)"""
+        with self.readable:
+            self.wakeups += 1
+            self.readable.notify_all()
+
+    def _close_reader(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def begin(self, seq: int):
+        """A batch read from seq was handed out for writing"""
+        with self.lock:
+            if seq in self.outstanding:
+                self.outstanding[seq] += 1
+            elif seq in self.evicted:
+                # Read before the segment was evicted, written anyway
+                self.evicted[seq] += 1
+
+    def finish(self, seq: int):
+        """The reader has passed seq; delete it once all its batches are acknowledged"""
+        with self.lock:
+            if seq in self.sizes:
+                self.finished.add(seq)
+                if seq == self.read_seq:
+                    self.read_seq, self.read_offset = seq + 1, 0
+                self._release(seq)
+            # An evicted segment is already gone; read() has moved past it
+
+    def ack(self, seq: int, nbytes: int):
+        """A batch read from seq has been written (or rejected for good)"""
+        with self.lock:
+            if seq in self.acked:
+                self.acked[seq] += nbytes
+                self.outstanding[seq] -= 1
+                self._release(seq)
+            elif seq in self.evicted:
+                # These bytes were counted as evicted but made it to InfluxDB
+                self.evicted_bytes -= nbytes
+                self.evicted[seq] = max(0, self.evicted[seq] - 1)
+            else:
+                print(f"⚠️  WAL: Ack for unknown segment {seq} ignored")
+
+    def _release(self, seq: int):
+        if seq in self.finished and self.outstanding[seq] == 0:
+            self._delete_segment(seq)
+
+    # ============ STATUS ============
+
+    def backlog_bytes(self) -> int:
+        """Bytes on disk not yet acknowledged by InfluxDB"""
+        return self.disk_bytes - sum(self.acked.values())
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'segments': len(self.segments),
+                'disk_bytes': self.disk_bytes,
+                'backlog_bytes': self.backlog_bytes(),
+                'appended_lines': self.appended,
+                'evicted_bytes': self.evicted_bytes,
+                'syncs': self.syncs,
+                'last_sync_ms': round(self.last_sync_duration * 1000, 2) if self.last_sync_duration is not None else None
+            }
+
+    def close(self):
+        """Stop syncing and make everything appended so far durable"""
+        self.stop_event.set()
+        self.sync_needed.set()
+        if self.sync_thread:
+            self.sync_thread.join(timeout=2.0)
+        with self.lock:
+            self._sync()
+            self.active.close()
+        self._close_reader()
@@ -0,0 +1,262 @@
+"""
+Device runtimes for the Pi applications.
+
+    threads (default) - every simulator, sensor loop and periodic job gets its
+                        own daemon thread, as before
+    asyncio           - one event loop in the main thread runs simulators,
+                        periodic sensors and jobs as coroutines; blocking
+                        hardware reads go to a small thread pool
+
+Selected per Pi in settings.json:
+
+    "runtime": {"mode": "asyncio", "executor_workers": 2}
+
+Components only talk to the runtime, so the same code runs in both modes:
+
+    runtime.stream(name, events, callback)          simulator; events yields (delay, values)
+    runtime.poll(name, interval, read, callback)    periodic hardware read (blocking), None = skip
+    runtime.every(name, interval, fn, blocking)     periodic job
+    runtime.submit(fn, *args)                       one-off blocking call, from any thread
+    runtime.on_stop(fn)                             cleanup run by shutdown()
+
+Callbacks get the values followed by the time.time() of the reading. GPIO
+edge callbacks and paho network threads are not affected by the mode.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+RUNTIME_MODES = ('threads', 'asyncio')
+
+
+def _emit(name: str, callback: Callable, values):
+    """Hand one reading to a component callback (None means nothing to report)"""
+    if values is None:
+        return
+    if not isinstance(values, tuple):
+        values = (values,)
+    try:
+        callback(*values, time.time())
+    except Exception as e:
+        print(f"{name}: Error in callback: {e}")
+
+
+class ThreadRuntime:
+    """One daemon thread per simulator, sensor loop and periodic job"""
+    mode = 'threads'
+
+    def __init__(self, stop_event: threading.Event):
+        self.stop_event = stop_event
+        self.threads = []
+        self.cleanups = []
+
+    def _start(self, name: str, target: Callable, *args):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def stream(self, name: str, events: Iterator[Tuple[float, Any]], callback: Callable):
+        self._start(name, self._run_stream, name, events, callback)
+
+    def _run_stream(self, name, events, callback):
+        print(f"{name}: Started")
+        try:
+            for delay, values in events:
+                if self.stop_event.wait(delay):
+                    break
+                _emit(name, callback, values)
+        finally:
+            print(f"{name}: Stopped")
+
+    def poll(self, name: str, interval: float, read: Callable, callback: Callable, cleanup: Callable = None):
+        if cleanup:
+            self.on_stop(cleanup)
+        self._start(name, self._run_poll, name, interval, read, callback)
+
+    def _run_poll(self, name, interval, read, callback):
+        print(f"{name}: Starting measurement loop (interval={interval}s)")
+        while not self.stop_event.is_set():
+            try:
+                _emit(name, callback, read())
+            except Exception as e:
+                print(f"{name}: Error in measurement loop: {e}")
+            self.stop_event.wait(interval)
+
+    def every(self, name: str, interval: float, fn: Callable, blocking: bool = False):
+        self._start(name, self._run_every, name, interval, fn)
+
+    def _run_every(self, name, interval, fn):
+        while not self.stop_event.wait(interval):
+            try:
+                fn()
+            except Exception as e:
+                print(f"{name}: Error - {e}")
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        threading.Thread(target=fn, args=args, kwargs=kwargs, daemon=True).start()
+
+    def on_stop(self, fn: Callable):
+        self.cleanups.append(fn)
+
+    def run_forever(self):
+        """Block the main thread until stop_event is set (or Ctrl+C)"""
+        while not self.stop_event.wait(1):
+            pass
+
+    def shutdown(self, timeout: float = 2.0):
+        self.stop_event.set()
+        print("Waiting for threads to finish...")
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join(timeout=timeout)
+        self._run_cleanups()
+
+    def _run_cleanups(self):
+        for cleanup in reversed(self.cleanups):
+            try:
+                cleanup()
+            except Exception as e:
+                print(f"Error during cleanup: {e}")
+
+
+class AsyncioRuntime(ThreadRuntime):
+    """Single event loop in the main thread plus a small executor for blocking I/O"""
+    mode = 'asyncio'
+
+    def __init__(self, stop_event: threading.Event, executor_workers: int = 2):
+        super().__init__(stop_event)
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='device-io')
+        self.loop.set_default_executor(self.executor)
+        self.pending = []  # coroutines registered before run_forever()
+        self.tasks = []
+
+    def _spawn(self, coro):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(lambda: self.tasks.append(self.loop.create_task(coro)))
+        else:
+            self.pending.append(coro)
+
+    async def _blocking(self, fn: Callable, *args):
+        return await self.loop.run_in_executor(self.executor, partial(fn, *args))
+
+    def stream(self, name, events, callback):
+        self._spawn(self._stream(name, events, callback))
+
+    async def _stream(self, name, events, callback):
+        print(f"{name}: Started")
+        try:
+            for delay, values in events:
+                await asyncio.sleep(delay)
+                _emit(name, callback, values)
+        finally:
+            print(f"{name}: Stopped")
+
+    def poll(self, name, interval, read, callback, cleanup=None):
+        if cleanup:
+            self.on_stop(cleanup)
+        self._spawn(self._poll(name, interval, read, callback))
+
+    async def _poll(self, name, interval, read, callback):
+        print(f"{name}: Starting measurement loop (interval={interval}s)")
+        while True:
+            try:
+                _emit(name, callback, await self._blocking(read))
+            except Exception as e:
+                print(f"{name}: Error in measurement loop: {e}")
+            await asyncio.sleep(interval)
+
+    def every(self, name, interval, fn, blocking=False):
+        """fn runs on the loop and must not block, unless blocking=True moves it to the executor"""
+        self._spawn(self._every(name, interval, fn, blocking))
+
+    async def _every(self, name, interval, fn, blocking):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if blocking:
+                    await self._blocking(fn)
+                else:
+                    fn()
+            except Exception as e:
+                print(f"{name}: Error - {e}")
+
+    def submit(self, fn, *args, **kwargs):
+        self.loop.call_soon_threadsafe(self.loop.run_in_executor, self.executor, partial(fn, *args, **kwargs))
+
+    def run_forever(self):
+        self.loop.run_until_complete(self._main())
+
+    async def _main(self):
+        self.tasks.extend(self.loop.create_task(coro) for coro in self.pending)
+        self.pending.clear()
+        print(f"Runtime: asyncio loop running {len(self.tasks)} tasks")
+        while not self.stop_event.is_set():
+            await asyncio.sleep(1)
+
+    def shutdown(self, timeout: float = 2.0):
+        self.stop_event.set()
+        for coro in self.pending:
+            coro.close()
+        if self.tasks and not self.loop.is_closed():
+            print("Stopping runtime tasks...")
+            for task in self.tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.wait(self.tasks, timeout=timeout))
+        self.executor.shutdown(wait=False)
+        self.loop.close()
+        self._run_cleanups()
+
+
+def create_runtime(settings: Dict[str, Any], stop_event: threading.Event):
+    """Build the runtime selected by settings.json -> runtime.mode"""
+    config = settings.get('runtime', {})
+    mode = config.get('mode', 'threads')
+    if mode not in RUNTIME_MODES:
+        raise ValueError(f"Unknown runtime mode '{mode}'. Use one of: {', '.join(RUNTIME_MODES)}")
+    if mode == 'asyncio':
+        return AsyncioRuntime(stop_event, config.get('executor_workers', 2))
+    return ThreadRuntime(stop_event)
+
+
+class ProcessMonitor:
+    """Thread count, resident memory and CPU usage of this process, for the heartbeat"""
+
+    def __init__(self):
+        self.last_cpu = time.process_time()
+        self.last_time = time.monotonic()
+
+    @staticmethod
+    def rss_mb():
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, KiB on Linux
+        except ImportError:
+            return None
+
+    def sample(self) -> Dict[str, Any]:
+        cpu, now = time.process_time(), time.monotonic()
+        elapsed = now - self.last_time
+        cpu_percent = 100 * (cpu - self.last_cpu) / elapsed if elapsed > 0 else 0.0
+        self.last_cpu, self.last_time = cpu, now
+        rss = self.rss_mb()
+        return {
+            'threads': threading.active_count(),
+            'rss_mb': round(rss, 1) if rss is not None else None,
+            'cpu_percent': round(cpu_percent, 1)
+        }
+
+    def format(self) -> str:
+        stats = self.sample()
+        rss = f"{stats['rss_mb']} MB" if stats['rss_mb'] is not None else 'n/a'
+        return f"Process: {stats['threads']} threads | RSS {rss} | CPU {stats['cpu_percent']}%"
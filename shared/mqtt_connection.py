@@ -0,0 +1,212 @@
+"""
+One MQTT connection per Pi, shared by the sensor publisher, the command
+listeners and controllers such as SD4.
+
+    connection = MQTTConnection.from_settings(settings)
+    connection.subscribe("commands/PI2/#", handler)     # handler(topic, payload bytes)
+    connection.add_connect_listener(fn)                 # fn() after every (re)connect
+    connection.connect()
+
+Incoming messages are routed to their handlers through a TopicRouter, and
+subscriptions are renewed on every reconnect. Reconnects are left to the paho
+network loop, with an exponential backoff configured in settings.json:
+
+    "mqtt": {
+        ...
+        "keepalive": 60,
+        "reconnect": {"min_delay": 1, "max_delay": 60}
+    }
+"""
+import threading
+from typing import Any, Callable, Dict
+
+import paho.mqtt.client as mqtt
+
+from shared.topic_router import TopicRouter
+
+CONNACK_ERRORS = {
+    1: "Incorrect protocol version",
+    2: "Invalid client identifier",
+    3: "Server unavailable",
+    4: "Bad username or password",
+    5: "Not authorized"
+}
+
+
+class MQTTConnection:
+    """Single paho client with topic-routed handlers and central reconnect"""
+
+    def __init__(self, broker: str = 'localhost', port: int = 1883, client_id: str = None,
+                 keepalive: int = 60, min_delay: float = 1, max_delay: float = 60):
+        self.broker = broker
+        self.port = port
+        self.client_id = client_id
+        self.keepalive = keepalive
+
+        self.client = mqtt.Client(client_id=client_id, clean_session=True)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        self.client.on_message = self._on_message
+        self.client.reconnect_delay_set(min_delay=min_delay, max_delay=max_delay)
+
+        self.lock = threading.Lock()
+        self.connected_event = threading.Event()
+        self.started = False
+        # topic filter -> qos, handlers live in the router
+        self.subscriptions = {}
+        self.router = TopicRouter()
+        self.connect_listeners = []
+        self.disconnect_listeners = []
+        self.publish_listeners = []
+
+        # Counters
+        self.connects = 0
+        self.disconnects = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> 'MQTTConnection':
+        """Build the Pi's connection from settings.json -> mqtt"""
+        mqtt_settings = settings['mqtt']
+        reconnect = mqtt_settings.get('reconnect', {})
+        return cls(
+            broker=mqtt_settings.get('broker', 'localhost'),
+            port=mqtt_settings.get('port', 1883),
+            client_id=mqtt_settings.get('client_id', f"{settings['device']['pi_id']}_client"),
+            keepalive=mqtt_settings.get('keepalive', 60),
+            min_delay=reconnect.get('min_delay', 1),
+            max_delay=reconnect.get('max_delay', 60)
+        )
+
+    @property
+    def connected(self) -> bool:
+        return self.connected_event.is_set()
+
+    # ============ REGISTRATION ============
+
+    def subscribe(self, topic: str, handler: Callable, qos: int = 0):
+        """Subscribe to a topic filter and route its messages to handler(topic, payload)"""
+        with self.lock:
+            self.router.add(topic, self._guarded(handler))
+            if topic in self.subscriptions:
+                return
+            self.subscriptions[topic] = qos
+        if self.connected:
+            self.client.subscribe(topic, qos)
+        print(f"MQTT: Routing {topic}")
+
+    def add_connect_listener(self, fn: Callable):
+        """fn() runs after every successful (re)connect"""
+        self.connect_listeners.append(fn)
+
+    def add_disconnect_listener(self, fn: Callable):
+        """fn(rc) runs after every disconnect (rc != 0 means unexpected)"""
+        self.disconnect_listeners.append(fn)
+
+    def add_publish_listener(self, fn: Callable):
+        """fn(mid) runs when paho reports a publish as sent / acknowledged"""
+        self.publish_listeners.append(fn)
+
+    @staticmethod
+    def _guarded(handler: Callable) -> Callable:
+        def guarded(topic, payload):
+            try:
+                handler(topic, payload)
+            except Exception as e:
+                # An exception here would stop paho's network loop
+                print(f"✗ MQTT: Error in handler for {topic}: {e}")
+        return guarded
+
+    def _on_message(self, client, userdata, msg):
+        self.router.dispatch(msg.topic, msg.payload)
+
+    # ============ CONNECTION ============
+
+    def connect(self, timeout: float = 10.0) -> bool:
+        """
+        Start the network loop (once) and wait up to timeout seconds for the
+        broker. The loop keeps reconnecting in the background either way.
+        """
+        with self.lock:
+            start = not self.started
+            self.started = True
+        if start:
+            print(f"MQTT: Connecting to {self.broker}:{self.port} as {self.client_id}")
+            try:
+                self.client.connect_async(self.broker, self.port, self.keepalive)
+                self.client.loop_start()
+            except Exception as e:
+                print(f"✗ MQTT: Connection setup failed - {e}")
+                with self.lock:
+                    self.started = False
+                return False
+
+        if self.connected_event.wait(timeout):
+            return True
+        print(f"✗ MQTT: {self.broker}:{self.port} not reachable yet, reconnecting in background")
+        return False
+
+    def disconnect(self):
+        """Stop the network loop and close the connection"""
+        with self.lock:
+            started, self.started = self.started, False
+        if not started:
+            return
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.connected_event.clear()
+        print("MQTT: Connection closed")
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            print(f"✗ MQTT: Connection failed - {CONNACK_ERRORS.get(rc, f'Unknown error {rc}')}")
+            return
+
+        self.connects += 1
+        self.connected_event.set()
+        print(f"✓ MQTT: Connected to {self.broker}:{self.port}")
+
+        # Clean session: the broker forgot our subscriptions, renew them all
+        with self.lock:
+            subscriptions = list(self.subscriptions.items())
+        if subscriptions:
+            client.subscribe(subscriptions)
+            print(f"✓ MQTT: Subscribed to {', '.join(topic for topic, _ in subscriptions)}")
+
+        for listener in list(self.connect_listeners):
+            try:
+                listener()
+            except Exception as e:
+                print(f"✗ MQTT: Error in connect listener: {e}")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected_event.clear()
+        self.disconnects += 1
+        if rc != 0:
+            print(f"✗ MQTT: Unexpected disconnection (code {rc}), reconnecting with backoff")
+        for listener in list(self.disconnect_listeners):
+            try:
+                listener(rc)
+            except Exception as e:
+                print(f"✗ MQTT: Error in disconnect listener: {e}")
+
+    def _on_publish(self, client, userdata, mid):
+        for listener in self.publish_listeners:
+            listener(mid)
+
+    # ============ PUBLISHING ============
+
+    def publish(self, topic: str, payload, qos: int = 0, retain: bool = False):
+        """Publish on the shared client (returns paho's MQTTMessageInfo)"""
+        return self.client.publish(topic, payload, qos=qos, retain=retain)
+
+    def max_inflight_messages_set(self, count: int):
+        self.client.max_inflight_messages_set(count)
+
+    def get_stats(self) -> dict:
+        return {
+            'connected': self.connected,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'subscriptions': len(self.subscriptions)
+        }
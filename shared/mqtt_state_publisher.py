@@ -3,80 +3,222 @@ import json
 import time
 import threading
 
+STATE_TOPIC_PREFIX = "system/state"
+# Seconds before a publish paho refused is tried again (while still connected)
+RETRY_INTERVAL = 1.0
+
+# SystemState.get_full_state() field -> topic it is published on
+TIMER_FIELDS = ('timer', 'timer_seconds', 'timer_running', 'timer_expired', 'timer_blinking')
+ALARM_FIELDS = ('alarm_active', 'alarm_reason', 'alarm_source')
+
+
+def state_messages(changes, state):
+    """Topic -> payload for every topic touched by the changed fields (values from the full state)"""
+    messages = {}
+    if 'people_count' in changes:
+        messages["people_count"] = {"count": state['people_count']}
+    if 'security_armed' in changes:
+        messages["security"] = {"armed": state['security_armed']}
+    if any(field in changes for field in ALARM_FIELDS):
+        messages["alarm"] = {"active": state['alarm_active'], "reason": state['alarm_reason'],
+                             "source": state['alarm_source']}
+    if any(field in changes for field in TIMER_FIELDS):
+        messages["timer"] = dict(state['timer'])
+    if 'door_states' in changes:
+        for door_id, door in state['door_states'].items():
+            messages[f"door/{door_id}"] = {"door_id": door_id, "open": door['open'],
+                                           "open_since": door['open_since']}
+    if 'led_states' in changes:
+        messages["leds"] = state['led_states']
+    if 'brgb_state' in changes:
+        messages["brgb"] = state['brgb_state']
+    if 'timer_button_add_seconds' in changes:
+        messages["timer_button"] = {"seconds": state['timer_button_add_seconds']}
+    return {f"{STATE_TOPIC_PREFIX}/{topic}": payload for topic, payload in messages.items()}
+
 
 class MQTTStatePublisher:
-    """Publishes system state changes to MQTT for Flask server to consume"""
-    
-    def __init__(self, broker='localhost', port=1883):
+    """
+    Publishes system state changes to MQTT as retained system/state/* topics,
+    so dashboards (mosquitto websockets on 9001) and other services get the
+    current state on subscribe and push updates afterwards.
+
+    Updates are coalesced per topic and sent at most once per min_interval:
+    during a burst (e.g. the timer being changed several times a second) only
+    the latest value of each interval goes out, and the final value always
+    does. Payloads identical to the last one sent are skipped.
+
+    A topic only counts as sent once paho accepted the publish; otherwise it
+    stays pending. Every topic is sent again after a reconnect, in case the
+    broker lost its retained messages meanwhile.
+    """
+
+    def __init__(self, broker='localhost', port=1883, client_id="state_publisher", min_interval=1.0):
         self.broker = broker
         self.port = port
+        self.client_id = client_id
+        self.min_interval = min_interval
         self.client = None
         self.connected = False
-        
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.flush_thread = None
+        self.pending = {}    # topic -> payload waiting for its interval
+        self.last_sent = {}  # topic -> (monotonic time, payload json)
+
+        # Counters
+        self.published = 0
+        self.coalesced = 0   # updates replaced by a newer one before being sent
+        self.unchanged = 0   # updates equal to what the topic already holds
+
     def connect(self):
-        """Connect to MQTT broker"""
+        """Connect to MQTT broker (in the background, reconnecting as needed)"""
         try:
-            self.client = mqtt.Client(client_id="state_publisher", clean_session=True)
-            self.client.connect(self.broker, self.port, 60)
+            self.client = mqtt.Client(client_id=self.client_id, clean_session=True)
+            self.client.on_connect = self._on_connect
+            self.client.on_disconnect = self._on_disconnect
+            self.client.connect_async(self.broker, self.port, 60)
             self.client.loop_start()
-            self.connected = True
-            print("✓ State Publisher: Connected to MQTT")
+            self.stop_event.clear()
+            self.flush_thread = threading.Thread(target=self._flush_loop, name="state-publisher", daemon=True)
+            self.flush_thread.start()
             return True
         except Exception as e:
             print(f"✗ State Publisher: Connection failed - {e}")
             return False
-    
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            with self.lock:
+                # Resend everything; newer pending payloads win over what was sent before
+                for topic, (_, sent_json) in self.last_sent.items():
+                    self.pending.setdefault(topic, json.loads(sent_json))
+                self.last_sent.clear()
+            self.connected = True
+            print("✓ State Publisher: Connected to MQTT")
+            self.wakeup.set()
+        else:
+            print(f"✗ State Publisher: Connection refused ({rc})")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self.connected = False
+
+    # ============ RATE-LIMITED SENDING ============
+
+    def _publish(self, topic, payload):
+        """Queue a retained update; a newer one for the same topic replaces it"""
+        with self.lock:
+            if topic in self.pending:
+                self.coalesced += 1
+            self.pending[topic] = payload
+        self.wakeup.set()
+
+    def _flush_loop(self):
+        while not self.stop_event.is_set():
+            # Cleared before flushing, so an update queued meanwhile is not missed
+            self.wakeup.clear()
+            next_due = self._flush()
+            self.wakeup.wait(timeout=next_due)
+
+    def _flush(self):
+        """Send pending topics whose interval has passed. Returns seconds until the next is due."""
+        if not self.connected:
+            return None
+
+        now = time.monotonic()
+        due = []
+        next_due = None
+        with self.lock:
+            for topic, payload in list(self.pending.items()):
+                sent_at, sent_json = self.last_sent.get(topic, (None, None))
+                payload_json = json.dumps(payload)
+                if payload_json == sent_json:
+                    del self.pending[topic]
+                    self.unchanged += 1
+                elif sent_at is None or now - sent_at >= self.min_interval:
+                    del self.pending[topic]
+                    due.append((topic, payload, payload_json))
+                else:
+                    wait = sent_at + self.min_interval - now
+                    next_due = wait if next_due is None else min(next_due, wait)
+
+        for i, (topic, payload, payload_json) in enumerate(due):
+            result = self.client.publish(topic, payload_json, qos=1, retain=True)
+            with self.lock:
+                if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                    self.last_sent[topic] = (now, payload_json)
+                    self.published += 1
+                    continue
+                # Not sent (e.g. connection lost): keep it and the rest pending, unless replaced meanwhile
+                print(f"✗ State Publisher: Publish to {topic} failed (rc={result.rc}), will retry")
+                for unsent_topic, unsent_payload, _ in due[i:]:
+                    self.pending.setdefault(unsent_topic, unsent_payload)
+            # Retried shortly, or on reconnect if the connection is gone
+            return RETRY_INTERVAL
+        return next_due
+
+    # ============ STATE UPDATES ============
+
+    def publish_changes(self, change):
+        """SystemState 'state_changed' callback: {'version', 'changes', 'state'}"""
+        for topic, payload in state_messages(change['changes'], change['state']).items():
+            self._publish(topic, payload)
+
     def publish_people_count(self, count):
         """Publish people count update"""
-        if self.connected:
-            self.client.publish("system/state/people_count", 
-                              json.dumps({"count": count}))
-    
+        self._publish(f"{STATE_TOPIC_PREFIX}/people_count", {"count": count})
+
     def publish_security_state(self, armed):
         """Publish security system state"""
-        if self.connected:
-            self.client.publish("system/state/security", 
-                              json.dumps({"armed": armed}))
-    
-    def publish_alarm_state(self, active, reason=None):
+        self._publish(f"{STATE_TOPIC_PREFIX}/security", {"armed": armed})
+
+    def publish_alarm_state(self, active, reason=None, source=None):
         """Publish alarm state"""
-        if self.connected:
-            self.client.publish("system/state/alarm", 
-                              json.dumps({"active": active, "reason": reason}))
-    
+        self._publish(f"{STATE_TOPIC_PREFIX}/alarm", {"active": active, "reason": reason, "source": source})
+
     def publish_timer_state(self, seconds, running, expired, blinking):
         """Publish timer state"""
-        if self.connected:
-            self.client.publish("system/state/timer", 
-                              json.dumps({
-                                  "seconds": seconds,
-                                  "running": running,
-                                  "expired": expired,
-                                  "blinking": blinking
-                              }))
-    
+        self._publish(f"{STATE_TOPIC_PREFIX}/timer", {
+            "seconds": seconds,
+            "running": running,
+            "expired": expired,
+            "blinking": blinking
+        })
+
     def publish_door_state(self, door_id, open_state, open_since):
-        """Publish door state"""
-        if self.connected:
-            self.client.publish("system/state/door", 
-                              json.dumps({
-                                  "door_id": door_id,
-                                  "open": open_state,
-                                  "open_since": open_since
-                              }))
-    
+        """Publish door state (one retained topic per door)"""
+        self._publish(f"{STATE_TOPIC_PREFIX}/door/{door_id}", {
+            "door_id": door_id,
+            "open": open_state,
+            "open_since": open_since
+        })
+
     def publish_full_state(self, state_dict):
         """Publish complete system state"""
-        if self.connected:
-            self.client.publish("system/state/full", json.dumps(state_dict))
-    
+        self._publish(f"{STATE_TOPIC_PREFIX}/full", state_dict)
+
+    def get_stats(self):
+        """Get publisher statistics"""
+        with self.lock:
+            return {
+                'connected': self.connected,
+                'topics': len(self.last_sent),
+                'pending': len(self.pending),
+                'published': self.published,
+                'coalesced': self.coalesced,
+                'unchanged': self.unchanged,
+                'min_interval': self.min_interval
+            }
+
     def disconnect(self):
         """Disconnect from MQTT"""
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.flush_thread:
+            self.flush_thread.join(timeout=2.0)
         if self.client:
             self.client.loop_stop()
             self.client.disconnect()
             print("State Publisher: Disconnected")
-
-
-# Global instance
-state_publisher = MQTTStatePublisher()
\ No newline at end of file
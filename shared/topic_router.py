@@ -0,0 +1,213 @@
+"""
+MQTT topic router.
+
+Handlers are registered under MQTT topic filters and compiled into a trie
+with one level per topic segment:
+
+    router = TopicRouter()
+    router.add("commands/+/timer_set", on_timer_set)
+    router.add("sensors/#", on_sensor_batch)
+    router.dispatch("commands/PI2/timer_set", payload)   # -> on_timer_set(topic, payload)
+
+Matching walks the trie once per topic (O(topic depth)); the result per topic
+is memoized, since devices publish to a small fixed set of topics.
+Wildcards follow the MQTT spec: '+' matches exactly one level, '#' (last
+level only) matches the parent and any number of levels, and wildcards at
+the first level do not match '$SYS'-style topics.
+
+Run `python -m shared.topic_router` for a comparison with the string-matching
+chains this replaces.
+"""
+import itertools
+from typing import Callable, Dict, List, Tuple
+
+SINGLE_LEVEL = '+'
+MULTI_LEVEL = '#'
+
+
+class _Node:
+    __slots__ = ('children', 'handlers')
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = []  # (registration order, handler)
+
+
+def validate_filter(topic_filter: str):
+    """Raise ValueError for filters that are not valid MQTT subscriptions"""
+    if not topic_filter:
+        raise ValueError("Topic filter must not be empty")
+    levels = topic_filter.split('/')
+    for i, level in enumerate(levels):
+        if MULTI_LEVEL in level and (level != MULTI_LEVEL or i != len(levels) - 1):
+            raise ValueError(f"'#' must be a whole, last level: {topic_filter}")
+        if SINGLE_LEVEL in level and level != SINGLE_LEVEL:
+            raise ValueError(f"'+' must be a whole level: {topic_filter}")
+
+
+def shared_subscription(group: str, topic_filter: str) -> str:
+    """
+    $share/<group>/<filter> - the broker delivers each matching message to only
+    one subscriber of the group. Messages still arrive on their plain topic, so
+    handlers stay registered under topic_filter.
+    """
+    if not group or any(char in group for char in '/+#'):
+        raise ValueError(f"Invalid shared subscription group: {group!r}")
+    validate_filter(topic_filter)
+    return f"$share/{group}/{topic_filter}"
+
+
+class TopicRouter:
+    """Trie of topic filters -> handlers"""
+
+    def __init__(self, cache_size: int = 1024):
+        self.root = _Node()
+        self.order = itertools.count()
+        self.cache = {}
+        self.cache_size = cache_size
+        self.filters = 0
+
+    def add(self, topic_filter: str, handler: Callable):
+        """Register handler(topic, payload) for a topic filter"""
+        validate_filter(topic_filter)
+        node = self.root
+        for level in topic_filter.split('/'):
+            node = node.children.setdefault(level, _Node())
+        node.handlers.append((next(self.order), handler))
+        self.filters += 1
+        self.cache.clear()
+
+    def route(self, topic_filter: str):
+        """Decorator form of add()"""
+        def register(handler):
+            self.add(topic_filter, handler)
+            return handler
+        return register
+
+    def match(self, topic: str) -> Tuple[Callable, ...]:
+        """Handlers whose filter matches topic, in registration order"""
+        handlers = self.cache.get(topic)
+        if handlers is not None:
+            return handlers
+
+        found = []
+        self._collect(self.root, topic.split('/'), 0, found, topic.startswith('$'))
+        found.sort(key=lambda entry: entry[0])
+        handlers = tuple(handler for _, handler in found)
+
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[topic] = handlers
+        return handlers
+
+    def _collect(self, node: _Node, levels: List[str], depth: int, found: list, system: bool):
+        wildcards = not (system and depth == 0)
+        if wildcards:
+            multi = node.children.get(MULTI_LEVEL)
+            if multi is not None:
+                found.extend(multi.handlers)
+        if depth == len(levels):
+            found.extend(node.handlers)
+            return
+
+        child = node.children.get(levels[depth])
+        if child is not None:
+            self._collect(child, levels, depth + 1, found, system)
+        if wildcards:
+            child = node.children.get(SINGLE_LEVEL)
+            if child is not None:
+                self._collect(child, levels, depth + 1, found, system)
+
+    def dispatch(self, topic: str, payload=None) -> int:
+        """Call every matching handler with (topic, payload). Returns how many ran."""
+        handlers = self.match(topic)
+        for handler in handlers:
+            handler(topic, payload)
+        return len(handlers)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'filters': self.filters,
+            'cached_topics': len(self.cache)
+        }
+
+
+if __name__ == '__main__':
+    import random
+    import time
+
+    calls = []
+    record = lambda topic, payload: calls.append(topic)
+
+    # The chains this router replaces (server on_message/handle_rpi_event, SD4, PI1)
+    def server_chain(topic, payload):
+        if topic.startswith("sensors/"):
+            record(topic, payload)
+        elif topic.startswith("events/"):
+            if 'led_state' in topic:
+                record(topic, payload)
+            if 'motion_detected' in topic:
+                record(topic, payload)
+            elif 'button_pressed' in topic:
+                record(topic, payload)
+            elif 'gyro_movement' in topic:
+                record(topic, payload)
+
+    def sd4_chain(topic, payload):
+        for suffix in ("timer_set", "timer_start", "timer_stop", "timer_add", "timer_expired"):
+            if topic.endswith(suffix):
+                record(topic, payload)
+                break
+
+    def pi1_chain(topic, payload):
+        if "alarm_triggered" in topic:
+            record(topic, payload)
+        if "security_armed" in topic or "alarm_cleared" in topic:
+            record(topic, payload)
+
+    server = TopicRouter()
+    server.add("sensors/#", record)
+    for event in ("led_state", "motion_detected", "button_pressed", "gyro_movement"):
+        server.add(f"events/+/{event}", record)
+    sd4 = TopicRouter()
+    for command in ("timer_set", "timer_start", "timer_stop", "timer_add", "timer_expired"):
+        sd4.add(f"commands/+/{command}", record)
+    pi1 = TopicRouter()
+    for command in ("alarm_triggered", "security_armed", "alarm_cleared"):
+        pi1.add(f"commands/+/{command}", record)
+
+    sensor_types = ('climate', 'imu', 'distance', 'motion', 'door', 'button', 'brgb_color')
+    server_topics = ([f"sensors/{t}" for t in sensor_types] + [f"sensors/{t}/gorilla" for t in sensor_types]
+                     + ["events/PI1/motion_detected", "events/PI2/button_pressed", "events/PI2/timer_expired"])
+    command_topics = [f"commands/{pi}/{c}" for pi in ('PI1', 'PI2', 'all')
+                      for c in ("timer_set", "timer_add", "timer_expired", "alarm_triggered", "security_armed")]
+
+    messages = 10_000
+    random.seed(1)
+    workloads = [
+        ('server', random.choices(server_topics, k=messages), server_chain, server),
+        ('SD4', random.choices(command_topics, k=messages), sd4_chain, sd4),
+        ('PI1', random.choices(command_topics, k=messages), pi1_chain, pi1),
+    ]
+
+    def per_message_us(fn, topics, rounds=5):
+        best = float('inf')
+        for _ in range(rounds):
+            calls.clear()
+            start = time.perf_counter()
+            for topic in topics:
+                fn(topic, None)
+            best = min(best, time.perf_counter() - start)
+        return best / len(topics) * 1e6, len(calls)
+
+    print(f"{messages} messages per workload (one second of traffic at 10k msg/s)")
+    print(f"{'workload':<10}{'dispatch':<16}{'us/msg':>8}{'CPU @10k/s':>12}{'handled':>9}")
+    for name, topics, chain, router in workloads:
+        def uncached(topic, payload, router=router):
+            router.cache.clear()
+            router.dispatch(topic, payload)
+
+        for label, fn in (('string chain', chain), ('trie', uncached), ('trie+cache', router.dispatch)):
+            us, handled = per_message_us(fn, topics)
+            cpu_percent = us * 10_000 / 1e6 * 100
+            print(f"{name:<10}{label:<16}{us:>8.2f}{cpu_percent:>11.1f}%{handled:>9}")